@@ -0,0 +1,185 @@
+import threading
+import time
+from collections import OrderedDict
+
+from client import Agent
+
+# Marks an agent id that was looked up and not found
+_MISSING = object()
+
+
+class TTLCache:
+    """
+    Size-bounded LRU with an optional per-entry time to live.
+
+    Keeps hit, miss and eviction counters for the stats endpoint.
+    """
+    def __init__(self, max_size=1024, ttl=None):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None):
+        """Return a live cached value, or default"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                value, expires_at = entry
+                if expires_at is None or expires_at > time.monotonic():
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return value
+                del self._entries[key]
+            self.misses += 1
+            return default
+
+    def put(self, key, value, ttl=None):
+        """Cache a value; ttl overrides the cache default for this entry"""
+        ttl = self.ttl if ttl is None else ttl
+        expires_at = time.monotonic() + ttl if ttl is not None else None
+        with self._lock:
+            self._entries[key] = (value, expires_at)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def invalidate(self, key=None):
+        """Drop one key, or everything when key is None"""
+        with self._lock:
+            if key is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(key, None)
+
+    def __len__(self):
+        return len(self._entries)
+
+    def stats(self):
+        """Return cache counters for reporting"""
+        with self._lock:
+            return {
+                "size": len(self._entries),
+                "max_size": self.max_size,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+            }
+
+
+class AgentCache:
+    """
+    Caches derived agent PDAs and decoded Agent records in front of an AgentStoreClient.
+
+    PDAs never change for a given agent_id so they are kept until evicted;
+    agent records expire after `ttl` seconds. Agents that don't exist are
+    remembered for `negative_ttl` seconds so repeated lookups of an unknown
+    id don't each cost an RPC.
+    """
+    def __init__(self, client, ttl=60, max_agents=4096, negative_ttl=5):
+        self.client = client
+        self.negative_ttl = negative_ttl
+        self.agents = TTLCache(max_size=max_agents, ttl=ttl)
+        self.addresses = TTLCache(max_size=max_agents)
+
+    def address(self, agent_id):
+        """Return the agent's PDA, deriving it only on a miss"""
+        agent_pubkey = self.addresses.get(agent_id)
+        if agent_pubkey is None:
+            agent_pubkey = self.client.find_agent_address(agent_id)
+            self.addresses.put(agent_id, agent_pubkey)
+        return agent_pubkey
+
+    def get(self, agent_id):
+        """
+        Return an agent by ID, from the cache when possible
+
+        Args:
+            agent_id: String ID of the agent to retrieve
+
+        Returns:
+            Agent object if found, None otherwise
+        """
+        agent = self.agents.get(agent_id)
+        if agent is _MISSING:
+            return None
+        if agent is not None:
+            return agent
+
+        return self._store(agent_id, self.client.get_account_info(self.address(agent_id)))
+
+    def _store(self, agent_id, account_info):
+        # Decode a fetched account and cache the result, including "not found"
+        agent = None
+        if account_info:
+            try:
+                agent = Agent.from_account_data(account_info.data)
+            except Exception as e:
+                print(f"Error deserializing agent data: {e}")
+
+        if agent is None:
+            self.agents.put(agent_id, _MISSING, ttl=self.negative_ttl)
+        else:
+            self.agents.put(agent_id, agent)
+        return agent
+
+    def get_many(self, agent_ids, fresh=False):
+        """
+        Return several agents, fetching all cache misses in one batched request
+
+        Args:
+            agent_ids: IDs of the agents to return
+            fresh: Read every agent from the chain, for callers that write the
+                records back and mustn't start from a stale copy
+
+        Returns:
+            Dict of agent_id to Agent, or None for agents that don't exist
+        """
+        agents = {}
+        missing = []
+        for agent_id in agent_ids:
+            agent = None if fresh else self.agents.get(agent_id)
+            if agent is None:
+                missing.append(agent_id)
+            else:
+                agents[agent_id] = None if agent is _MISSING else agent
+
+        if missing:
+            accounts = self.client.get_multiple_accounts([self.address(agent_id) for agent_id in missing])
+            for agent_id, account_info in zip(missing, accounts):
+                agents[agent_id] = self._store(agent_id, account_info)
+        return agents
+
+    def prefetch(self):
+        """
+        Load every agent in the program with one get_program_accounts call
+
+        Returns:
+            Number of agents cached
+        """
+        loaded = 0
+        for account in self.client.get_program_accounts():
+            try:
+                agent = Agent.from_account_data(account["data"])
+            except Exception as e:
+                print(f"Skipping account {account['pubkey']}: {e}")
+                continue
+            self.agents.put(agent.agent_id, agent)
+            self.addresses.put(agent.agent_id, account["pubkey"])
+            loaded += 1
+        return loaded
+
+    def invalidate(self, agent_id=None):
+        """Forget one cached agent, or all of them"""
+        self.agents.invalidate(agent_id)
+
+    def stats(self):
+        """Return hit/miss counters for agents and PDAs"""
+        return {
+            "agents": self.agents.stats(),
+            "addresses": self.addresses.stats(),
+        }
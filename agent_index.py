@@ -0,0 +1,152 @@
+import struct
+import time
+from array import array
+
+import numpy as np
+
+from client import Agent
+
+# Borsh string fields kept in the byte arena, in on-chain order
+STRING_FIELDS = ("agent_name", "agent_id", "agent_public_key", "signing_authority")
+NAME, AGENT_ID, PUBLIC_KEY, SIGNING_AUTHORITY = range(len(STRING_FIELDS))
+
+_U32 = struct.Struct("<I")
+
+
+def _parse_number(raw, kind, default):
+    # On-chain stats are stored as strings; bad values become the column default
+    try:
+        return kind(raw)
+    except ValueError:
+        return default
+
+
+class AgentIndex:
+    """
+    Columnar, read-only table of agents built from raw program accounts.
+
+    Borsh strings are parsed straight out of memoryviews over the account
+    data and copied into one shared byte arena; each row only stores
+    offsets and lengths. number_of_calls and avg_customer_rating are
+    parsed once into numpy columns so rating queries are vectorized.
+    Agent objects are only created for rows a query returns.
+    """
+    def __init__(self, accounts=()):
+        self.built_at = time.time()
+        # Version of the registry snapshot this index was built from, if any
+        self.registry_version = None
+        self.skipped = 0
+        self._arena = bytearray()
+        self._account_keys = []
+        spans = array("Q")
+        calls = array("q")
+        ratings = array("d")
+
+        for account in accounts:
+            row = self._parse(memoryview(account["data"]))
+            if row is None:
+                self.skipped += 1
+                continue
+            row_spans, row_calls, row_rating = row
+            spans.extend(row_spans)
+            calls.append(row_calls)
+            ratings.append(row_rating)
+            self._account_keys.append(account["pubkey"])
+
+        # Each row holds (offset, length) for every string field
+        self._spans = np.frombuffer(spans, dtype=np.uint64).reshape(-1, len(STRING_FIELDS), 2)
+        self.number_of_calls = np.frombuffer(calls, dtype=np.int64)
+        self.avg_customer_rating = np.frombuffer(ratings, dtype=np.float64)
+        self._by_agent_id = self._build_lookup(AGENT_ID)
+        self._by_public_key = self._build_lookup(PUBLIC_KEY)
+
+    def __len__(self):
+        return len(self.number_of_calls)
+
+    def _parse(self, data):
+        """Parse one account into arena spans and numeric stats, or None if malformed"""
+        # Skip the first byte (instruction identifier)
+        pos = 1
+        spans = []
+        numbers = []
+        arena_start = len(self._arena)
+        try:
+            for field in range(len(STRING_FIELDS) + 2):
+                (length,) = _U32.unpack_from(data, pos)
+                start, pos = pos + 4, pos + 4 + length
+                if pos > len(data):
+                    raise struct.error("string runs past the end of the account")
+                if field < len(STRING_FIELDS):
+                    spans.extend((len(self._arena), length))
+                    self._arena += data[start:pos]
+                else:
+                    numbers.append(bytes(data[start:pos]))
+        except struct.error:
+            # Drop whatever part of this account was already copied
+            del self._arena[arena_start:]
+            return None
+
+        return (spans,
+                _parse_number(numbers[0], int, 0),
+                _parse_number(numbers[1], float, float("nan")))
+
+    def _build_lookup(self, field):
+        lookup = {}
+        for row, (offset, length) in enumerate(self._spans[:, field].tolist()):
+            lookup[bytes(self._arena[offset:offset + length])] = row
+        return lookup
+
+    def field(self, row, field):
+        """Decode one string field of a row"""
+        offset, length = self._spans[row, field].tolist()
+        return self._arena[offset:offset + length].decode("utf-8")
+
+    def agent(self, row):
+        """Materialize a row as an Agent"""
+        return Agent(
+            agent_name=self.field(row, NAME),
+            agent_id=self.field(row, AGENT_ID),
+            agent_public_key=self.field(row, PUBLIC_KEY),
+            signing_authority=self.field(row, SIGNING_AUTHORITY),
+            number_of_calls=str(int(self.number_of_calls[row])),
+            avg_customer_rating=str(float(self.avg_customer_rating[row]))
+        )
+
+    def account_key(self, row):
+        """Return the account address a row was read from"""
+        return self._account_keys[row]
+
+    def find(self, agent_id):
+        """Return the Agent with this agent_id, or None"""
+        row = self._by_agent_id.get(agent_id.encode("utf-8"))
+        return self.agent(row) if row is not None else None
+
+    def find_by_public_key(self, agent_public_key):
+        """Return the Agent registered with this agent_public_key, or None"""
+        row = self._by_public_key.get(agent_public_key.encode("utf-8"))
+        return self.agent(row) if row is not None else None
+
+    def top_by_rating(self, n=10, min_calls=0):
+        """
+        Return the highest rated agents
+
+        Args:
+            n: Number of agents to return
+            min_calls: Ignore agents with fewer calls than this
+
+        Returns:
+            List of Agent objects, best rated first (ties broken by call count)
+        """
+        rows = np.flatnonzero((self.number_of_calls >= min_calls) & ~np.isnan(self.avg_customer_rating))
+        if n <= 0 or len(rows) == 0:
+            return []
+        if n < len(rows):
+            # Partial selection keeps this O(len) rather than a full sort
+            rows = rows[np.argpartition(-self.avg_customer_rating[rows], n - 1)[:n]]
+        order = np.lexsort((-self.number_of_calls[rows], -self.avg_customer_rating[rows]))
+        return [self.agent(row) for row in rows[order].tolist()]
+
+    @classmethod
+    def from_client(cls, client):
+        """Build an index from every account owned by the agent store program"""
+        return cls(client.get_program_accounts())
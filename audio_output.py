@@ -0,0 +1,176 @@
+import threading
+import time
+import wave
+
+import numpy as np
+
+from metrics import stage_timer
+
+# Silence played before a transmission that starts from an idle stream
+DEFAULT_LEAD_IN = 3.0
+# A stream that went quiet less than this many seconds ago still counts as
+# playing. A paced sink only returns from write() as its audio ends, so the
+# next queued job always starts a little after that.
+CONTINUE_WINDOW = 0.25
+
+
+class NullSink:
+    """
+    Discards audio, for headless servers and load tests.
+
+    With `realtime` set, write() takes as long as the audio would take to
+    play, so queueing behaves like a real speaker.
+    """
+    def __init__(self, realtime=False):
+        self.realtime = realtime
+        self.samples_written = 0
+
+    def open(self, sample_rate):
+        self.sample_rate = sample_rate
+
+    def write(self, samples):
+        self.samples_written += len(samples)
+        if self.realtime:
+            time.sleep(len(samples) / self.sample_rate)
+
+    def close(self):
+        pass
+
+
+class WavFileSink(NullSink):
+    """Appends everything played to a 16-bit mono WAV file"""
+    def __init__(self, path, realtime=False):
+        super().__init__(realtime)
+        self.path = path
+        self._wav = None
+
+    def open(self, sample_rate):
+        super().open(sample_rate)
+        self._wav = wave.open(self.path, "wb")
+        self._wav.setnchannels(1)
+        self._wav.setsampwidth(2)
+        self._wav.setframerate(sample_rate)
+
+    def write(self, samples):
+        pcm = (np.clip(samples, -1.0, 1.0) * 32767).astype("<i2")
+        self._wav.writeframes(pcm.tobytes())
+        super().write(samples)
+
+    def close(self):
+        if self._wav is not None:
+            self._wav.close()
+            self._wav = None
+
+
+class SoundDeviceSink:
+    """Long-lived PortAudio output stream with blocking writes"""
+    def __init__(self, device=None):
+        self.device = device
+        self._stream = None
+
+    def open(self, sample_rate):
+        # Imported here so servers using other sinks don't need PortAudio
+        import sounddevice as sd
+        self._stream = sd.OutputStream(samplerate=sample_rate, channels=1, dtype="float32", device=self.device)
+        self._stream.start()
+
+    def write(self, samples):
+        # Returns once the last block is queued, so the next write follows without a gap
+        if self._stream.write(samples):
+            print("Audio output underflow")
+
+    def close(self):
+        if self._stream is not None:
+            self._stream.close()
+            self._stream = None
+
+
+def create_sink(spec="sounddevice", realtime=False):
+    """
+    Create an audio sink from a spec string
+
+    Args:
+        spec: "sounddevice", "sounddevice:<device>", "wav:<path>" or "null"
+        realtime: Pace the WAV and null sinks at playback speed
+
+    Returns:
+        An unopened sink
+    """
+    kind, _, target = spec.partition(":")
+    if kind == "sounddevice":
+        return SoundDeviceSink(device=int(target) if target.isdigit() else target or None)
+    if kind == "wav":
+        if not target:
+            raise ValueError("wav sink needs a path, e.g. wav:/tmp/voxverify.wav")
+        return WavFileSink(target, realtime)
+    if kind == "null":
+        return NullSink(realtime)
+    raise ValueError(f"Unknown audio sink: {spec}")
+
+
+class AudioEngine:
+    """
+    Plays waveforms through one persistent output stream.
+
+    The sink is opened on first use and kept open, so transmissions don't
+    pay for opening a device. A transmission that starts on an idle stream
+    is preceded by `lead_in` seconds of silence. When the previous one is
+    still playing, or finished within CONTINUE_WINDOW seconds, it is
+    written straight after with only `gap` seconds of silence, so queued
+    tokens play back to back. If the sink fails, it is closed and reopened
+    on the next play().
+    """
+    def __init__(self, sink, sample_rate, lead_in=DEFAULT_LEAD_IN, gap=0.0):
+        self.sink = sink
+        self.sample_rate = sample_rate
+        self.lead_in = lead_in
+        self.gap = gap
+        self._open = False
+        # Monotonic time at which everything written so far will have played
+        self._busy_until = 0.0
+        self._lock = threading.Lock()
+
+    def play(self, samples):
+        """
+        Write one waveform to the output stream
+
+        Args:
+            samples: float32 mono samples at the engine's sample rate
+
+        Returns:
+            Seconds of silence written before the waveform
+        """
+        with self._lock:
+            if not self._open:
+                self.sink.open(self.sample_rate)
+                self._open = True
+
+            now = time.monotonic()
+            silence = self.gap if now < self._busy_until + CONTINUE_WINDOW else self.lead_in
+            busy_until = max(now, self._busy_until) + silence + len(samples) / self.sample_rate
+            try:
+                if silence > 0:
+                    with stage_timer("pre_play_delay"):
+                        self.sink.write(np.zeros(int(silence * self.sample_rate), dtype=np.float32))
+                with stage_timer("playback"):
+                    self.sink.write(samples)
+            except Exception:
+                self._reset()
+                raise
+
+            # A paced sink returns once the audio has played, possibly a little late
+            self._busy_until = max(busy_until, time.monotonic())
+            return silence
+
+    def close(self):
+        """Close the sink; the next play() reopens it"""
+        with self._lock:
+            self._reset()
+
+    def _reset(self):
+        try:
+            self.sink.close()
+        except Exception as e:
+            print(f"Error closing audio sink: {e}")
+        self._open = False
+        self._busy_until = 0.0
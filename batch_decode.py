@@ -0,0 +1,260 @@
+"""
+Re-verify VoxVerify tokens in archived recordings.
+
+Walks a directory of WAV or raw PCM files, decodes every ggwave
+transmission in them across a process pool and writes one JSON line per
+token found.
+
+    python batch_decode.py recordings/ -o results.jsonl -j 8
+"""
+import argparse
+import json
+import os
+import struct
+import sys
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import numpy as np
+
+import signed_payload
+from key_ring import TrustedKeys, find_signer, DEFAULT_AGENT_ID, DEFAULT_PUBLIC_KEY_PATH
+from signature_store import create_signature_store
+from stream_decoder import StreamDecoder, SAMPLE_FORMATS, DECODER_SAMPLE_RATE, samples_to_float32, resample
+
+AUDIO_EXTENSIONS = (".wav", ".pcm", ".raw")
+
+# Samples handed to the decoder per call while sliding across a segment
+DECODE_BLOCK = 64 * 1024
+
+WAVE_FORMAT_PCM = 1
+WAVE_FORMAT_IEEE_FLOAT = 3
+WAVE_FORMAT_EXTENSIBLE = 0xFFFE
+# WAVE_FORMAT_EXTENSIBLE sub-format GUIDs are the plain format code followed by these bytes
+_SUBFORMAT_SUFFIX = b"\x00\x00\x00\x00\x10\x00\x80\x00\x00\xaa\x00\x38\x9b\x71"
+
+# Per-process verification state, set up by _init_worker
+_trusted_keys = None
+_signature_store = None
+
+
+class AudioFile:
+    """Location and layout of the sample data inside an audio file"""
+    def __init__(self, path, data_offset, frames, channels, sample_rate, sample_format):
+        self.path = path
+        self.data_offset = data_offset
+        self.frames = frames
+        self.channels = channels
+        self.sample_rate = sample_rate
+        self.sample_format = sample_format
+
+    def samples(self):
+        """Memory-map the first channel without reading the file"""
+        dtype = SAMPLE_FORMATS[self.sample_format][0]
+        data = np.memmap(self.path, dtype=dtype, mode="r", offset=self.data_offset,
+                         shape=(self.frames, self.channels))
+        return data[:, 0]
+
+
+def read_wav_header(path):
+    """
+    Locate the PCM data in a WAV file
+
+    Returns:
+        AudioFile describing the data chunk
+
+    Raises:
+        ValueError: if the file isn't a supported WAV file
+    """
+    with open(path, "rb") as wav_file:
+        riff, _, wave_id = struct.unpack("<4sI4s", wav_file.read(12))
+        if riff != b"RIFF" or wave_id != b"WAVE":
+            raise ValueError("Not a RIFF/WAVE file")
+
+        fmt = None
+        while True:
+            header = wav_file.read(8)
+            if len(header) < 8:
+                raise ValueError("No data chunk")
+            chunk_id, chunk_size = struct.unpack("<4sI", header)
+            if chunk_id == b"fmt ":
+                fmt = wav_file.read(chunk_size)
+                wav_file.seek(chunk_size % 2, os.SEEK_CUR)
+            elif chunk_id == b"data":
+                if fmt is None:
+                    raise ValueError("Data chunk before fmt chunk")
+                data_offset = wav_file.tell()
+                break
+            else:
+                # Chunks are word aligned
+                wav_file.seek(chunk_size + chunk_size % 2, os.SEEK_CUR)
+
+    if len(fmt) < 16:
+        raise ValueError("Truncated fmt chunk")
+    audio_format, channels, sample_rate, _, _, bits = struct.unpack("<HHIIHH", fmt[:16])
+    if audio_format == WAVE_FORMAT_EXTENSIBLE:
+        # The real format is the first two bytes of the sub-format GUID at offset 24
+        subformat = fmt[24:40]
+        if len(subformat) < 16 or subformat[2:] != _SUBFORMAT_SUFFIX:
+            raise ValueError("Unsupported WAVE_FORMAT_EXTENSIBLE sub-format")
+        audio_format = struct.unpack("<H", subformat[:2])[0]
+    if audio_format == WAVE_FORMAT_PCM and bits == 16:
+        sample_format = "i16"
+    elif audio_format == WAVE_FORMAT_PCM and bits == 8:
+        sample_format = "u8"
+    elif audio_format == WAVE_FORMAT_IEEE_FLOAT and bits == 32:
+        sample_format = "f32"
+    else:
+        raise ValueError(f"Unsupported WAV encoding (format {audio_format}, {bits} bits)")
+
+    # Some recorders write a bogus data size, so trust the file length instead
+    sample_size = SAMPLE_FORMATS[sample_format][0].itemsize
+    data_size = min(chunk_size, os.path.getsize(path) - data_offset)
+    frames = data_size // (sample_size * channels)
+    return AudioFile(path, data_offset, frames, channels, sample_rate, sample_format)
+
+
+def open_audio(path, pcm_rate, pcm_format):
+    """Describe a WAV file, or a headerless mono PCM file in the given format"""
+    if path.lower().endswith(".wav"):
+        return read_wav_header(path)
+    sample_size = SAMPLE_FORMATS[pcm_format][0].itemsize
+    return AudioFile(path, 0, os.path.getsize(path) // sample_size, 1, pcm_rate, pcm_format)
+
+
+def find_audio_files(root):
+    """Yield every audio file under root, in a stable order"""
+    for directory, subdirs, files in os.walk(root):
+        subdirs.sort()
+        for name in sorted(files):
+            if name.lower().endswith(AUDIO_EXTENSIONS):
+                yield os.path.join(directory, name)
+
+
+def verify_token(token):
+    """Verify a decoded token against the trusted keys, falling back to the signature store"""
+    try:
+        payload = signed_payload.decode(token)
+    except signed_payload.PayloadError:
+        payload = None
+
+    if payload is not None:
+        # Same key matching as the server's /validate
+        match = find_signer(payload, _trusted_keys)
+        if not match.candidates:
+            return {"verified": False, "error": f"Unknown key id {payload.key_id.hex()}"}
+        if not match.verified:
+            return {"verified": False, "error": "Invalid signature"}
+        message = payload.message
+        if message is None and _signature_store is not None:
+            message = _signature_store.get(signed_payload.token_text(token))
+        return {"verified": True, "agent_id": match.agent_id, "message": message, "signed_at": payload.timestamp}
+
+    message = _signature_store.get(signed_payload.token_text(token)) if _signature_store is not None else None
+    if message is not None:
+        return {"verified": True, "message": message}
+    return {"verified": False, "error": "Token is not a signed payload or a known signature"}
+
+
+def decode_segment(audio, start, end, overlap):
+    """
+    Decode tokens that finish inside [start, end) samples of a file
+
+    Decoding starts `overlap` samples early so a token that began in the
+    previous segment is still heard in full; tokens that end before
+    `start` belong to the previous segment and are skipped.
+    """
+    audio_start = max(0, start - overlap)
+    samples = samples_to_float32(audio.samples()[audio_start:end], audio.sample_format)
+    samples = resample(samples, audio.sample_rate, DECODER_SAMPLE_RATE)
+
+    decoder = StreamDecoder()
+    results = []
+    try:
+        for block in range(0, len(samples), DECODE_BLOCK):
+            for offset, token in decoder.feed_samples(samples[block:block + DECODE_BLOCK]):
+                offset = audio_start / audio.sample_rate + offset
+                if offset * audio.sample_rate < start:
+                    continue
+                result = {"file": audio.path, "offset": round(offset, 3), "decoded_token": signed_payload.token_text(token)}
+                if isinstance(token, bytes):
+                    result["raw"] = True
+                result.update(verify_token(token))
+                results.append(result)
+    finally:
+        decoder.close()
+    return results
+
+
+def _init_worker(public_keys, signature_store_url):
+    global _trusted_keys, _signature_store
+    _trusted_keys = TrustedKeys()
+    for agent_id, path in public_keys:
+        _trusted_keys.add_ssh_public_key_file(agent_id, path)
+    if signature_store_url:
+        _signature_store = create_signature_store(signature_store_url, ttl=None)
+
+
+def parse_public_keys(specs):
+    """Turn ["agent_id=path", "path"] into [(agent_id, path)]"""
+    public_keys = []
+    for spec in specs or [f"{DEFAULT_AGENT_ID}={DEFAULT_PUBLIC_KEY_PATH}"]:
+        agent_id, _, path = spec.rpartition("=")
+        public_keys.append((agent_id or os.path.basename(path), os.path.expanduser(path)))
+    return public_keys
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Decode and verify VoxVerify tokens in recorded audio")
+    parser.add_argument("directory", help="Directory of .wav/.pcm/.raw recordings")
+    parser.add_argument("-o", "--output", help="JSONL output file (default: stdout)")
+    parser.add_argument("-j", "--jobs", type=int, default=os.cpu_count(), help="Worker processes")
+    parser.add_argument("--public-key", action="append", metavar="[AGENT_ID=]PATH",
+                        help="Trusted OpenSSH public key, may be repeated (default: ~/.ssh/id_ed25519.pub)")
+    parser.add_argument("--signature-store", metavar="URL",
+                        help="Signature store to resolve legacy tokens, e.g. sqlite:///signatures.db")
+    parser.add_argument("--pcm-rate", type=int, default=DECODER_SAMPLE_RATE, help="Sample rate of raw PCM files")
+    parser.add_argument("--pcm-format", choices=sorted(SAMPLE_FORMATS), default="i16", help="Sample format of raw PCM files")
+    parser.add_argument("--segment-seconds", type=float, default=300, help="Audio decoded per task")
+    parser.add_argument("--overlap-seconds", type=float, default=30,
+                        help="Overlap between segments; must exceed the longest token")
+    args = parser.parse_args(argv)
+
+    output = open(args.output, "w") if args.output else sys.stdout
+    public_keys = parse_public_keys(args.public_key)
+    # Load the keys here too so a bad path fails before any workers start
+    _init_worker(public_keys, args.signature_store)
+    tokens = files = 0
+
+    with ProcessPoolExecutor(max_workers=args.jobs, initializer=_init_worker,
+                             initargs=(public_keys, args.signature_store)) as executor:
+        futures = {}
+        for path in find_audio_files(args.directory):
+            files += 1
+            try:
+                audio = open_audio(path, args.pcm_rate, args.pcm_format)
+            except (OSError, ValueError, struct.error) as e:
+                output.write(json.dumps({"file": path, "error": str(e)}) + "\n")
+                continue
+            # Long recordings are split so one file can use several cores
+            segment = max(1, int(args.segment_seconds * audio.sample_rate))
+            overlap = int(args.overlap_seconds * audio.sample_rate)
+            for start in range(0, audio.frames, segment):
+                future = executor.submit(decode_segment, audio, start, min(start + segment, audio.frames), overlap)
+                futures[future] = path
+
+        for future in as_completed(futures):
+            try:
+                results = future.result()
+            except Exception as e:
+                results = [{"file": futures[future], "error": str(e)}]
+            for result in results:
+                tokens += "decoded_token" in result
+                output.write(json.dumps(result) + "\n")
+
+    if output is not sys.stdout:
+        output.close()
+    print(f"Decoded {tokens} tokens from {files} files", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,407 @@
+"""
+Benchmark the VoxVerify hot paths.
+
+Times signing, ggwave encoding, token verification, agent parsing and
+Flask endpoint throughput without a sound device or an RPC node: playback
+goes to a null audio sink and agents are served from memory. The startup
+group times building the app for each server role in a fresh interpreter.
+Results can be saved as a JSON baseline and later runs compared against it.
+
+    python benchmark.py --save baseline.json
+    python benchmark.py --compare baseline.json --threshold 0.15
+"""
+import argparse
+import itertools
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+import numpy as np
+from cryptography.hazmat.primitives import serialization
+from cryptography.hazmat.primitives.asymmetric import ed25519
+
+# Payload lengths for the encode benchmark; 88 is a base64 Ed25519 signature
+PAYLOAD_LENGTHS = (16, 64, 88, 140)
+# ggwave protocols: normal, fast and fastest, each audible, ultrasonic and dual-tone
+PROTOCOLS = tuple(range(9))
+QUICK_PROTOCOLS = (1, 2, 5)
+
+# Agents loaded into the in-memory store
+AGENT_COUNT = 1000
+
+# Server roles timed by the startup group, and the heavy modules reported for each
+STARTUP_ROLES = ("verify", "identify", "agents", "all")
+HEAVY_MODULES = ("ggwave", "numpy", "sounddevice", "solana", "solders")
+
+# How a worker builds its app: with the factory, as gunicorn 'play:create_app("verify")'
+# does, or as play.app from VOXVERIFY_ROLES, as `VOXVERIFY_ROLES=verify python play.py` does
+STARTUP_PATHS = {
+    "factory": "play.create_app({role!r})",
+    "env": "play.app",
+}
+
+# Run in a fresh interpreter: prints the time to import play and build the app, and
+# which heavy modules that loaded
+STARTUP_SCRIPT = """
+import json, sys, time
+start = time.perf_counter()
+import play
+app = %s
+elapsed = time.perf_counter() - start
+print(json.dumps({"seconds": elapsed, "modules": [name for name in %r if name in sys.modules]}))
+"""
+
+
+class Account:
+    """Account info with just the data field"""
+    def __init__(self, data):
+        self.data = data
+
+
+class MemoryAgentStore:
+    """Agent store that serves Borsh-encoded accounts from a dict instead of RPC"""
+    def __init__(self, client_module, count=AGENT_COUNT):
+        from solders.pubkey import Pubkey
+        self.program_id = Pubkey.from_string(client_module.PROGRAM_ID)
+        self.accounts = {}
+        for i in range(count):
+            agent_id = f"agent{i:04d}"
+            data = encode_agent(f"Agent {i}", agent_id, f"ssh-ed25519 key{i}", "authority", str(i * 7), f"{i % 50 / 10:.1f}")
+            self.accounts[self.find_agent_address(agent_id)] = data
+
+    def find_agent_address(self, agent_id):
+        from solders.pubkey import Pubkey
+        agent_pubkey, _ = Pubkey.find_program_address([bytes(agent_id, "utf-8")], self.program_id)
+        return agent_pubkey
+
+    def get_account_info(self, pubkey):
+        data = self.accounts.get(pubkey)
+        return Account(data) if data is not None else None
+
+    def get_multiple_accounts(self, pubkeys, data_slice=None):
+        return [self.get_account_info(pubkey) for pubkey in pubkeys]
+
+    def get_program_accounts(self):
+        return [{"pubkey": pubkey, "data": data} for pubkey, data in self.accounts.items()]
+
+
+def encode_agent(*fields):
+    """Borsh-encode agent string fields behind the instruction byte"""
+    data = b"\x00"
+    for field in fields:
+        encoded = field.encode("utf-8")
+        data += len(encoded).to_bytes(4, "little") + encoded
+    return data
+
+
+def measure(fn, min_time=0.2, repeat=5):
+    """
+    Time a callable
+
+    Each of `repeat` runs calls fn enough times to last about `min_time`
+    seconds, after one untimed warm-up call.
+
+    Returns:
+        Dict of per-call timings in microseconds and calls per second
+    """
+    fn()
+    # Calibrate how many calls make one run
+    number = 1
+    while True:
+        start = time.perf_counter()
+        for _ in range(number):
+            fn()
+        elapsed = time.perf_counter() - start
+        if elapsed >= min_time / 10 or number >= 1 << 20:
+            break
+        number *= 2
+    number = max(1, round(number * min_time / max(elapsed, 1e-9)))
+
+    runs = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for _ in range(number):
+            fn()
+        runs.append((time.perf_counter() - start) / number)
+
+    median = statistics.median(runs)
+    return {
+        "median_us": median * 1e6,
+        "min_us": min(runs) * 1e6,
+        "max_us": max(runs) * 1e6,
+        "ops_per_sec": 1 / median if median else float("inf"),
+        "calls": number * repeat,
+    }
+
+
+def setup_app(workdir):
+    """Import play with a null audio sink, a throwaway signing key and an in-memory agent store"""
+    import client
+    import play
+    from agent_cache import AgentCache
+    from audio_output import AudioEngine, NullSink
+    from key_ring import KeyRing, TrustedKeys, DEFAULT_AGENT_ID
+    from playback import PlaybackScheduler
+
+    # A fresh key so results don't depend on ~/.ssh
+    private_key = ed25519.Ed25519PrivateKey.generate()
+    key_path = os.path.join(workdir, "id_ed25519")
+    with open(key_path, "wb") as key_file:
+        key_file.write(private_key.private_bytes(
+            serialization.Encoding.PEM, serialization.PrivateFormat.OpenSSH, serialization.NoEncryption()
+        ))
+
+    play.key_ring = KeyRing()
+    play.key_ring.add(DEFAULT_AGENT_ID, key_path)
+    play.key_ring_loaded = True
+    play.trusted_keys = TrustedKeys()
+    play.trusted_keys.add(DEFAULT_AGENT_ID, private_key.public_key())
+    play.trusted_keys_loaded = True
+
+    # Play into a null sink with no lead-in, and queue deep enough that /identify never gets a 503
+    play.audio_engine = AudioEngine(NullSink(), play.SAMPLE_RATE, lead_in=0)
+    play.playback_scheduler = PlaybackScheduler(play.play, max_queue=1 << 16)
+
+    store = MemoryAgentStore(client)
+    play.agent_cache = AgentCache(store)
+    return play, store
+
+
+def bench_signing(play, store, results, args):
+    results["encrypt"] = measure(lambda: play.encrypt("Agent 007 calling"), args.min_time, args.repeat)
+
+
+def bench_encode(play, store, results, args):
+    import ggwave
+    ggwave.disableLog()
+    protocols = QUICK_PROTOCOLS if args.quick else PROTOCOLS
+    for length in PAYLOAD_LENGTHS:
+        payload = "x" * length
+        for protocol_id in protocols:
+            results[f"ggwave.encode[len={length},protocol={protocol_id}]"] = measure(
+                lambda: ggwave.encode(payload, protocolId=protocol_id, volume=play.VOLUME),
+                args.min_time, args.repeat
+            )
+
+
+def bench_verify(play, store, results, args):
+    token = play.encrypt("Agent 007 calling")
+    long_token = play.encrypt("A message long enough to be sent as a digest instead of inline")
+    legacy_token = "A" * 86 + "=="
+    play.signature_store.put(legacy_token, "legacy message")
+
+    results["verify_message[hit]"] = measure(lambda: play.verify_message(token), args.min_time, args.repeat)
+    results["verify_message[hit,no_debug]"] = measure(
+        lambda: play.verify_message(token, collect_debug=False), args.min_time, args.repeat
+    )
+    results["verify_message[digest]"] = measure(lambda: play.verify_message(long_token), args.min_time, args.repeat)
+    results["verify_message[legacy]"] = measure(lambda: play.verify_message(legacy_token), args.min_time, args.repeat)
+    results["verify_message[miss]"] = measure(
+        lambda: play.verify_message("not a token at all"), args.min_time, args.repeat
+    )
+
+    # The replay check validate_token adds around verify_message when enabled
+    from replay_cache import ReplayFilter
+    replays = ReplayFilter(window=3600)
+    replays.add(play.replay_key(token))
+    keys = itertools.count()
+    results["replay_filter.seen[replay]"] = measure(
+        lambda: replays.seen(play.replay_key(token)), args.min_time, args.repeat
+    )
+    results["replay_filter.add[fresh]"] = measure(
+        lambda: replays.add(next(keys).to_bytes(8, "little")), args.min_time, args.repeat
+    )
+
+
+def bench_agents(play, store, results, args):
+    from client import Agent
+    from agent_index import AgentIndex
+
+    agent_ids = [f"agent{i:04d}" for i in range(0, AGENT_COUNT, 7)]
+    data = next(iter(store.accounts.values()))
+    ids = itertools.cycle(agent_ids)
+
+    results["Agent.from_account_data"] = measure(lambda: Agent.from_account_data(data), args.min_time, args.repeat)
+    results["get_agent_by_id"] = measure(lambda: play.get_agent_by_id(store, next(ids)), args.min_time, args.repeat)
+    results[f"AgentIndex.build[{AGENT_COUNT}]"] = measure(
+        lambda: AgentIndex(store.get_program_accounts()), args.min_time, args.repeat
+    )
+
+
+def bench_endpoints(play, store, results, args):
+    # Every role, whatever VOXVERIFY_ROLES says
+    app_client = play.create_app(play.ROLES).test_client()
+    token = play.encrypt("Agent 007 calling")
+
+    def request(method, path, **kwargs):
+        def call():
+            response = app_client.open(path, method=method, **kwargs)
+            if response.status_code >= 400:
+                raise RuntimeError(f"{method} {path} returned {response.status_code}")
+        return call
+
+    endpoints = {
+        "POST /identify": request("POST", "/identify", json={"message": "Agent 007 calling"}),
+        "POST /validate": request("POST", "/validate", json={"decoded_text": token}),
+        "POST /validate/batch[100]": request("POST", "/validate/batch", json={"decoded_texts": [token] * 100}),
+        "GET /waveform": request("GET", "/waveform", query_string={"payload": token}),
+        "GET /agents/<agent_id>": request("GET", "/agents/agent0001"),
+    }
+    for name, call in endpoints.items():
+        results[f"endpoint {name}"] = measure(call, args.min_time, args.repeat)
+
+
+def startup_time(role, path, repeat):
+    """
+    Time importing play and building the app for a role in fresh interpreters
+
+    Args:
+        role: Server role, as in STARTUP_ROLES
+        path: Key of STARTUP_PATHS naming how the app is built
+        repeat: Number of interpreters to time
+
+    Returns:
+        Timings dict like measure() returns, plus the heavy modules the startup loaded
+    """
+    env = dict(os.environ)
+    env.pop("VOXVERIFY_ROLES", None)
+    if path == "env":
+        env["VOXVERIFY_ROLES"] = role
+    script = STARTUP_SCRIPT % (STARTUP_PATHS[path].format(role=role), HEAVY_MODULES)
+    root = os.path.dirname(os.path.abspath(__file__))
+    env["PYTHONPATH"] = os.pathsep.join(filter(None, (root, env.get("PYTHONPATH"))))
+    runs = []
+    for _ in range(repeat):
+        output = subprocess.run(
+            [sys.executable, "-c", script], env=env, cwd=root,
+            check=True, capture_output=True, text=True
+        ).stdout
+        # play may print while importing; the timing is the last line
+        runs.append(json.loads(output.strip().splitlines()[-1]))
+
+    seconds = [run["seconds"] for run in runs]
+    median = statistics.median(seconds)
+    return {
+        "median_us": median * 1e6,
+        "min_us": min(seconds) * 1e6,
+        "max_us": max(seconds) * 1e6,
+        "ops_per_sec": 1 / median,
+        "calls": repeat,
+        "modules": runs[-1]["modules"],
+    }
+
+
+def bench_startup(play, store, results, args):
+    for role in STARTUP_ROLES:
+        for path in STARTUP_PATHS:
+            results[f"startup[{path},roles={role}]"] = startup_time(role, path, args.repeat)
+
+
+GROUPS = {
+    "signing": bench_signing,
+    "encode": bench_encode,
+    "verify": bench_verify,
+    "agents": bench_agents,
+    "endpoints": bench_endpoints,
+    "startup": bench_startup,
+}
+
+
+def run(args):
+    results = {}
+    with tempfile.TemporaryDirectory() as workdir:
+        play, store = setup_app(workdir)
+        # Keep the endpoint benchmarks from printing every request
+        stdout, sys.stdout = sys.stdout, open(os.devnull, "w")
+        try:
+            for group, bench in GROUPS.items():
+                if not args.only or group in args.only:
+                    bench(play, store, results, args)
+        finally:
+            sys.stdout.close()
+            sys.stdout = stdout
+    return results
+
+
+def environment():
+    """Describe the machine so baselines from different hosts aren't mixed up"""
+    import ggwave
+    return {
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "machine": platform.machine(),
+        "cpu_count": os.cpu_count(),
+        "numpy": np.__version__,
+        "ggwave": getattr(ggwave, "__version__", "unknown"),
+        "timestamp": time.time(),
+    }
+
+
+def compare(results, baseline, threshold):
+    """
+    Print each benchmark against a baseline
+
+    Returns:
+        Names of benchmarks whose median got slower by more than threshold
+    """
+    regressions = []
+    print(f"{'benchmark':<52} {'baseline':>12} {'current':>12} {'change':>8}")
+    for name, result in results.items():
+        before = baseline.get(name)
+        if before is None:
+            print(f"{name:<52} {'-':>12} {result['median_us']:>10.1f}us {'new':>8}")
+            continue
+        change = result["median_us"] / before["median_us"] - 1
+        flag = ""
+        if change > threshold:
+            regressions.append(name)
+            flag = "  REGRESSION"
+        print(f"{name:<52} {before['median_us']:>10.1f}us {result['median_us']:>10.1f}us {change:>+7.1%}{flag}")
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark VoxVerify signing, encoding, verification and endpoints")
+    parser.add_argument("--save", metavar="PATH", help="Write results as a JSON baseline")
+    parser.add_argument("--compare", metavar="PATH", help="Compare against a saved baseline")
+    parser.add_argument("--threshold", type=float, default=0.1,
+                        help="Slowdown (as a fraction of the baseline median) reported as a regression")
+    parser.add_argument("--only", action="append", choices=tuple(GROUPS),
+                        help="Run only this group, may be repeated")
+    parser.add_argument("--quick", action="store_true", help="Fewer protocols and shorter runs")
+    parser.add_argument("--min-time", type=float, default=0.2, help="Seconds per timed run")
+    parser.add_argument("--repeat", type=int, default=5, help="Timed runs per benchmark")
+    args = parser.parse_args(argv)
+    if args.quick:
+        args.min_time, args.repeat = min(args.min_time, 0.05), min(args.repeat, 3)
+
+    results = run(args)
+
+    if args.compare:
+        with open(args.compare) as baseline_file:
+            baseline = json.load(baseline_file)
+        regressions = compare(results, baseline["results"], args.threshold)
+    else:
+        regressions = []
+        for name, result in results.items():
+            modules = f"  loads {', '.join(result['modules']) or 'no heavy modules'}" if "modules" in result else ""
+            print(f"{name:<52} {result['median_us']:>10.1f}us {result['ops_per_sec']:>12.0f}/s{modules}")
+
+    if args.save:
+        with open(args.save, "w") as output:
+            json.dump({"environment": environment(), "results": results}, output, indent=2)
+        print(f"Saved {len(results)} results to {args.save}")
+
+    if regressions:
+        print(f"{len(regressions)} benchmarks regressed by more than {args.threshold:.0%}", file=sys.stderr)
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
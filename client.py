@@ -1,7 +1,28 @@
 # Minimal imports
+import asyncio
 from solders.keypair import Keypair  # For key handling
 from solders.pubkey import Pubkey    # For addresses
 from solana.rpc.api import Client    # For RPC communication
+from solana.rpc.async_api import AsyncClient  # For non-blocking RPC communication
+from solana.rpc.types import DataSliceOpts    # For partial account reads
+from metrics import stage_timer, RPC_REQUESTS
+
+# Program that stores the agent accounts
+PROGRAM_ID = "MGEB8Ba6ydpGj3FgjA9q79Az37xX9nuvBKbGqV2n8Ji"
+
+# getMultipleAccounts accepts at most this many addresses per request
+MAX_MULTIPLE_ACCOUNTS = 100
+
+
+class RPCError(Exception):
+    """Raised when the RPC node answers a request with an error"""
+
+
+def _check(response):
+    # solana-py hands JSON-RPC errors back as error objects instead of raising
+    if not hasattr(response, "value"):
+        raise RPCError(getattr(response, "message", str(response)))
+    return response
 
 class Agent:
     """Agent data structure"""
@@ -24,6 +45,39 @@ class Agent:
             "avg_customer_rating": self.avg_customer_rating
         }
     
+    @classmethod
+    def from_account_data(cls, data):
+        """Create from raw account data"""
+        # Skip the first byte (instruction identifier)
+        data = bytes(data[1:])
+        
+        # Helper function to read a string field
+        def read_string(data, pos):
+            # Read length (4 bytes)
+            length = int.from_bytes(data[pos:pos+4], 'little')
+            # Read string data
+            string_data = data[pos+4:pos+4+length].decode('utf-8')
+            # Return string and new position
+            return string_data, pos+4+length
+        
+        # Read all fields
+        pos = 0
+        agent_name, pos = read_string(data, pos)
+        agent_id, pos = read_string(data, pos)
+        agent_public_key, pos = read_string(data, pos)
+        signing_authority, pos = read_string(data, pos)
+        number_of_calls, pos = read_string(data, pos)
+        avg_customer_rating, pos = read_string(data, pos)
+        
+        return cls(
+            agent_name=agent_name,
+            agent_id=agent_id,
+            agent_public_key=agent_public_key,
+            signing_authority=signing_authority,
+            number_of_calls=number_of_calls,
+            avg_customer_rating=avg_customer_rating
+        )
+    
     @classmethod
     def from_dict(cls, data):
         """Create from dictionary"""
@@ -41,11 +95,33 @@ class AgentStoreClient:
     def __init__(self, rpc_url="http://localhost:8899"):
         self.client = Client(rpc_url)
         # Replace with your program ID after deployment
-        self.program_id = Pubkey.from_string("MGEB8Ba6ydpGj3FgjA9q79Az37xX9nuvBKbGqV2n8Ji")
+        self.program_id = Pubkey.from_string(PROGRAM_ID)
     
-    def get_program_accounts(self):
-        """Get all accounts owned by the program"""
-        response = self.client.get_program_accounts(self.program_id)
+    def _rpc(self, call, *args, **kwargs):
+        # Every request goes through here so it's timed and counted
+        outcome = "error"
+        try:
+            with stage_timer("rpc_fetch"):
+                response = _check(call(*args, **kwargs))
+            outcome = "ok"
+            return response
+        finally:
+            RPC_REQUESTS.inc(method=call.__name__, outcome=outcome)
+    
+    def get_program_accounts(self, data_slice=None):
+        """
+        Get all accounts owned by the program
+        
+        Args:
+            data_slice: Optional (offset, length) to read only part of each account
+        """
+        if data_slice is None:
+            response = self._rpc(self.client.get_program_accounts, self.program_id)
+        else:
+            response = self._rpc(
+                self.client.get_program_accounts,
+                self.program_id, encoding="base64", data_slice=DataSliceOpts(offset=data_slice[0], length=data_slice[1])
+            )
         accounts = []
         
         if response.value:
@@ -59,10 +135,125 @@ class AgentStoreClient:
         
         return accounts
     
+    def find_agent_address(self, agent_id):
+        """Derive the PDA (Program Derived Address) for an agent"""
+        seeds = [bytes(agent_id, 'utf-8')]
+        agent_pubkey, _ = Pubkey.find_program_address(seeds, self.program_id)
+        return agent_pubkey
+    
     def get_account_info(self, pubkey):
         """Get info for a specific account"""
-        response = self.client.get_account_info(pubkey)
+        response = self._rpc(self.client.get_account_info, pubkey)
         return response.value if response.value else None
+    
+    def get_multiple_accounts(self, pubkeys, data_slice=None):
+        """
+        Get info for many accounts, one request per MAX_MULTIPLE_ACCOUNTS addresses
+        
+        Args:
+            pubkeys: Account addresses
+            data_slice: Optional (offset, length) to read only part of each account
+        """
+        if data_slice is not None:
+            data_slice = DataSliceOpts(offset=data_slice[0], length=data_slice[1])
+        accounts = []
+        for start in range(0, len(pubkeys), MAX_MULTIPLE_ACCOUNTS):
+            response = self._rpc(
+                self.client.get_multiple_accounts,
+                pubkeys[start:start + MAX_MULTIPLE_ACCOUNTS], data_slice=data_slice
+            )
+            accounts.extend(response.value)
+        return accounts
+    
+    def get_slot(self):
+        """Get the slot the RPC node has processed up to"""
+        return self._rpc(self.client.get_slot).value
+
+class AsyncAgentStoreClient:
+    """
+    asyncio counterpart of AgentStoreClient
+    
+    All requests share one pooled HTTP session. Batched reads go through
+    getMultipleAccounts, and at most `max_concurrency` requests are in
+    flight at once.
+    """
+    def __init__(self, rpc_url="http://localhost:8899", max_concurrency=8, timeout=10):
+        self.client = AsyncClient(rpc_url, timeout=timeout)
+        self.program_id = Pubkey.from_string(PROGRAM_ID)
+        self.max_concurrency = max_concurrency
+        self._semaphore = None
+    
+    async def __aenter__(self):
+        return self
+    
+    async def __aexit__(self, *exc_info):
+        await self.close()
+    
+    async def close(self):
+        """Close the pooled HTTP session"""
+        await self.client.close()
+    
+    def find_agent_address(self, agent_id):
+        """Derive the PDA (Program Derived Address) for an agent"""
+        seeds = [bytes(agent_id, 'utf-8')]
+        agent_pubkey, _ = Pubkey.find_program_address(seeds, self.program_id)
+        return agent_pubkey
+    
+    async def _limited(self, coroutine):
+        # Created lazily so it binds to the running event loop
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+        async with self._semaphore:
+            outcome = "error"
+            try:
+                with stage_timer("rpc_fetch"):
+                    response = _check(await coroutine)
+                outcome = "ok"
+                return response
+            finally:
+                RPC_REQUESTS.inc(method=coroutine.__name__, outcome=outcome)
+    
+    async def gather(self, coroutines):
+        """Run coroutines concurrently, at most max_concurrency at a time"""
+        return await asyncio.gather(*(self._limited(coroutine) for coroutine in coroutines))
+    
+    async def get_program_accounts(self):
+        """Get all accounts owned by the program"""
+        response = await self._limited(self.client.get_program_accounts(self.program_id))
+        return [{"pubkey": account.pubkey, "data": account.account.data} for account in response.value or []]
+    
+    async def get_account_info(self, pubkey):
+        """Get info for a specific account"""
+        response = await self._limited(self.client.get_account_info(pubkey))
+        return response.value if response.value else None
+    
+    async def get_multiple_accounts(self, pubkeys):
+        """Get info for many accounts; chunks of MAX_MULTIPLE_ACCOUNTS are fetched concurrently"""
+        chunks = [pubkeys[start:start + MAX_MULTIPLE_ACCOUNTS]
+                  for start in range(0, len(pubkeys), MAX_MULTIPLE_ACCOUNTS)]
+        responses = await self.gather(self.client.get_multiple_accounts(chunk) for chunk in chunks)
+        return [account for response in responses for account in response.value]
+    
+    async def get_agents(self, agent_ids):
+        """
+        Fetch many agents with as few round-trips as possible
+        
+        Args:
+            agent_ids: String IDs of the agents to retrieve
+        
+        Returns:
+            Dict of agent_id to Agent, or None for agents that don't exist
+        """
+        addresses = [self.find_agent_address(agent_id) for agent_id in agent_ids]
+        agents = {}
+        for agent_id, account in zip(agent_ids, await self.get_multiple_accounts(addresses)):
+            agents[agent_id] = None
+            if account is not None:
+                try:
+                    agents[agent_id] = Agent.from_account_data(account.data)
+                except Exception as e:
+                    print(f"Error deserializing agent {agent_id}: {e}")
+        return agents
 
 # Example usage showing just the querying part
 if __name__ == "__main__":
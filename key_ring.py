@@ -0,0 +1,308 @@
+import base64
+import binascii
+import hashlib
+import os
+import threading
+import time
+
+from cryptography.hazmat.primitives import serialization
+from cryptography.hazmat.primitives.asymmetric.ed25519 import Ed25519PublicKey
+
+from metrics import stage_timer
+
+# Key used when a request doesn't name an agent
+DEFAULT_AGENT_ID = "default"
+DEFAULT_PRIVATE_KEY_PATH = "~/.ssh/id_ed25519"
+DEFAULT_PUBLIC_KEY_PATH = "~/.ssh/id_ed25519.pub"
+
+# Bytes of the SHA-256 public key hash used as a key id
+KEY_ID_SIZE = 4
+
+# How often (in seconds) a cached key file is re-stat'ed for changes
+MTIME_CHECK_INTERVAL = 5.0
+
+_BASE58_ALPHABET = "123456789ABCDEFGHJKLMNPQRSTUVWXYZabcdefghijkmnopqrstuvwxyz"
+_BASE58_VALUES = {char: value for value, char in enumerate(_BASE58_ALPHABET)}
+
+
+class _KeyEntry:
+    """A parsed private key together with the file state it was loaded from"""
+    __slots__ = ("path", "password", "private_key", "key_id", "mtime", "checked_at")
+
+    def __init__(self, path, password):
+        self.path = path
+        self.password = password
+        self.private_key = None
+        self.key_id = None
+        self.mtime = None
+        self.checked_at = 0.0
+
+
+class KeyRing:
+    """
+    In-memory ring of parsed Ed25519 signing keys, indexed by agent_id.
+
+    Keys are read and parsed once. Afterwards the file is only stat'ed (at most
+    every `check_interval` seconds) and re-parsed when its mtime changes, so the
+    signing path does not read key files.
+    """
+    def __init__(self, check_interval=MTIME_CHECK_INTERVAL):
+        self.check_interval = check_interval
+        self._entries = {}
+        self._lock = threading.Lock()
+
+    def add(self, agent_id, private_key_path, password=None):
+        """Register a key file for an agent and load it immediately"""
+        entry = _KeyEntry(os.path.expanduser(private_key_path), password)
+        self._load(entry)
+        with self._lock:
+            self._entries[agent_id] = entry
+        return entry.private_key
+
+    def remove(self, agent_id):
+        """Forget the key for an agent"""
+        with self._lock:
+            self._entries.pop(agent_id, None)
+
+    def agent_ids(self):
+        """Return the ids of all agents with a registered key"""
+        with self._lock:
+            return list(self._entries)
+
+    def __contains__(self, agent_id):
+        return agent_id in self._entries
+
+    def get(self, agent_id=DEFAULT_AGENT_ID):
+        """
+        Return the parsed private key for an agent
+
+        Args:
+            agent_id: Agent whose key should be returned
+
+        Returns:
+            The private key object, or None if no key is registered
+        """
+        entry = self._entries.get(agent_id)
+        if entry is None:
+            return None
+
+        now = time.monotonic()
+        if now - entry.checked_at >= self.check_interval:
+            with self._lock:
+                # Another thread may have refreshed the entry while we waited
+                if now - entry.checked_at >= self.check_interval:
+                    self._refresh(entry, now)
+
+        return entry.private_key
+
+    def public_key(self, agent_id=DEFAULT_AGENT_ID):
+        """Return the public half of an agent's key, or None"""
+        private_key = self.get(agent_id)
+        return private_key.public_key() if private_key else None
+
+    def key_id(self, agent_id=DEFAULT_AGENT_ID):
+        """Return the fingerprint of an agent's key, or None"""
+        if self.get(agent_id) is None:
+            return None
+        return self._entries[agent_id].key_id
+
+    def sign(self, message_bytes, agent_id=DEFAULT_AGENT_ID):
+        """Sign bytes with an agent's key"""
+        private_key = self.get(agent_id)
+        if private_key is None:
+            raise KeyError(f"No signing key registered for agent '{agent_id}'")
+        return private_key.sign(message_bytes)
+
+    def _refresh(self, entry, now):
+        entry.checked_at = now
+        try:
+            mtime = os.stat(entry.path).st_mtime_ns
+        except OSError as e:
+            # Keep serving the key we already have if the file disappears
+            print(f"Could not stat key file {entry.path}: {e}")
+            return
+        if mtime != entry.mtime:
+            print(f"Key file {entry.path} changed, reloading")
+            self._load(entry)
+
+    def _load(self, entry):
+        with stage_timer("key_load"):
+            mtime = os.stat(entry.path).st_mtime_ns
+            with open(entry.path, "rb") as key_file:
+                private_key_data = key_file.read()
+
+            entry.private_key = serialization.load_ssh_private_key(
+                private_key_data,
+                password=entry.password
+            )
+        entry.key_id = fingerprint(entry.private_key.public_key())
+        entry.mtime = mtime
+        entry.checked_at = time.monotonic()
+
+
+def fingerprint(public_key):
+    """Short key id: the first KEY_ID_SIZE bytes of SHA-256 over the raw public key"""
+    raw = public_key.public_bytes(serialization.Encoding.Raw, serialization.PublicFormat.Raw)
+    return hashlib.sha256(raw).digest()[:KEY_ID_SIZE]
+
+
+def _base58_decode(text):
+    number = 0
+    for char in text:
+        number = number * 58 + _BASE58_VALUES[char]
+    # Leading '1's stand for leading zero bytes
+    zeros = len(text) - len(text.lstrip("1"))
+    return bytes(zeros) + number.to_bytes((number.bit_length() + 7) // 8, "big")
+
+
+def parse_public_key(text):
+    """
+    Parse an Ed25519 public key as agents register it
+
+    Accepts an OpenSSH public key line ("ssh-ed25519 AAAA... comment") or the
+    32 raw key bytes in base58 (Solana style), hex or base64.
+
+    Raises:
+        ValueError: If the text isn't an Ed25519 public key
+    """
+    text = text.strip()
+    if text.startswith("ssh-"):
+        public_key = serialization.load_ssh_public_key(text.encode())
+        if not isinstance(public_key, Ed25519PublicKey):
+            raise ValueError(f"Not an Ed25519 key: {text.split()[0]}")
+        return public_key
+
+    raw = None
+    if len(text) == 64:
+        try:
+            raw = bytes.fromhex(text)
+        except ValueError:
+            pass
+    if raw is None and len(text) == 44 and text.endswith("="):
+        try:
+            raw = base64.b64decode(text, validate=True)
+        except binascii.Error:
+            pass
+    if raw is None:
+        try:
+            raw = _base58_decode(text)
+        except KeyError:
+            raise ValueError("Public key is not OpenSSH, base58, hex or base64") from None
+    if len(raw) != 32:
+        raise ValueError(f"Ed25519 public keys are 32 bytes, got {len(raw)}")
+    return Ed25519PublicKey.from_public_bytes(raw)
+
+
+class TrustedKeys:
+    """
+    Public keys that signatures are verified against, indexed by fingerprint.
+
+    Lookups are a single dict access so verification never touches disk.
+    Truncated key ids are resolved through a prefix index.
+    """
+    def __init__(self):
+        self._keys = {}
+        self._by_prefix = {}
+
+    def add(self, agent_id, public_key):
+        """Trust a public key for an agent; returns its fingerprint"""
+        key_id = fingerprint(public_key)
+        entry = (agent_id, public_key)
+        previous = self._keys.get(key_id)
+        self._keys[key_id] = entry
+        for size in range(1, KEY_ID_SIZE):
+            candidates = self._by_prefix.setdefault(key_id[:size], [])
+            if previous is not None:
+                candidates.remove(previous)
+            candidates.append(entry)
+        return key_id
+
+    def add_ssh_public_key_file(self, agent_id, public_key_path):
+        """Trust the key in an OpenSSH .pub file"""
+        with open(os.path.expanduser(public_key_path), "rb") as key_file:
+            public_key = serialization.load_ssh_public_key(key_file.read())
+        return self.add(agent_id, public_key)
+
+    def get(self, key_id):
+        """Return (agent_id, public_key) for a fingerprint, or None"""
+        return self._keys.get(key_id)
+
+    def match(self, key_id):
+        """
+        Return every (agent_id, public_key) whose fingerprint starts with key_id
+
+        A full key id matches at most one key; an empty one matches them all.
+        """
+        if len(key_id) == KEY_ID_SIZE:
+            entry = self._keys.get(key_id)
+            return [entry] if entry is not None else []
+        if not key_id:
+            return list(self._keys.values())
+        return list(self._by_prefix.get(key_id, ()))
+
+    def __len__(self):
+        return len(self._keys)
+
+
+class SignerMatch:
+    """The keys a signed payload was checked against, and which one verified it"""
+    __slots__ = ("candidates", "registered", "skipped", "position")
+
+    def __init__(self, candidates, registered, skipped, position):
+        # Every (agent_id, public_key) tried, registered ones first
+        self.candidates = candidates
+        # How many of the candidates came from the registry
+        self.registered = registered
+        # Registered keys ignored because the key id matched too many of them
+        self.skipped = skipped
+        # Index of the key that verified the signature, or None
+        self.position = position
+
+    @property
+    def verified(self):
+        return self.position is not None
+
+    @property
+    def agent_id(self):
+        return self.candidates[self.position][0] if self.verified else None
+
+    @property
+    def public_key(self):
+        return self.candidates[self.position][1] if self.verified else None
+
+    @property
+    def is_registered(self):
+        """Whether the verifying key came from the registry"""
+        return self.verified and self.position < self.registered
+
+
+def find_signer(payload, trusted_keys, registry=None, max_registered=None):
+    """
+    Check a signed payload against every key its key id matches
+
+    Registered keys are tried before local ones, so a key that is also
+    local reports its registry profile. A key id matching more than
+    `max_registered` registered keys ignores the registry rather than
+    trying each of them.
+
+    Args:
+        payload: SignedPayload to verify
+        trusted_keys: Local TrustedKeys
+        registry: Anything with TrustedKeys.match, e.g. RegistryKeys, or None
+        max_registered: Most registered keys to try, or None for no limit
+
+    Returns:
+        SignerMatch
+    """
+    candidates = trusted_keys.match(payload.key_id)
+    registered = []
+    skipped = 0
+    if registry is not None:
+        registered = registry.match(payload.key_id)
+        if max_registered is not None and len(registered) > max_registered:
+            skipped, registered = len(registered), []
+        candidates = registered + candidates
+    for position, (_, public_key) in enumerate(candidates):
+        if payload.verify(public_key):
+            return SignerMatch(candidates, len(registered), skipped, position)
+    return SignerMatch(candidates, len(registered), skipped, None)
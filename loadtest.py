@@ -0,0 +1,276 @@
+"""
+Load-test the identify/validate cycle over a simulated acoustic channel.
+
+Each trial signs a message, encodes the token with the same ggwave.encode
+call play() uses, passes the waveform through NumPy channel impairments
+(clock drift, gain, white noise and clipping), decodes it with the
+server's StreamDecoder and verifies the result. Trials run in a process
+pool, and decode rate, token airtime and latency percentiles are
+reported per protocol, message length and signal-to-noise ratio.
+
+    python loadtest.py --trials 100 --snr 20,0,-10 -j 8
+    python loadtest.py --protocols audible-fast,dt-fastest --json results.json
+"""
+import argparse
+import itertools
+import json
+import os
+import platform
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import ggwave
+import numpy as np
+from cryptography.hazmat.primitives.asymmetric import ed25519
+
+import signed_payload
+from key_ring import fingerprint
+from stream_decoder import StreamDecoder, DECODER_SAMPLE_RATE, SAMPLES_PER_FRAME, resample
+from waveform_cache import PROTOCOLS, parse_protocol
+
+# Characters random messages are drawn from
+ALPHABET = np.array(list("abcdefghijklmnopqrstuvwxyz0123456789 "))
+
+# Default grid: protocols, message lengths (32 is the longest sent inline) and SNRs in dB
+DEFAULT_PROTOCOLS = ("audible-fast", "audible-fastest", "ultrasound-fastest")
+DEFAULT_MESSAGE_LENGTHS = (8, 32, 64)
+DEFAULT_SNRS = (20, 0, -5, -10)
+
+# Same volume play() transmits at
+VOLUME = 20
+
+# Silence around each token, as a microphone would hear before and after it
+LEAD_IN = 0.5
+TAIL = 1.0
+
+# Samples handed to the decoder per call, about 0.3 seconds
+DECODE_BLOCK = 16 * SAMPLES_PER_FRAME
+
+# Trials sent to a worker per task, so IPC doesn't dominate short trials
+TRIALS_PER_TASK = 8
+
+PERCENTILES = (50, 90, 99)
+
+# Per-process signing key, set up by _init_worker
+_private_key = None
+_key_id = None
+
+
+class Channel:
+    """
+    Impairments applied to a transmitted waveform
+
+    Args:
+        snr_db: White noise level relative to the token's RMS power, or None for no noise
+        gain_db: Largest random gain change, in dB either way
+        drift_ppm: Largest random sample clock mismatch between speaker and microphone
+        clip: Clip samples to +/- this level (microphone saturation), or None
+    """
+    def __init__(self, snr_db=None, gain_db=0.0, drift_ppm=0.0, clip=None):
+        self.snr_db = snr_db
+        self.gain_db = gain_db
+        self.drift_ppm = drift_ppm
+        self.clip = clip
+
+    def apply(self, waveform, rng):
+        """Return the samples a microphone would capture, with silence around the token"""
+        lead_in = np.zeros(int(LEAD_IN * DECODER_SAMPLE_RATE), dtype=np.float32)
+        tail = np.zeros(int(TAIL * DECODER_SAMPLE_RATE), dtype=np.float32)
+        samples = np.concatenate((lead_in, waveform, tail))
+
+        if self.drift_ppm:
+            # A speaker clock running fast or slow stretches the whole signal
+            drift = rng.uniform(-self.drift_ppm, self.drift_ppm) * 1e-6
+            samples = resample(samples, DECODER_SAMPLE_RATE, DECODER_SAMPLE_RATE * (1 + drift))
+        if self.gain_db:
+            samples = samples * np.float32(10 ** (rng.uniform(-self.gain_db, self.gain_db) / 20))
+        if self.snr_db is not None:
+            # Noise is scaled to the token itself, not the silence around it
+            signal_rms = np.sqrt(np.mean(np.square(waveform, dtype=np.float64)))
+            noise_rms = signal_rms / 10 ** (self.snr_db / 20)
+            samples = samples + rng.standard_normal(len(samples), dtype=np.float32) * np.float32(noise_rms)
+        if self.clip is not None:
+            samples = np.clip(samples, -self.clip, self.clip)
+        return samples.astype(np.float32, copy=False)
+
+
+def _init_worker():
+    global _private_key, _key_id
+    ggwave.disableLog()
+    _private_key = ed25519.Ed25519PrivateKey.generate()
+    _key_id = fingerprint(_private_key.public_key())
+
+
+def run_trial(protocol_id, message_length, channel, encoding, rng):
+    """
+    Run one sign -> encode -> channel -> decode -> verify cycle
+
+    Returns:
+        Dict with the outcome, token size, airtime and per-stage seconds
+    """
+    message = "".join(rng.choice(ALPHABET, message_length))
+
+    start = time.perf_counter()
+    token = signed_payload.encode(signed_payload.pack(message, _private_key, _key_id, encoding=encoding), encoding)
+    signed = time.perf_counter()
+    waveform = np.frombuffer(ggwave.encode(token, protocolId=protocol_id, volume=VOLUME), dtype=np.float32)
+    encoded = time.perf_counter()
+    samples = channel.apply(waveform, rng)
+    impaired = time.perf_counter()
+
+    # Feed the capture block by block and stop at the first payload, like a live listener
+    decoder = StreamDecoder()
+    decoded, offset = None, None
+    try:
+        for block in range(0, len(samples), DECODE_BLOCK):
+            results = decoder.feed_samples(samples[block:block + DECODE_BLOCK])
+            if results:
+                offset, decoded = results[0]
+                break
+        audio_decoded = decoder.samples_decoded / DECODER_SAMPLE_RATE
+    finally:
+        decoder.close()
+    decode_done = time.perf_counter()
+
+    verified = False
+    if decoded is not None:
+        try:
+            payload = signed_payload.decode(decoded)
+            # Long messages travel as a digest, so compare whichever was sent
+            sent = payload.message if payload.message is not None else payload.digest
+            expected = message if payload.message is not None else signed_payload.message_digest(message)
+            verified = payload.verify(_private_key.public_key()) and sent == expected
+        except signed_payload.PayloadError:
+            pass
+    verify_done = time.perf_counter()
+
+    airtime = len(waveform) / DECODER_SAMPLE_RATE
+    result = {
+        "decoded": decoded is not None,
+        "verified": verified,
+        "token_bytes": len(token),
+        "airtime": airtime,
+        "audio_decoded": audio_decoded,
+        "sign": signed - start,
+        "encode": encoded - signed,
+        "impair": impaired - encoded,
+        "decode": decode_done - impaired,
+        "verify": verify_done - decode_done,
+    }
+    if decoded is not None:
+        # Stream time from the start of the token until it decoded
+        heard = offset - LEAD_IN
+        # Signing, encoding and verification run serially around the transmission;
+        # the decoder keeps up with the audio, so only the stream time counts
+        result["latency"] = result["sign"] + result["encode"] + heard + result["verify"]
+    return result
+
+
+def run_task(cell, trials, channel, encoding, seed):
+    """Run a batch of trials for one grid cell in a worker"""
+    protocol_id, message_length, _ = cell
+    rng = np.random.default_rng(seed)
+    return cell, [run_trial(protocol_id, message_length, channel, encoding, rng) for _ in range(trials)]
+
+
+def summarize(results):
+    """Reduce a cell's trial results to rates, means and latency percentiles"""
+    count = len(results)
+    verified = sum(result["verified"] for result in results)
+    latencies = np.array([result["latency"] for result in results if result["verified"]])
+    summary = {
+        "trials": count,
+        "decode_rate": sum(result["decoded"] for result in results) / count,
+        "verify_rate": verified / count,
+        "token_bytes": results[0]["token_bytes"],
+        "airtime": float(np.mean([result["airtime"] for result in results])),
+        # Decode compute per second of audio; under 1 keeps up with a live stream
+        "decode_rtf": float(np.sum([result["decode"] for result in results]) /
+                            np.sum([result["audio_decoded"] for result in results])),
+    }
+    for stage in ("sign", "encode", "impair", "decode", "verify"):
+        summary[f"{stage}_ms"] = float(np.mean([result[stage] for result in results]) * 1e3)
+    for percentile in PERCENTILES:
+        summary[f"latency_p{percentile}"] = float(np.percentile(latencies, percentile)) if len(latencies) else None
+    return summary
+
+
+def parse_list(text, convert):
+    return tuple(convert(item) for item in text.split(",") if item.strip())
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Load-test identify/validate over a simulated acoustic channel")
+    parser.add_argument("--protocols", default=",".join(DEFAULT_PROTOCOLS),
+                        help=f"Comma-separated ggwave protocols by name or id ({', '.join(PROTOCOLS)})")
+    parser.add_argument("--message-lengths", default=",".join(map(str, DEFAULT_MESSAGE_LENGTHS)),
+                        help="Comma-separated message lengths in characters")
+    parser.add_argument("--snr", default=",".join(map(str, DEFAULT_SNRS)),
+                        help="Comma-separated signal-to-noise ratios in dB; 'inf' for no noise")
+    parser.add_argument("--trials", type=int, default=50, help="Trials per protocol, length and SNR")
+    parser.add_argument("--encoding", choices=signed_payload.ENCODINGS, default="base64", help="Token encoding")
+    parser.add_argument("--gain-db", type=float, default=6, help="Random gain change of up to this many dB")
+    parser.add_argument("--drift-ppm", type=float, default=100, help="Random clock drift of up to this many ppm")
+    parser.add_argument("--clip", type=float, default=0.9, help="Clip level; 0 disables clipping")
+    parser.add_argument("-j", "--jobs", type=int, default=os.cpu_count(), help="Worker processes")
+    parser.add_argument("--seed", type=int, default=0, help="Random seed, for repeatable runs")
+    parser.add_argument("--json", metavar="PATH", help="Write the summary as JSON")
+    args = parser.parse_args(argv)
+
+    try:
+        protocols = parse_list(args.protocols, parse_protocol)
+        lengths = parse_list(args.message_lengths, int)
+        snrs = parse_list(args.snr, lambda value: None if value.strip() == "inf" else float(value))
+    except ValueError as e:
+        parser.error(str(e))
+
+    cells = list(itertools.product(protocols, lengths, snrs))
+    results = {cell: [] for cell in cells}
+    started = time.perf_counter()
+    with ProcessPoolExecutor(max_workers=args.jobs, initializer=_init_worker) as executor:
+        futures = []
+        seeds = itertools.count(args.seed * 1000003)
+        for cell in cells:
+            channel = Channel(cell[2], args.gain_db, args.drift_ppm, args.clip or None)
+            for first in range(0, args.trials, TRIALS_PER_TASK):
+                trials = min(TRIALS_PER_TASK, args.trials - first)
+                futures.append(executor.submit(run_task, cell, trials, channel, args.encoding, next(seeds)))
+        for done, future in enumerate(as_completed(futures), 1):
+            cell, trial_results = future.result()
+            results[cell].extend(trial_results)
+            print(f"\r{done}/{len(futures)} tasks", end="", file=sys.stderr)
+    elapsed = time.perf_counter() - started
+    print(file=sys.stderr)
+
+    names = {protocol_id: name for name, protocol_id in PROTOCOLS.items()}
+    print(f"{'protocol':<20} {'msg':>4} {'bytes':>5} {'snr':>5} {'decoded':>8} {'verified':>8} "
+          f"{'airtime':>8} {'p50':>7} {'p90':>7} {'p99':>7} {'rtf':>6}")
+    rows = []
+    for (protocol_id, length, snr) in cells:
+        summary = summarize(results[(protocol_id, length, snr)])
+        rows.append(dict(protocol=names[protocol_id], message_length=length, snr_db=snr, **summary))
+        latency = [f"{summary[f'latency_p{p}']:>6.2f}s" if summary[f"latency_p{p}"] is not None else f"{'-':>7}"
+                   for p in PERCENTILES]
+        print(f"{names[protocol_id]:<20} {length:>4} {summary['token_bytes']:>5} "
+              f"{'inf' if snr is None else f'{snr:g}':>5} {summary['decode_rate']:>8.1%} {summary['verify_rate']:>8.1%} "
+              f"{summary['airtime']:>7.2f}s {' '.join(latency)} {summary['decode_rtf']:>6.3f}")
+
+    total = len(cells) * args.trials
+    # Cycles the pool pushed through per second, ignoring airtime: the compute ceiling
+    print(f"\n{total} trials in {elapsed:.1f}s on {args.jobs} workers: {total / elapsed:.1f} cycles/s")
+
+    if args.json:
+        with open(args.json, "w") as output:
+            json.dump({
+                "environment": {"python": platform.python_version(), "platform": platform.platform(),
+                                "cpu_count": os.cpu_count(), "jobs": args.jobs},
+                "settings": {key: value for key, value in vars(args).items() if key != "json"},
+                "cycles_per_sec": total / elapsed,
+                "results": rows,
+            }, output, indent=2)
+        print(f"Saved {len(rows)} rows to {args.json}")
+
+
+if __name__ == "__main__":
+    main()
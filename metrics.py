@@ -0,0 +1,203 @@
+import bisect
+import math
+import threading
+import time
+from contextlib import contextmanager
+
+# Histogram bucket upper bounds in seconds, from sub-millisecond signing up to long playbacks
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+
+# Content type of the Prometheus text exposition format
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+def _format_value(value):
+    if value == math.inf:
+        return "+Inf"
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return repr(value) if isinstance(value, float) else str(value)
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names, values, extra=()):
+    pairs = list(zip(names, values)) + list(extra)
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in pairs) + "}"
+
+
+class _Metric:
+    """Named metric with one series per combination of label values"""
+    kind = None
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def _key(self, labels):
+        if len(labels) != len(self.labelnames):
+            raise ValueError(f"{self.name} expects labels {self.labelnames}, got {tuple(labels)}")
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        with self._lock:
+            series = sorted(self._series.items())
+        for values, state in series:
+            lines.extend(self._render_series(values, state))
+        return lines
+
+
+class Counter(_Metric):
+    """Monotonically increasing count"""
+    kind = "counter"
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._series[key] = self._series.get(key, 0) + amount
+
+    def value(self, **labels):
+        return self._series.get(self._key(labels), 0)
+
+    def _render_series(self, values, count):
+        return [f"{self.name}{_format_labels(self.labelnames, values)} {_format_value(count)}"]
+
+
+class Histogram(_Metric):
+    """
+    Distribution of observed values in fixed buckets.
+
+    Each series keeps per-bucket counts plus the sum and count of every
+    observation; cumulative bucket counts are only computed when rendered.
+    """
+    kind = "histogram"
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            state = self._series.get(key)
+            if state is None:
+                # Bucket counts, then the +Inf bucket, sum and count
+                state = self._series[key] = [0] * (len(self.buckets) + 1) + [0.0, 0]
+            state[index] += 1
+            state[-2] += value
+            state[-1] += 1
+
+    @contextmanager
+    def time(self, **labels):
+        """Observe how long the with-block takes"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def _render_series(self, values, state):
+        lines = []
+        cumulative = 0
+        for bound, count in zip(self.buckets + (math.inf,), state):
+            cumulative += count
+            labels = _format_labels(self.labelnames, values, [("le", _format_value(float(bound)))])
+            lines.append(f"{self.name}_bucket{labels} {cumulative}")
+        labels = _format_labels(self.labelnames, values)
+        lines.append(f"{self.name}_sum{labels} {_format_value(state[-2])}")
+        lines.append(f"{self.name}_count{labels} {state[-1]}")
+        return lines
+
+
+class Gauge(_Metric):
+    """Value read from a callback each time metrics are rendered"""
+    kind = "gauge"
+
+    def __init__(self, name, documentation, read_fn):
+        super().__init__(name, documentation)
+        self.read_fn = read_fn
+
+    def render(self):
+        try:
+            value = self.read_fn()
+        except Exception as e:
+            print(f"Error reading gauge {self.name}: {e}")
+            return []
+        if value is None:
+            return []
+        return [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} gauge",
+                f"{self.name} {_format_value(value)}"]
+
+
+class Registry:
+    """Collection of metrics rendered together on /metrics"""
+    def __init__(self):
+        self._metrics = {}
+        self._lock = threading.Lock()
+
+    def register(self, metric):
+        """
+        Add a metric, or return the one already registered under its name
+
+        Re-registering (e.g. when a module is reloaded) keeps existing
+        counts; a gauge's callback is replaced.
+        """
+        with self._lock:
+            existing = self._metrics.get(metric.name)
+            if existing is not None:
+                if type(existing) is not type(metric):
+                    raise ValueError(f"Metric {metric.name} is already registered as a {existing.kind}")
+                if not isinstance(metric, Gauge):
+                    return existing
+            self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name, documentation, labelnames=()):
+        return self.register(Counter(name, documentation, labelnames))
+
+    def histogram(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        return self.register(Histogram(name, documentation, labelnames, buckets))
+
+    def gauge(self, name, documentation, read_fn):
+        return self.register(Gauge(name, documentation, read_fn))
+
+    def render(self):
+        """Return every metric in the Prometheus text format"""
+        with self._lock:
+            metrics = list(self._metrics.values())
+        lines = []
+        for metric in metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+# Process-wide registry served by /metrics
+registry = Registry()
+
+# Latency of each identify/validate pipeline stage
+STAGE_SECONDS = registry.histogram(
+    "voxverify_stage_seconds",
+    "Time spent in each pipeline stage",
+    ["stage"]
+)
+
+# RPC requests made to the agent store, by method and outcome
+RPC_REQUESTS = registry.counter(
+    "voxverify_rpc_requests_total",
+    "Agent store RPC requests",
+    ["method", "outcome"]
+)
+
+
+def stage_timer(stage):
+    """Time a with-block as one pipeline stage"""
+    return STAGE_SECONDS.time(stage=stage)
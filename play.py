@@ -1,246 +1,758 @@
-import ggwave
 import time
-import sounddevice as sd
-import numpy as np
 import os
-from cryptography.hazmat.primitives import serialization
-from cryptography.hazmat.primitives.asymmetric import ed25519
-from cryptography.hazmat.primitives import hashes
-from cryptography.hazmat.primitives.asymmetric import padding
-from cryptography.hazmat.primitives.asymmetric import utils
 import base64
-from flask import Flask, request, jsonify, abort, render_template, send_from_directory
-from client import AgentStoreClient, Agent
+import json
+import itertools
+import threading
+import weakref
+from concurrent.futures import ThreadPoolExecutor
+from flask import Blueprint, Flask, Response, request, jsonify, abort, render_template, send_from_directory, stream_with_context
+import metrics
+from metrics import stage_timer
+from key_ring import KeyRing, TrustedKeys, find_signer, DEFAULT_AGENT_ID, DEFAULT_PRIVATE_KEY_PATH, DEFAULT_PUBLIC_KEY_PATH, KEY_ID_SIZE
+from playback import PlaybackScheduler, QueueFullError
+import signed_payload
+from signature_store import create_signature_store, DEFAULT_TTL, DEFAULT_MAX_ENTRIES
+from replay_cache import create_replay_filter, DEFAULT_FP_RATE, DEFAULT_MAX_BYTES as DEFAULT_REPLAY_MAX_BYTES
 
-app = Flask(__name__, static_folder='static', template_folder='templates')
+# The audio stack (ggwave, numpy, sounddevice) and the Solana client are
+# imported inside the functions that use them, so a verify-only server
+# starts with just Flask and the Ed25519 code.
+
+# Route groups a server can enable; see create_app()
+ROLES = ('identify', 'verify', 'agents')
 
 # Global variables for audio recording
 SAMPLE_RATE = 48000
 
-# Store mappings between signatures and original messages
-signature_message_map = {}
+# ggwave transmission settings used by play(); /identify and /waveform can override the protocol.
+# The protocol may be given by id or name and is checked when the identify routes are enabled.
+PROTOCOL_ID = os.environ.get('VOXVERIFY_PROTOCOL', 1)
+VOLUME = 20
 
-def play(message):
-    # Encode with default settings - fixed API to match the ggwave Python library
-    # The API is different from what was previously used
-    import ggwave
-    import numpy as np
-    
-    # Generate waveform using the correct API
-    waveform = ggwave.encode(message, protocolId=1, volume=20)
+# How /identify tokens are sent on air by default: base64 text, base85 text
+# or raw bytes, with a 4, 2, 1 or 0 byte key id. Shorter tokens play faster.
+PAYLOAD_ENCODING = os.environ.get('VOXVERIFY_PAYLOAD_ENCODING', 'base64')
+PAYLOAD_KEY_ID_SIZE = int(os.environ.get('VOXVERIFY_PAYLOAD_KEY_ID_SIZE', KEY_ID_SIZE))
+
+# Output stream shared by every transmission, created on first playback.
+# VOXVERIFY_AUDIO_SINK picks sounddevice (default), wav:<path> or null.
+audio_engine = None
+
+# Encoded waveforms keyed by (payload, protocol, volume), created on first use
+waveform_cache = None
+
+# Store mappings between signatures and original messages. Use
+# VOXVERIFY_SIGNATURE_STORE=sqlite:///path/to/signatures.db to share it between workers.
+signature_store = create_signature_store(
+    os.environ.get('VOXVERIFY_SIGNATURE_STORE', 'memory'),
+    ttl=float(os.environ.get('VOXVERIFY_SIGNATURE_TTL', DEFAULT_TTL)),
+    max_entries=int(os.environ.get('VOXVERIFY_SIGNATURE_MAX_ENTRIES', DEFAULT_MAX_ENTRIES))
+)
+
+# Parsed signing keys, loaded once and reloaded only when the key file changes
+key_ring = KeyRing()
+key_ring_loaded = False
+key_ring_lock = threading.Lock()
+
+# Public keys signed payloads are verified against, indexed by key id
+trusted_keys = TrustedKeys()
+trusted_keys_loaded = False
+trusted_keys_lock = threading.Lock()
+
+# Thread pool for /validate/batch, created on first use
+VERIFY_WORKERS = int(os.environ.get('VOXVERIFY_VERIFY_WORKERS', min(32, (os.cpu_count() or 1) + 4)))
+verify_executor = None
+
+# Most tokens accepted by one /validate/batch request
+MAX_BATCH_SIZE = 1000
+
+# Open server-side decoders for /decode/sessions, created on first use
+decoder_sessions = None
+
+# Cached agent records and PDAs, created on first use
+agent_cache = None
+# Agent caches for clients other than the server's own, dropped with the client
+client_agent_caches = weakref.WeakKeyDictionary()
+
+# Columnar index of every registered agent; the registry is re-synced after this many seconds
+agent_index = None
+agent_index_synced_at = 0.0
+AGENT_INDEX_TTL = float(os.environ.get('VOXVERIFY_AGENT_INDEX_TTL', 300))
+
+# Local registry snapshot kept up to date incrementally
+registry_sync = None
+
+# Also verify tokens against every registered agent's agent_public_key; the
+# keys are reloaded in the background every AGENT_INDEX_TTL seconds
+REGISTRY_KEYS = os.environ.get('VOXVERIFY_REGISTRY_KEYS', '0') != '0'
+registry_keys = None
+
+# Most registered keys a truncated key id may match before it's rejected as ambiguous
+MAX_REGISTRY_CANDIDATES = 8
+
+# Per-agent review aggregates, created on first /review
+review_aggregator = None
+
+# Review stats are written on chain with batch_upsert from the solana-agent-store
+# client, paid for by the keypair in VOXVERIFY_REVIEW_PAYER (a Solana CLI keypair
+# JSON file). Without one, reviews stay pending instead of being dropped.
+REVIEW_PAYER = os.environ.get('VOXVERIFY_REVIEW_PAYER', '')
+# Called with the updated Agent records after each review flush; returns
+# batch_upsert-style {agent_id: {"ok": ...}} results. Built from REVIEW_PAYER on first use.
+review_upsert = None
+
+# Bytes read from a /decode/stream request body at a time
+STREAM_READ_SIZE = 8192
+
+# Reject signed payloads older than this many seconds (0 disables the check)
+PAYLOAD_MAX_AGE = float(os.environ.get('VOXVERIFY_PAYLOAD_MAX_AGE', 0))
+
+# /validate, /validate/batch and /decode/* accept each token once within this many seconds (0 disables replay
+# detection). Keep it at least VOXVERIFY_PAYLOAD_MAX_AGE so tokens expire before
+# they are forgotten. Set VOXVERIFY_REPLAY_SHARED to a shared memory name to
+# share the seen-token filter between worker processes.
+REPLAY_WINDOW = float(os.environ.get('VOXVERIFY_REPLAY_WINDOW', 0))
+replay_filter = None
+
+# Longest a client may long-poll a playback job, in seconds
+MAX_JOB_WAIT = 30
+
+# /signatures page sizes, and how long and how often ?follow tails new signatures
+SIGNATURE_PAGE_SIZE = 100
+MAX_SIGNATURE_PAGE_SIZE = 1000
+MAX_SIGNATURE_FOLLOW = 300
+SIGNATURE_FOLLOW_POLL = 1.0
+
+# Build the per-request debug step lists /validate returns; set
+# VOXVERIFY_DEBUG_STEPS=0 in production to skip the string formatting
+DEBUG_STEPS = os.environ.get('VOXVERIFY_DEBUG_STEPS', '1') != '0'
+
+# Pipeline counters exported on /metrics, next to the stage latency histograms
+TOKENS_SIGNED = metrics.registry.counter(
+    'voxverify_tokens_signed_total', 'Tokens signed by /identify', ['outcome'])
+VERIFICATIONS = metrics.registry.counter(
+    'voxverify_verifications_total', 'Tokens checked by verify_message', ['result'])
+PLAYBACKS = metrics.registry.counter(
+    'voxverify_playbacks_total', 'Transmissions played', ['outcome'])
+REPLAYS = metrics.registry.counter(
+    'voxverify_replays_rejected_total', 'Tokens rejected as replays')
+
+def play(message, protocol_id=None, volume=VOLUME):
+    from waveform_cache import parse_protocol
+    protocol_id = parse_protocol(PROTOCOL_ID if protocol_id is None else protocol_id)
     
-    # Convert to numpy array
-    audio_data = np.frombuffer(waveform, dtype=np.float32)
+    # Encoded waveforms are cached, so replays and retries skip ggwave.encode
+    audio_data = get_waveform_cache().get(message, protocol_id, volume)
     
-    # Play audio
-    time.sleep(3)
-    sd.play(audio_data, SAMPLE_RATE)
-    print("Playing audio...")
-    sd.wait()
+    # Play audio on the persistent output stream; queued tokens follow each other without reopening it
+    outcome = "error"
+    try:
+        print("Playing audio...")
+        get_audio_engine().play(audio_data)
+        outcome = "ok"
+    finally:
+        PLAYBACKS.inc(outcome=outcome)
     
     print(f"Played message: '{message}' using ggwave")
 
-def encrypt(message):
-    # Path to the private key
-    private_key_path = os.path.expanduser("~/.ssh/id_ed25519")
-    
-    try:
-        # Read the private key file
-        with open(private_key_path, "rb") as key_file:
-            private_key_data = key_file.read()
-            
-        # Load the private key
-        private_key = serialization.load_ssh_private_key(
-            private_key_data,
-            password=None  # Assuming no password protection
+def get_audio_engine():
+    """Return the playback engine, creating the configured audio sink on first use"""
+    global audio_engine
+    if audio_engine is None:
+        from audio_output import AudioEngine, create_sink, DEFAULT_LEAD_IN
+        audio_engine = AudioEngine(
+            create_sink(os.environ.get('VOXVERIFY_AUDIO_SINK', 'sounddevice'),
+                        realtime=os.environ.get('VOXVERIFY_AUDIO_REALTIME', '0') == '1'),
+            SAMPLE_RATE,
+            lead_in=float(os.environ.get('VOXVERIFY_PLAYBACK_LEAD_IN', DEFAULT_LEAD_IN)),
+            gap=float(os.environ.get('VOXVERIFY_PLAYBACK_GAP', 0))
         )
-        
+    return audio_engine
+
+def get_waveform_cache():
+    """Return the shared waveform cache, loading ggwave on first use"""
+    global waveform_cache
+    if waveform_cache is None:
+        from waveform_cache import WaveformCache, DEFAULT_MAX_BYTES
+        waveform_cache = WaveformCache(
+            max_bytes=int(os.environ.get('VOXVERIFY_WAVEFORM_CACHE_BYTES', DEFAULT_MAX_BYTES))
+        )
+    return waveform_cache
+
+# Background transmitter so /identify doesn't hold a request thread for the whole playback
+playback_scheduler = PlaybackScheduler(play, max_queue=int(os.environ.get('VOXVERIFY_PLAYBACK_QUEUE', 32)))
+
+def get_key_ring():
+    """Return the process-wide key ring, registering the configured keys on first use"""
+    global key_ring_loaded
+    if not key_ring_loaded:
+        # Requests arriving during the first load wait for it instead of seeing an empty ring
+        with key_ring_lock:
+            if not key_ring_loaded:
+                try:
+                    key_ring.add(DEFAULT_AGENT_ID, DEFAULT_PRIVATE_KEY_PATH)
+                except Exception as e:
+                    print(f"Error loading default signing key: {e}")
+                # Extra signing keys, e.g. VOXVERIFY_AGENT_KEYS="agent001=~/.ssh/agent001";
+                # if one fails to load, the next call tries again
+                load_agent_keys(os.environ.get('VOXVERIFY_AGENT_KEYS', ''))
+                key_ring_loaded = True
+    return key_ring
+
+def load_agent_keys(spec):
+    """
+    Register additional agent keys from a spec string
+
+    Args:
+        spec: Comma-separated list of agent_id=private_key_path pairs
+    """
+    for item in filter(None, (part.strip() for part in spec.split(','))):
+        agent_id, _, private_key_path = item.partition('=')
+        key_ring.add(agent_id.strip(), private_key_path.strip())
+        print(f"Loaded signing key for agent '{agent_id.strip()}'")
+
+def get_trusted_keys():
+    """Return the public keys tokens are verified against, loading the local key on first use"""
+    global trusted_keys_loaded
+    if not trusted_keys_loaded:
+        # Tokens verified during the first load wait for it instead of finding no keys
+        with trusted_keys_lock:
+            if not trusted_keys_loaded:
+                try:
+                    trusted_keys.add_ssh_public_key_file(DEFAULT_AGENT_ID, DEFAULT_PUBLIC_KEY_PATH)
+                except Exception as e:
+                    print(f"Error loading public key: {e}")
+                ring = get_key_ring()
+                for agent_id in ring.agent_ids():
+                    trusted_keys.add(agent_id, ring.public_key(agent_id))
+                trusted_keys_loaded = True
+    return trusted_keys
+
+def encrypt(message, agent_id=DEFAULT_AGENT_ID, encoding=None, key_id_size=None):
+    """
+    Sign a message into a transmittable token
+
+    Args:
+        message: Text being vouched for
+        agent_id: Agent whose key signs it
+        encoding: "base64", "base85" or "raw" (default PAYLOAD_ENCODING)
+        key_id_size: Key id bytes to include (default PAYLOAD_KEY_ID_SIZE)
+
+    Returns:
+        The token (text, or bytes for raw), or None if signing failed
+    """
+    encoding = encoding or PAYLOAD_ENCODING
+    key_id_size = PAYLOAD_KEY_ID_SIZE if key_id_size is None else key_id_size
+    try:
         # Since Ed25519 is a signature algorithm, not an encryption algorithm,
-        # we'll sign the message instead of encrypting it
-        signature = private_key.sign(message.encode())
+        # we'll sign the message instead of encrypting it. The key ring keeps
+        # the parsed key in memory so nothing is read from disk here.
+        ring = get_key_ring()
+        private_key = ring.get(agent_id)
+        if private_key is None:
+            raise KeyError(f"No signing key registered for agent '{agent_id}'")
+        key_id = ring.key_id(agent_id)
+        
+        # Pack the message, timestamp and key id with the signature so any
+        # validator holding the public key can verify the token on its own
+        with stage_timer("sign"):
+            payload = signed_payload.pack(message, private_key, key_id, encoding=encoding, key_id_size=key_id_size)
+            encoded_signature = signed_payload.encode(payload, encoding)
         
-        # Base64 encode the signature for better display
-        encoded_signature = base64.b64encode(signature).decode('utf-8')
+        # Keep verifying our own tokens if the key file was rotated
+        if get_trusted_keys().get(key_id) is None:
+            trusted_keys.add(agent_id, private_key.public_key())
         
         # Store the mapping between signature and message
-        signature_message_map[encoded_signature] = message
+        signature_store.put(signed_payload.token_text(encoded_signature), message)
         
         print(f"Successfully signed message: '{message}'")
-        print(f"Signature: {encoded_signature}")
+        print(f"Signature: {signed_payload.token_text(encoded_signature)}")
         
+        TOKENS_SIGNED.inc(outcome="ok")
         return encoded_signature
         
     except Exception as e:
         print(f"Error encrypting message: {e}")
+        TOKENS_SIGNED.inc(outcome="error")
         return None
 
-def verify_message(encoded_signature):
+def get_replay_filter():
+    """Return the seen-token filter, or None if replay detection is disabled"""
+    global replay_filter
+    if replay_filter is None and REPLAY_WINDOW > 0:
+        replay_filter = create_replay_filter(
+            window=REPLAY_WINDOW,
+            fp_rate=float(os.environ.get('VOXVERIFY_REPLAY_FP_RATE', DEFAULT_FP_RATE)),
+            max_bytes=int(os.environ.get('VOXVERIFY_REPLAY_MAX_BYTES', DEFAULT_REPLAY_MAX_BYTES)),
+            shared=os.environ.get('VOXVERIFY_REPLAY_SHARED', '')
+        )
+        if not PAYLOAD_MAX_AGE or PAYLOAD_MAX_AGE > REPLAY_WINDOW:
+            print("Warning: tokens outlive the replay window; set VOXVERIFY_PAYLOAD_MAX_AGE <= VOXVERIFY_REPLAY_WINDOW")
+    return replay_filter
+
+def replay_key(token):
+    """Bytes identifying a token however it was encoded on air"""
+    try:
+        # The signature covers the whole payload, so base64, base85 and raw
+        # copies of one token share it
+        return signed_payload.decode(token).signature
+    except signed_payload.PayloadError:
+        return signed_payload.token_text(token).encode()
+
+def _step(debug_info, text, *args):
+    # Step strings are only formatted when debug steps are being collected
+    steps = debug_info["steps"]
+    if steps is not None:
+        steps.append(text % args if args else text)
+
+def verify_message(encoded_signature, collect_debug=True):
     debug_info = {
-        "steps": [],
+        "steps": [] if collect_debug else None,
         "errors": []
     }
+    try:
+        with stage_timer("verify"):
+            result = _verify_message(encoded_signature, debug_info)
+    except Exception:
+        VERIFICATIONS.inc(result="error")
+        raise
+    VERIFICATIONS.inc(result="verified" if result[0] else "rejected")
+    if not collect_debug:
+        del debug_info["steps"]
+    return result
+
+def _verify_message(encoded_signature, debug_info):
+    # Signed payloads carry everything needed to verify them
+    try:
+        payload = signed_payload.decode(encoded_signature)
+    except signed_payload.PayloadError as e:
+        payload = None
+        _step(debug_info, "Not a signed payload: %s", e)
+    
+    if payload is not None:
+        _step(debug_info, "Signed payload with key id %s", payload.key_id.hex())
+        
+        # A full key id picks one key; a truncated or absent one may match several
+        registry = get_registry_keys()
+        match = find_signer(payload, get_trusted_keys(), registry, max_registered=MAX_REGISTRY_CANDIDATES)
+        if match.skipped:
+            _step(debug_info, "Key id matches %d registered keys; ignoring the registry", match.skipped)
+        if not match.candidates:
+            debug_info["errors"].append(f"Unknown key id {payload.key_id.hex()}")
+            return False, None, debug_info
+        
+        if not match.verified:
+            debug_info["errors"].append("Invalid signature")
+            if len(match.candidates) == 1:
+                _step(debug_info, "Signature does not match key for agent '%s'", match.candidates[0][0])
+            else:
+                _step(debug_info, "Signature does not match any of %d candidate keys", len(match.candidates))
+            return False, None, debug_info
+        if match.agent_id is None:
+            # A registered key claimed by several agents: the signature is good,
+            # but it can't say which of them sent the token
+            debug_info["ambiguous"] = list(registry.claimants(match.public_key))
+            _step(debug_info, "Signature verified with a key registered by agents %s", ", ".join(debug_info["ambiguous"]))
+        else:
+            _step(debug_info, "Signature verified with key for agent '%s'", match.agent_id)
+            debug_info["signer"] = match.agent_id
+        if match.is_registered:
+            debug_info["registered"] = True
+        
+        if PAYLOAD_MAX_AGE and payload.age() > PAYLOAD_MAX_AGE:
+            debug_info["errors"].append(f"Payload expired ({int(payload.age())}s old)")
+            return False, None, debug_info
+        
+        original_message = payload.message
+        if original_message is None:
+            # Long messages are sent as a digest; recover the text if we issued it
+            original_message = signature_store.get(signed_payload.token_text(encoded_signature))
+            _step(debug_info, "Payload carries a message digest")
+        return True, original_message, debug_info
     
     # Check if this is a known signature
-    if encoded_signature in signature_message_map:
-        original_message = signature_message_map[encoded_signature]
-        debug_info["steps"].append(f"Found message in signature map: '{original_message}'")
+    original_message = signature_store.get(signed_payload.token_text(encoded_signature))
+    if original_message is not None:
+        _step(debug_info, "Found message in signature map: '%s'", original_message)
         return True, original_message, debug_info
     
     # Check if this is a mobile test signature
-    if encoded_signature.startswith("mobile_test_signature_"):
-        debug_info["steps"].append("Mobile test signature detected, auto-verifying for debugging")
+    if isinstance(encoded_signature, str) and encoded_signature.startswith("mobile_test_signature_"):
+        _step(debug_info, "Mobile test signature detected, auto-verifying for debugging")
         timestamp = encoded_signature.replace("mobile_test_signature_", "")
         test_message = f"Mobile Test ({timestamp})"
         return True, test_message, debug_info
     
-    # Path to the public key
-    public_key_path = os.path.expanduser("~/.ssh/id_ed25519.pub")
+    _step(debug_info, "This signature is not recognized")
+    return False, None, debug_info
+
+def validate_token(token, collect_debug=True):
+    """
+    Verify a token and, when replay detection is on, accept it only once
+
+    Every route that accepts tokens verifies them through here, so a token
+    turned away as a replay on one route can't get in through another.
+
+    Returns:
+        (is_verified, extracted_message, debug_info) like verify_message;
+        a replay is unverified with debug_info["replay"] set
+    """
+    # Known replays are turned away before spending a signature check on them
+    replays = get_replay_filter()
+    if replays is not None:
+        key = replay_key(token)
+        if replays.seen(key):
+            return _replay_result(token, collect_debug)
+    
+    is_verified, extracted_message, debug_info = verify_message(token, collect_debug)
     
-    try:
-        debug_info["steps"].append("Reading public key file")
-        # Read the public key file
-        with open(public_key_path, "rb") as key_file:
-            public_key_data = key_file.read()
-            debug_info["steps"].append(f"Public key data read: {len(public_key_data)} bytes")
-        
-        # Parse the public key
-        debug_info["steps"].append("Parsing public key")
-        parts = public_key_data.split()
-        debug_info["steps"].append(f"Public key parts: {len(parts)}")
-        
-        if len(parts) >= 2:
-            # The key data is the second part
-            key_data = parts[1]
-            debug_info["steps"].append(f"Key data extracted: {len(key_data)} bytes")
-            
-            # Create a proper SSH public key format
-            ssh_key = b"ssh-ed25519 " + key_data
-            debug_info["steps"].append("SSH key format created")
-            
-            try:
-                # Load the public key
-                debug_info["steps"].append("Loading public key")
-                public_key = serialization.load_ssh_public_key(ssh_key)
-                debug_info["steps"].append("Public key loaded successfully")
-                
-                # For real signature verification, we'd need a way to extract the original message
-                # from the signature, but with ed25519 this isn't possible directly.
-                # In a real system, we might encode the original message within the signed data
-                # or use a lookup table as we're doing with signature_message_map.
-                
-                debug_info["steps"].append("No message can be directly extracted from ED25519 signature")
-                debug_info["steps"].append("This signature is not recognized")
-                return False, None, debug_info
-                    
-            except Exception as key_error:
-                debug_info["errors"].append(f"Public key loading error: {str(key_error)}")
-                debug_info["steps"].append("Failed to load public key")
-                print(f"Public key loading error: {key_error}")
-                return False, None, debug_info
-                
-        else:
-            debug_info["errors"].append("Invalid public key format")
-            debug_info["steps"].append("Public key format invalid - not enough parts")
-            print("Invalid public key format")
-            return False, None, debug_info
-            
-    except Exception as e:
-        debug_info["errors"].append(f"Error verifying message: {str(e)}")
-        debug_info["steps"].append("General error in verification process")
-        print(f"Error verifying message: {e}")
-        return False, None, debug_info
+    # Only verified tokens are recorded, so junk can't crowd out real ones;
+    # add() also catches a copy that was verified concurrently
+    if is_verified and replays is not None and not replays.add(key):
+        return _replay_result(token, collect_debug)
+    return is_verified, extracted_message, debug_info
+
+def _replay_result(token, collect_debug):
+    REPLAYS.inc()
+    print(f"Rejected replayed token: {signed_payload.token_text(token)}")
+    debug_info = {
+        "steps": [] if collect_debug else None,
+        "errors": ["Token has already been validated"],
+        "replay": True
+    }
+    if not collect_debug:
+        del debug_info["steps"]
+    return False, None, debug_info
+
+def get_verify_executor():
+    """Return the shared thread pool used for batch verification"""
+    global verify_executor
+    if verify_executor is None:
+        verify_executor = ThreadPoolExecutor(max_workers=VERIFY_WORKERS, thread_name_prefix='verify')
+    return verify_executor
+
+def verify_batch(encoded_signatures, collect_debug=False):
+    """
+    Verify many tokens concurrently, rejecting replays like /validate
+    
+    Args:
+        encoded_signatures: List of decoded tokens
+        collect_debug: Whether to build the debug step lists
+    
+    Returns:
+        List of (is_verified, extracted_message, debug_info) tuples, in input order
+    """
+    def verify_chunk(chunk):
+        return [validate_token(token, collect_debug) for token in chunk]
+    
+    # Load keys once up front rather than racing to do it in every worker
+    get_trusted_keys()
+    
+    # Hand each worker a contiguous chunk instead of one future per token
+    chunk_size = max(1, -(-len(encoded_signatures) // VERIFY_WORKERS))
+    chunks = [encoded_signatures[i:i + chunk_size] for i in range(0, len(encoded_signatures), chunk_size)]
+    if len(chunks) <= 1:
+        return verify_chunk(encoded_signatures)
+    
+    results = []
+    for chunk_results in get_verify_executor().map(verify_chunk, chunks):
+        results.extend(chunk_results)
+    return results
 
 def get_agent_by_id(client, agent_id):
     """
-    Fetch an agent by its ID
+    Fetch an agent by its ID through the agent cache
     
     Args:
-        client: The AgentStoreClient instance
+        client: The AgentStoreClient instance; None for the server's own
         agent_id: String ID of the agent to retrieve
     
     Returns:
         Agent object if found, None otherwise
     """
-    # Derive the PDA (Program Derived Address) for this agent
-    seeds = [bytes(agent_id, 'utf-8')]
-    agent_pubkey, _ = Pubkey.find_program_address(seeds, client.program_id)
-    
-    # Get the account data
-    account_info = client.get_account_info(agent_pubkey)
-    
-    if not account_info:
-        print(f"No agent found with ID: {agent_id}")
+    cache = get_agent_cache()
+    if client is not None and client is not cache.client:
+        # Other stores get a cache of their own rather than bypassing it
+        cache = client_agent_caches.get(client)
+        if cache is None:
+            from agent_cache import AgentCache
+            cache = client_agent_caches[client] = AgentCache(client)
+    return cache.get(agent_id)
+
+def get_registry_sync():
+    """Return the incremental registry snapshot, resuming from its checkpoint on first use"""
+    global registry_sync
+    if registry_sync is None:
+        from registry_sync import RegistrySync
+        registry_sync = RegistrySync(
+            get_agent_cache().client,
+            checkpoint_path=os.environ.get('VOXVERIFY_REGISTRY_CHECKPOINT'),
+            full_scan_interval=float(os.environ.get('VOXVERIFY_REGISTRY_FULL_SCAN_INTERVAL', 3600))
+        )
+    return registry_sync
+
+def get_agent_index():
+    """Return the columnar agent index, syncing the registry when it's stale"""
+    global agent_index, agent_index_synced_at
+    if agent_index is None or time.time() - agent_index_synced_at > AGENT_INDEX_TTL:
+        registry = get_registry_sync()
+        result = registry.sync()
+        agent_index_synced_at = time.time()
+        # Only rebuild the index when the snapshot actually changed
+        if agent_index is None or agent_index.registry_version != registry.version:
+            from agent_index import AgentIndex
+            agent_index = AgentIndex(registry.accounts())
+            agent_index.registry_version = registry.version
+            print(f"Built agent index with {len(agent_index)} agents ({agent_index.skipped} skipped) "
+                  f"after sync {result.to_dict()}")
+    return agent_index
+
+def get_registry_keys():
+    """Return the registered agents' keys, or None if registry verification is disabled"""
+    global registry_keys
+    if registry_keys is None and REGISTRY_KEYS:
+        from registry_keys import RegistryKeys
+        registry_keys = RegistryKeys(get_agent_index, refresh_interval=AGENT_INDEX_TTL)
+    return registry_keys
+
+def signer_profile(debug_info):
+    """Return the registry profile of the agent whose key verified a token, or None"""
+    # Keys registered by several agents have no single profile to report
+    if not debug_info.get("registered") or "signer" not in debug_info:
         return None
-    
-    # Deserialize the data (implementation depends on your serialization)
-    # This is a simplified example of deserialization
-    try:
-        # Skip the first byte (instruction identifier)
-        data = account_info.data[1:]
-        
-        # Helper function to read a string field
-        def read_string(data, pos):
-            # Read length (4 bytes)
-            length = int.from_bytes(data[pos:pos+4], 'little')
-            # Read string data
-            string_data = data[pos+4:pos+4+length].decode('utf-8')
-            # Return string and new position
-            return string_data, pos+4+length
+    agent = registry_keys.profile(debug_info["signer"])
+    return agent.to_dict() if agent else None
+
+def get_agent_cache():
+    """Return the shared agent cache, connecting to the agent store on first use"""
+    global agent_cache
+    if agent_cache is None:
+        from agent_cache import AgentCache
+        from client import AgentStoreClient
+        agent_cache = AgentCache(
+            AgentStoreClient(os.environ.get('VOXVERIFY_RPC_URL', 'http://localhost:8899')),
+            ttl=float(os.environ.get('VOXVERIFY_AGENT_CACHE_TTL', 60)),
+            max_agents=int(os.environ.get('VOXVERIFY_AGENT_CACHE_SIZE', 4096))
+        )
+    return agent_cache
+
+def get_review_upsert():
+    """Return the function that writes review stats on chain, or None if no payer is configured"""
+    global review_upsert
+    if review_upsert is None and REVIEW_PAYER:
+        import importlib.util
+        # The store client is a standalone script whose module name clashes with client.py
+        path = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'solana-agent-store', 'client', 'client.py')
+        spec = importlib.util.spec_from_file_location('agent_store_client', path)
+        store_client = importlib.util.module_from_spec(spec)
+        spec.loader.exec_module(store_client)
+        from solders.keypair import Keypair
+        from client import PROGRAM_ID
         
-        # Read all fields
-        pos = 0
-        agent_name, pos = read_string(data, pos)
-        agent_id, pos = read_string(data, pos)
-        agent_public_key, pos = read_string(data, pos)
-        signing_authority, pos = read_string(data, pos)
-        number_of_calls, pos = read_string(data, pos)
-        avg_customer_rating, pos = read_string(data, pos)
+        with open(os.path.expanduser(REVIEW_PAYER)) as keypair_file:
+            payer = Keypair.from_bytes(bytes(json.load(keypair_file)))
+        store = store_client.AgentStoreClient(PROGRAM_ID, os.environ.get('VOXVERIFY_RPC_URL', 'http://localhost:8899'))
         
-        # Create and return the Agent object
-        return Agent(
-            agent_name=agent_name,
-            agent_id=agent_id,
-            agent_public_key=agent_public_key,
-            signing_authority=signing_authority,
-            number_of_calls=number_of_calls,
-            avg_customer_rating=avg_customer_rating
+        def upsert(agents):
+            return store.batch_upsert(payer, [store_client.Agent(**agent.to_dict()) for agent in agents])
+        review_upsert = upsert
+        print(f"Writing review stats on chain as {payer.pubkey()}")
+    return review_upsert
+
+def write_review_stats(updates):
+    """
+    Fold a batch of review updates into the agents' stats and write them on chain
+
+    Returns:
+        agent_ids whose reviews weren't written and should stay pending
+    """
+    upsert = get_review_upsert()
+    if upsert is None:
+        # Nothing would persist them; keep the reviews until a writer is configured
+        return [update.agent_id for update in updates]
+    
+    cache = get_agent_cache()
+    # One batched read for every agent in the flush, straight from the chain:
+    # the upsert writes absolute values, so starting from a cached record
+    # would overwrite any stats written since it was cached
+    agents = cache.get_many([update.agent_id for update in updates], fresh=True)
+    updated = []
+    for update in updates:
+        agent = agents.get(update.agent_id)
+        if agent is None:
+            print(f"Dropping {update.count} reviews for unknown agent '{update.agent_id}'")
+            continue
+        updated.append(update.apply(agent))
+    
+    results = upsert(updated) if updated else {}
+    unwritten = []
+    for agent in updated:
+        result = results.get(agent.agent_id)
+        if result is None or not result['ok']:
+            print(f"Keeping reviews for '{agent.agent_id}' pending: {result and result['error']}")
+            unwritten.append(agent.agent_id)
+            continue
+        # Serve the new stats right away instead of waiting for the cache to expire
+        cache.agents.put(agent.agent_id, agent)
+    return unwritten
+
+def get_review_aggregator():
+    """Return the review aggregator, starting its flusher on first use"""
+    global review_aggregator
+    if review_aggregator is None:
+        from review_stats import ReviewAggregator
+        review_aggregator = ReviewAggregator(
+            write_review_stats,
+            flush_interval=float(os.environ.get('VOXVERIFY_REVIEW_FLUSH_INTERVAL', 30)),
+            max_pending=int(os.environ.get('VOXVERIFY_REVIEW_MAX_PENDING', 10000))
         )
-    except Exception as e:
-        print(f"Error deserializing agent data: {e}")
-        return None
+    return review_aggregator
+
+# Queue and cache sizes, read when /metrics is scraped
+metrics.registry.gauge('voxverify_playback_queue_depth', 'Transmissions waiting to be played',
+                       lambda: playback_scheduler.pending())
+metrics.registry.gauge('voxverify_waveform_cache_bytes', 'Bytes of cached waveforms',
+                       lambda: waveform_cache.current_bytes if waveform_cache else 0)
+metrics.registry.gauge('voxverify_signature_store_entries', 'Signatures in the signature store',
+                       lambda: len(signature_store))
+metrics.registry.gauge('voxverify_replay_cache_entries', 'Tokens remembered by the replay filter',
+                       lambda: replay_filter.stats()['entries'] if replay_filter else None)
+metrics.registry.gauge('voxverify_registry_keys', 'Registered agent keys tokens are verified against',
+                       lambda: len(registry_keys) if registry_keys else None)
+metrics.registry.gauge('voxverify_review_pending', 'Reviews waiting to be flushed',
+                       lambda: review_aggregator.pending() if review_aggregator else 0)
+
+# Routes every server has: the web UI, metrics and wallet refresh
+core_routes = Blueprint('core', __name__)
+# Signing and playback
+identify_routes = Blueprint('identify', __name__)
+# Token verification and server-side decoding
+verify_routes = Blueprint('verify', __name__)
+# Agent store lookups and reviews
+agents_routes = Blueprint('agents', __name__)
 
 # Web UI routes
-@app.route('/')
+@core_routes.route('/')
 def index():
     return render_template('index.html')
 
-@app.route('/agent_profile')
+@core_routes.route('/agent_profile')
 def agent_profile():
     return render_template('agent_profile.html')
 
-@app.route('/static/<path:path>')
+@core_routes.route('/static/<path:path>')
 def serve_static(path):
     return send_from_directory('static', path)
 
-@app.route('/review', methods=['GET'])
+@agents_routes.route('/agents/<agent_id>', methods=['GET'])
+def agent_endpoint(agent_id):
+    agent = get_agent_cache().get(agent_id)
+    if agent is None:
+        abort(404, description=f"No agent found with ID: {agent_id}")
+    return jsonify({
+        'status': 'success',
+        'agent': agent.to_dict()
+    })
+
+# Several agents in one call; uncached ones are fetched with a single batched RPC
+@agents_routes.route('/agents/batch', methods=['POST'])
+def agents_batch_endpoint():
+    if not request.json or not isinstance(request.json.get('agent_ids'), list):
+        abort(400, description="Request must include an 'agent_ids' list")
+    
+    agent_ids = [str(agent_id) for agent_id in request.json['agent_ids']]
+    if len(agent_ids) > MAX_BATCH_SIZE:
+        abort(413, description=f"At most {MAX_BATCH_SIZE} agents can be fetched per request")
+    
+    agents = get_agent_cache().get_many(agent_ids)
+    return jsonify({
+        'status': 'success',
+        'agents': {agent_id: agent.to_dict() if agent else None for agent_id, agent in agents.items()}
+    })
+
+@agents_routes.route('/agents/top', methods=['GET'])
+def top_agents_endpoint():
+    try:
+        n = min(int(request.args.get('n', 10)), 1000)
+        min_calls = int(request.args.get('min_calls', 0))
+    except ValueError:
+        abort(400, description="'n' and 'min_calls' must be integers")
+    
+    index = get_agent_index()
+    return jsonify({
+        'status': 'success',
+        'total_agents': len(index),
+        'agents': [agent.to_dict() for agent in index.top_by_rating(n, min_calls)]
+    })
+
+@agents_routes.route('/agents/by_key/<agent_public_key>', methods=['GET'])
+def agent_by_key_endpoint(agent_public_key):
+    agent = get_agent_index().find_by_public_key(agent_public_key)
+    if agent is None:
+        abort(404, description=f"No agent registered with public key: {agent_public_key}")
+    return jsonify({
+        'status': 'success',
+        'agent': agent.to_dict()
+    })
+
+# Agent cache stats; POST {"invalidate": true | [ids], "prefetch": true} to refresh it
+@agents_routes.route('/agents/cache', methods=['GET', 'POST'])
+def agent_cache_endpoint():
+    cache = get_agent_cache()
+    loaded = 0
+    
+    if request.method == 'POST':
+        body = request.get_json(silent=True) or {}
+        invalidate = body.get('invalidate')
+        if invalidate is True:
+            cache.invalidate()
+        elif isinstance(invalidate, list):
+            for agent_id in invalidate:
+                cache.invalidate(agent_id)
+        if body.get('prefetch'):
+            loaded = cache.prefetch()
+    
+    return jsonify({
+        'status': 'success',
+        'prefetched': loaded,
+        'stats': cache.stats()
+    })
+
+@agents_routes.route('/review', methods=['GET'])
 def review():
     # Get the ratings from the query string
     ratings = request.args.get('ratings', '')
+    agent_id = request.args.get('agent_id')
+    if not agent_id:
+        abort(400, description="Request must include the registered 'agent_id' being reviewed")
+    
+    # Only registered agents get an aggregate row, so junk ids can't grow it
+    try:
+        registered = get_agent_cache().get(agent_id) is not None
+    except Exception as e:
+        print(f"Error looking up agent '{agent_id}': {e}")
+        return jsonify({
+            'status': 'error',
+            'message': f'Error looking up agent: {str(e)}'
+        }), 502
+    if not registered:
+        abort(404, description=f"Agent '{agent_id}' is not registered")
     
     try:
         # Split the space-separated ratings
-        accuracy, completion, flow, resolution = ratings.split()
+        from review_stats import parse_ratings, DIMENSIONS
+        values = parse_ratings(ratings)
         
-        # Print the ratings to the console
-        print(f"Review ratings received:")
-        print(f"Accuracy: {accuracy}")
-        print(f"Completion: {completion}")
-        print(f"Flow: {flow}")
-        print(f"Resolution: {resolution}")
+        # Aggregated in memory; the flusher writes agent stats in batches
+        get_review_aggregator().add(agent_id, values)
         
         return jsonify({
             'status': 'success',
-            'message': 'Ratings received'
+            'message': 'Ratings received',
+            'agent_id': agent_id,
+            'ratings': dict(zip(DIMENSIONS, values))
         })
     except Exception as e:
         print(f"Error processing ratings: {e}")
@@ -249,32 +761,159 @@ def review():
             'message': f'Error processing ratings: {str(e)}'
         }), 400
 
+# Running review stats for an agent; POST /review/flush to write pending reviews now
+@agents_routes.route('/review/stats/<agent_id>', methods=['GET'])
+def review_stats_endpoint(agent_id):
+    stats = get_review_aggregator().get(agent_id)
+    if stats is None:
+        abort(404, description=f"No reviews for agent '{agent_id}'")
+    return jsonify({
+        'status': 'success',
+        'agent_id': agent_id,
+        'reviews': stats
+    })
+
+@agents_routes.route('/review/flush', methods=['POST'])
+def review_flush_endpoint():
+    aggregator = get_review_aggregator()
+    if not REVIEW_PAYER:
+        return jsonify({
+            'status': 'error',
+            'message': 'No review writer configured; set VOXVERIFY_REVIEW_PAYER to write reviews on chain',
+            'stats': aggregator.stats()
+        }), 503
+    try:
+        written = aggregator.flush()
+    except Exception as e:
+        return jsonify({
+            'status': 'error',
+            'message': f'Error flushing review stats: {str(e)}',
+            'stats': aggregator.stats()
+        }), 502
+    return jsonify({
+        'status': 'success',
+        'agents_written': written,
+        'stats': aggregator.stats()
+    })
+
 # API routes
-@app.route('/identify', methods=['POST'])
+@identify_routes.route('/identify', methods=['POST'])
 def identify_endpoint():
     if not request.json or 'message' not in request.json:
         abort(400, description="Request must include a 'message' field")
     
     message = request.json['message']
+    agent_id = request.json.get('agent_id', DEFAULT_AGENT_ID)
+    
+    if agent_id not in get_key_ring():
+        abort(404, description=f"No signing key registered for agent '{agent_id}'")
+    
+    encoding = request.json.get('encoding', PAYLOAD_ENCODING)
+    key_id_size = request.json.get('key_id_size', PAYLOAD_KEY_ID_SIZE)
+    if encoding not in signed_payload.ENCODINGS:
+        abort(400, description=f"'encoding' must be one of {', '.join(signed_payload.ENCODINGS)}")
+    if key_id_size not in signed_payload.KEY_ID_SIZES:
+        abort(400, description=f"'key_id_size' must be one of {signed_payload.KEY_ID_SIZES}")
+    try:
+        from waveform_cache import parse_protocol
+        protocol_id = parse_protocol(request.json.get('protocol', PROTOCOL_ID))
+    except ValueError as e:
+        abort(400, description=str(e))
     
     # Encrypt/sign the message
-    encoded_signature = encrypt(message)
+    encoded_signature = encrypt(message, agent_id, encoding, key_id_size)
     
     if encoded_signature:
-        # Play the encoded signature
-        play(encoded_signature)
+        # Raw tokens are bytes on air; report them base64 encoded
+        signature_text = signed_payload.token_text(encoded_signature)
+        # Hand the transmission to the background scheduler and return right away
+        try:
+            job = playback_scheduler.submit(encoded_signature, protocol_id=protocol_id)
+        except QueueFullError as e:
+            return jsonify({
+                'status': 'error',
+                'message': str(e),
+                'signature': signature_text
+            }), 503
         return jsonify({
             'status': 'success',
             'message': message,
-            'signature': encoded_signature
-        })
+            'signature': signature_text,
+            'encoding': encoding,
+            'protocol': protocol_id,
+            'job': job.to_dict()
+        }), 202
     else:
         return jsonify({
             'status': 'error',
             'message': 'Failed to encrypt message'
         }), 500
 
-@app.route('/refresh_wallet', methods=['POST'])
+# Playback job status; pass ?wait=<seconds> to long-poll until the job finishes
+@identify_routes.route('/jobs/<job_id>', methods=['GET'])
+def job_status(job_id):
+    job = playback_scheduler.get(job_id)
+    if job is None:
+        abort(404, description=f"Unknown playback job '{job_id}'")
+    
+    try:
+        wait = min(float(request.args.get('wait', 0)), MAX_JOB_WAIT)
+    except ValueError:
+        abort(400, description="'wait' must be a number of seconds")
+    
+    if wait > 0 and not job.wait(wait):
+        # Still queued, so refresh the queue position
+        job = playback_scheduler.get(job_id) or job
+    
+    return jsonify({
+        'status': 'success',
+        'job': job.to_dict()
+    })
+
+# Serve a token's waveform so a remote or browser speaker can play it
+@identify_routes.route('/waveform', methods=['GET'])
+def waveform_endpoint():
+    payload = request.args.get('payload')
+    if not payload:
+        abort(400, description="Request must include a 'payload' query parameter")
+    
+    audio_format = request.args.get('format', 'wav')
+    if audio_format not in ('wav', 'pcm'):
+        abort(400, description="'format' must be 'wav' or 'pcm'")
+    
+    from waveform_cache import parse_protocol, to_wav_bytes, to_pcm_bytes
+    try:
+        protocol_id = parse_protocol(request.args.get('protocol', PROTOCOL_ID))
+        volume = int(request.args.get('volume', VOLUME))
+    except ValueError:
+        abort(400, description="'protocol' must be a ggwave protocol name or id and 'volume' an integer")
+    if not 0 <= volume <= 100:
+        abort(400, description="'volume' must be between 0 and 100")
+    
+    # encoding=raw means the payload parameter is base64 and its bytes are sent as is
+    if request.args.get('encoding') == 'raw':
+        try:
+            payload = base64.b64decode(payload, validate=True)
+        except ValueError:
+            abort(400, description="A raw 'payload' must be base64 encoded")
+    
+    # ggwave silently truncates longer payloads, which would encode a different token
+    size = len(payload) if isinstance(payload, bytes) else len(payload.encode('utf-8'))
+    if size > signed_payload.MAX_PAYLOAD_CHARS:
+        abort(400, description=f"'payload' is {size} bytes; ggwave sends at most {signed_payload.MAX_PAYLOAD_CHARS}")
+    
+    waveform = get_waveform_cache().get(payload, protocol_id, volume)
+    
+    if audio_format == 'wav':
+        response = Response(to_wav_bytes(waveform, SAMPLE_RATE), mimetype='audio/wav')
+    else:
+        response = Response(to_pcm_bytes(waveform), mimetype='application/octet-stream')
+        response.headers['X-Sample-Format'] = 'f32le'
+    response.headers['X-Sample-Rate'] = str(SAMPLE_RATE)
+    response.headers['Cache-Control'] = 'public, max-age=3600'
+    return response
+
+@core_routes.route('/refresh_wallet', methods=['POST'])
 def refresh_wallet():
     if not request.json or 'wallet_address' not in request.json:
         abort(400, description="Request must include a 'wallet_address' field")
@@ -293,19 +932,27 @@ def refresh_wallet():
         'currency': 'SOL'
     })
 
-@app.route('/validate', methods=['POST'])
+@verify_routes.route('/validate', methods=['POST'])
 def validate_endpoint():
-    # Check for decoded_text in the request
-    if not request.json or 'decoded_text' not in request.json:
-        abort(400, description="Request must include a 'decoded_text' field")
+    # Check for decoded_text in the request; raw binary tokens arrive base64 encoded as decoded_bytes
+    if not request.json or ('decoded_text' not in request.json and 'decoded_bytes' not in request.json):
+        abort(400, description="Request must include a 'decoded_text' or 'decoded_bytes' field")
     
-    decoded_text = request.json['decoded_text']
+    if 'decoded_bytes' in request.json:
+        decoded_text = request.json['decoded_bytes']
+        token = decode_token_bytes(decoded_text, 'decoded_bytes')
+    else:
+        decoded_text = token = request.json['decoded_text']
+        if not isinstance(decoded_text, str):
+            abort(400, description="'decoded_text' must be a string")
     
     print(f"Received decoded text: {decoded_text}")
     
     # Try to verify the signature
     try:
-        is_verified, extracted_message, debug_info = verify_message(decoded_text)
+        is_verified, extracted_message, debug_info = validate_token(token, collect_debug=DEBUG_STEPS)
+        if debug_info.get('replay'):
+            return replay_response(decoded_text)
         
         if is_verified:
             return jsonify({
@@ -313,6 +960,7 @@ def validate_endpoint():
                 'decoded_message': decoded_text,
                 'verified': True,
                 'extracted_message': extracted_message,
+                'agent': signer_profile(debug_info),
                 'debug_info': debug_info
             })
         else:
@@ -334,22 +982,345 @@ def validate_endpoint():
             }
         }), 500
 
-# Get recent signatures and their messages
-@app.route('/signatures', methods=['GET'])
-def list_signatures():
+def decode_token_bytes(text, field):
+    """Decode the base64 text of a raw token, aborting with a 400 naming the field if it isn't valid"""
+    if not isinstance(text, str):
+        abort(400, description=f"'{field}' must be base64 encoded strings")
+    try:
+        return base64.b64decode(text, validate=True)
+    except ValueError:
+        abort(400, description=f"'{field}' must be base64 encoded strings")
+
+def replay_response(decoded_text):
+    return jsonify({
+        'status': 'error',
+        'message': 'Token has already been validated',
+        'decoded_message': decoded_text,
+        'verified': False,
+        'replay': True
+    }), 409
+
+# Verify a list of decoded tokens in one request
+@verify_routes.route('/validate/batch', methods=['POST'])
+def validate_batch_endpoint():
+    # Raw binary tokens arrive base64 encoded in decoded_bytes, as on /validate;
+    # their results follow those of decoded_texts
+    if not request.json or not any(field in request.json for field in ('decoded_texts', 'decoded_bytes')):
+        abort(400, description="Request must include a 'decoded_texts' or 'decoded_bytes' list")
+    
+    decoded_texts = request.json.get('decoded_texts', [])
+    decoded_bytes = request.json.get('decoded_bytes', [])
+    include_debug = bool(request.json.get('include_debug', False))
+    
+    if not isinstance(decoded_texts, list) or not isinstance(decoded_bytes, list):
+        abort(400, description="'decoded_texts' and 'decoded_bytes' must be lists")
+    if len(decoded_texts) + len(decoded_bytes) > MAX_BATCH_SIZE:
+        abort(413, description=f"At most {MAX_BATCH_SIZE} tokens can be validated per request")
+    if not all(isinstance(text, str) for text in decoded_texts):
+        abort(400, description="Every entry in 'decoded_texts' must be a string")
+    
+    tokens = decoded_texts + [decode_token_bytes(text, 'decoded_bytes') for text in decoded_bytes]
+    
+    results = []
+    for decoded_text, (is_verified, extracted_message, debug_info) in zip(
+            decoded_texts + decoded_bytes, verify_batch(tokens, collect_debug=include_debug and DEBUG_STEPS)):
+        result = {
+            'decoded_message': decoded_text,
+            'verified': is_verified,
+            'debug_info': debug_info
+        }
+        if len(results) >= len(decoded_texts):
+            result['raw'] = True
+        if is_verified:
+            result['extracted_message'] = extracted_message
+            result['agent'] = signer_profile(debug_info)
+        elif debug_info.get('replay'):
+            result['replay'] = True
+        results.append(result)
+    
+    return jsonify({
+        'status': 'success',
+        'verified_count': sum(1 for result in results if result['verified']),
+        'results': results
+    })
+
+def decode_result(offset, decoded_text):
+    """Verify a token decoded from a PCM stream and describe the result"""
+    is_verified, extracted_message, debug_info = validate_token(decoded_text, collect_debug=False)
+    result = {
+        'offset': offset,
+        'decoded_message': signed_payload.token_text(decoded_text),
+        'verified': is_verified,
+        'debug_info': debug_info
+    }
+    if isinstance(decoded_text, bytes):
+        result['raw'] = True
+    if is_verified:
+        result['extracted_message'] = extracted_message
+        result['agent'] = signer_profile(debug_info)
+    elif debug_info.get('replay'):
+        result['replay'] = True
+    return result
+
+def get_decoder_sessions():
+    """Return the open /decode/sessions decoders, loading ggwave on first use"""
+    global decoder_sessions
+    if decoder_sessions is None:
+        from stream_decoder import DecoderSessions, MAX_DECODERS
+        decoder_sessions = DecoderSessions(
+            max_sessions=int(os.environ.get('VOXVERIFY_DECODE_SESSIONS', MAX_DECODERS)),
+            idle_timeout=float(os.environ.get('VOXVERIFY_DECODE_IDLE_TIMEOUT', 60))
+        )
+    return decoder_sessions
+
+def decoder_params(source):
+    """Read sample_rate and format for a stream decoder, aborting on bad values"""
+    from stream_decoder import DECODER_SAMPLE_RATE, SAMPLE_FORMATS
+    try:
+        sample_rate = int(source.get('sample_rate', DECODER_SAMPLE_RATE))
+    except (TypeError, ValueError):
+        abort(400, description="'sample_rate' must be an integer")
+    sample_format = source.get('format', 'f32')
+    if sample_format not in SAMPLE_FORMATS or not 8000 <= sample_rate <= 192000:
+        abort(400, description=f"'format' must be one of {', '.join(SAMPLE_FORMATS)} and 'sample_rate' 8000-192000")
+    return sample_rate, sample_format
+
+# Decode a chunked stream of raw PCM and push NDJSON results as tokens decode
+@verify_routes.route('/decode/stream', methods=['POST'])
+def decode_stream_endpoint():
+    sample_rate, sample_format = decoder_params(request.args)
+    once = request.args.get('once', '0') == '1'
+    from stream_decoder import StreamDecoder, DecoderBusyError
+    try:
+        decoder = StreamDecoder(sample_rate, sample_format)
+    except DecoderBusyError as e:
+        return jsonify({'status': 'error', 'message': str(e)}), 503
+    stream = request.stream
+    
+    def generate():
+        try:
+            while True:
+                chunk = stream.read(STREAM_READ_SIZE)
+                if not chunk:
+                    break
+                for offset, decoded_text in decoder.feed(chunk):
+                    yield json.dumps(decode_result(offset, decoded_text)) + '\n'
+                    if once:
+                        return
+        finally:
+            decoder.close()
+    
+    return Response(stream_with_context(generate()), mimetype='application/x-ndjson')
+
+# Session-based variant for clients that send PCM in separate requests
+@verify_routes.route('/decode/sessions', methods=['POST'])
+def create_decode_session():
+    sample_rate, sample_format = decoder_params(request.get_json(silent=True) or {})
+    from stream_decoder import DecoderBusyError
+    try:
+        session_id, _ = get_decoder_sessions().create(sample_rate, sample_format)
+    except DecoderBusyError as e:
+        return jsonify({'status': 'error', 'message': str(e)}), 503
+    return jsonify({
+        'status': 'success',
+        'session_id': session_id,
+        'sample_rate': sample_rate,
+        'format': sample_format
+    }), 201
+
+@verify_routes.route('/decode/sessions/<session_id>', methods=['POST'])
+def feed_decode_session(session_id):
+    decoder = get_decoder_sessions().get(session_id)
+    if decoder is None:
+        abort(404, description=f"Unknown decode session '{session_id}'")
+    
+    results = [decode_result(offset, decoded_text) for offset, decoded_text in decoder.feed(request.get_data())]
     return jsonify({
         'status': 'success',
-        'signatures': signature_message_map
+        'results': results
     })
 
+@verify_routes.route('/decode/sessions/<session_id>', methods=['DELETE'])
+def close_decode_session(session_id):
+    if not get_decoder_sessions().close(session_id):
+        abort(404, description=f"Unknown decode session '{session_id}'")
+    return jsonify({'status': 'success'})
+
+# Prometheus scrape endpoint for stage latencies and counters
+@core_routes.route('/metrics', methods=['GET'])
+def metrics_endpoint():
+    return Response(metrics.registry.render(), content_type=metrics.CONTENT_TYPE)
+
+def signature_scan_params(args):
+    """Read the /signatures filters into scan() keyword arguments, aborting on bad values"""
+    order = args.get('order', 'desc')
+    if order not in ('asc', 'desc'):
+        abort(400, description="'order' must be 'asc' or 'desc'")
+    try:
+        since = float(args['since']) if 'since' in args else None
+        until = float(args['until']) if 'until' in args else None
+    except ValueError:
+        abort(400, description="'since' and 'until' must be Unix timestamps")
+    return {
+        'cursor': args.get('cursor') or None,
+        'since': since,
+        'until': until,
+        'prefix': args.get('prefix') or None,
+        'newest_first': order == 'desc',
+    }
+
+def signature_entry(entry):
+    return {'signature': entry.signature, 'message': entry.message, 'created_at': entry.created_at}
+
+# List signatures and their messages a page at a time, newest first by default.
+# ?format=ndjson streams every match instead; add follow=<seconds> to keep tailing.
+@verify_routes.route('/signatures', methods=['GET'])
+def list_signatures():
+    params = signature_scan_params(request.args)
+    ndjson = (request.args.get('format') == 'ndjson' or
+              request.accept_mimetypes.best == 'application/x-ndjson')
+    try:
+        limit = int(request.args.get('limit', 0 if ndjson else SIGNATURE_PAGE_SIZE))
+        follow = min(float(request.args.get('follow', 0)), MAX_SIGNATURE_FOLLOW)
+    except ValueError:
+        abort(400, description="'limit' and 'follow' must be numbers")
+    if not ndjson and not 1 <= limit <= MAX_SIGNATURE_PAGE_SIZE:
+        abort(400, description=f"'limit' must be between 1 and {MAX_SIGNATURE_PAGE_SIZE}")
+    if follow and params['newest_first']:
+        abort(400, description="'follow' needs order=asc")
+    
+    # Catch a bad cursor before the response starts
+    entries = signature_store.scan(**params)
+    try:
+        first = next(entries, None)
+    except ValueError as e:
+        abort(400, description=str(e))
+    entries = itertools.chain([first] if first else [], entries)
+    
+    if not ndjson:
+        page = list(itertools.islice(entries, limit))
+        return jsonify({
+            'status': 'success',
+            'signatures': [signature_entry(entry) for entry in page],
+            # A full page may have more after it
+            'next_cursor': page[-1].cursor if len(page) == limit else None
+        })
+    
+    def generate(entries):
+        sent = 0
+        cursor = params['cursor']
+        deadline = time.monotonic() + follow
+        while True:
+            for entry in entries:
+                yield json.dumps(dict(signature_entry(entry), cursor=entry.cursor)) + '\n'
+                cursor = entry.cursor
+                sent += 1
+                if sent == limit:
+                    return
+            if time.monotonic() >= deadline:
+                return
+            # Tailing: pick up signatures stored since the last one sent
+            time.sleep(SIGNATURE_FOLLOW_POLL)
+            entries = signature_store.scan(**dict(params, cursor=cursor))
+    
+    return Response(stream_with_context(generate(entries)), mimetype='application/x-ndjson')
+
+ROLE_ROUTES = {
+    'identify': identify_routes,
+    'verify': verify_routes,
+    'agents': agents_routes,
+}
+
+def parse_roles(roles):
+    """
+    Normalize a role list
+
+    Args:
+        roles: Comma-separated string or iterable of names from ROLES; "all" enables every role
+
+    Returns:
+        Tuple of role names in ROLES order
+
+    Raises:
+        ValueError: if a role is unknown or none is given
+    """
+    if isinstance(roles, str):
+        roles = roles.split(',')
+    names = {role.strip().lower() for role in roles} - {''}
+    if 'all' in names:
+        names = set(ROLES) | (names - {'all'})
+    unknown = names - set(ROLES)
+    if unknown:
+        raise ValueError(f"Unknown server roles: {', '.join(sorted(unknown))} (expected {', '.join(ROLES)})")
+    if not names:
+        raise ValueError(f"At least one server role is required ({', '.join(ROLES)})")
+    return tuple(role for role in ROLES if role in names)
+
+def create_app(roles=None):
+    """
+    Build the Flask app with only the routes for the given roles
+
+    The identify role plays tokens through ggwave, and agents talks to
+    the Solana agent store; both are imported on first use, so a
+    verify-only app never loads the audio stack or the Solana client
+    (decoding audio server-side with /decode/* loads ggwave on demand).
+
+    Args:
+        roles: Names from ROLES, comma-separated or as a list (default VOXVERIFY_ROLES, or all of them)
+
+    Returns:
+        The Flask app
+    """
+    roles = parse_roles(roles or os.environ.get('VOXVERIFY_ROLES', 'all'))
+    if 'identify' in roles:
+        # Fail at startup rather than on the first /identify
+        from waveform_cache import parse_protocol
+        parse_protocol(PROTOCOL_ID)
+    
+    if 'verify' in roles and get_registry_keys() is not None:
+        # Load the registry in the background before the first token arrives
+        registry_keys.start()
+    
+    flask_app = Flask(__name__, static_folder='static', template_folder='templates')
+    flask_app.config['VOXVERIFY_ROLES'] = roles
+    flask_app.register_blueprint(core_routes)
+    for role in roles:
+        flask_app.register_blueprint(ROLE_ROUTES[role])
+    return flask_app
+
+def __getattr__(name):
+    # Module-level app for `flask --app play` and `gunicorn play:app`, built from
+    # VOXVERIFY_ROLES on first access, so a worker using the factory instead,
+    # e.g. gunicorn 'play:create_app("verify")', never builds an all-roles app
+    global app
+    if name == 'app':
+        app = create_app()
+        return app
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
 if __name__ == '__main__':
+    app = create_app()
     # Print a banner with usage information
+    roles = app.config['VOXVERIFY_ROLES']
     print("\n===== VoxVerify Server =====")
     print("Web interface: http://localhost:6000")
+    print(f"Roles: {', '.join(roles)}")
     print("API endpoints:")
-    print("  POST /identify - Encrypt and play a message")
-    print("  POST /validate - Validate a decoded signature")
-    print("  GET /signatures - List recent signatures and messages")
+    if 'identify' in roles:
+        print("  POST /identify - Encrypt and queue a message for playback")
+        print("  GET /jobs/<job_id> - Playback job status (?wait=seconds to long-poll)")
+        print("  GET /waveform - Download a token waveform as WAV or raw PCM")
+    if 'verify' in roles:
+        print("  POST /validate - Validate a decoded signature")
+        print("  POST /validate/batch - Validate a list of decoded signatures")
+        print("  POST /decode/stream - Decode a chunked PCM stream and verify tokens as they arrive")
+        print("  POST /decode/sessions - Open a server-side decoder session for PCM frames")
+        print("  GET /signatures - Page or stream (format=ndjson) signatures and messages")
+    if 'agents' in roles:
+        print("  GET /review - Submit ratings for an agent (aggregated and flushed in batches)")
+        print("  GET /agents/<agent_id> - Look up an agent in the agent store")
+        print("  GET /agents/top - Highest rated agents")
+    print("  GET /metrics - Prometheus metrics (stage latencies and counters)")
     print("===============================\n")
     
     app.run(host='0.0.0.0', port=6000, debug=True)
@@ -0,0 +1,157 @@
+import queue
+import threading
+import time
+import uuid
+from collections import OrderedDict
+
+# Job states
+QUEUED = "queued"
+PLAYING = "playing"
+DONE = "done"
+FAILED = "failed"
+
+# Default number of transmissions waiting for the speaker
+DEFAULT_QUEUE_SIZE = 32
+# Finished jobs kept around so clients can still poll their status
+DEFAULT_HISTORY_SIZE = 1024
+
+
+class QueueFullError(Exception):
+    """Raised when the playback queue can't take another job"""
+    pass
+
+
+class PlaybackJob:
+    """A single queued acoustic transmission"""
+    def __init__(self, message, options=None):
+        self.job_id = uuid.uuid4().hex
+        self.message = message
+        # Extra keyword arguments for the play function, e.g. the protocol
+        self.options = options or {}
+        self.status = QUEUED
+        self.error = None
+        self.queued_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+        self.position = None
+        self._finished = threading.Event()
+
+    def wait(self, timeout=None):
+        """Block until the job is done or failed; returns True if it finished"""
+        return self._finished.wait(timeout)
+
+    def to_dict(self):
+        """Convert to dictionary for easy serialization"""
+        data = {
+            "job_id": self.job_id,
+            "status": self.status,
+            "queued_at": self.queued_at,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+            "queue_wait": None,
+            "play_time": None,
+        }
+        if self.started_at is not None:
+            data["queue_wait"] = self.started_at - self.queued_at
+            if self.finished_at is not None:
+                data["play_time"] = self.finished_at - self.started_at
+        if self.status == QUEUED:
+            data["position"] = self.position
+        if self.error:
+            data["error"] = self.error
+        return data
+
+
+class PlaybackScheduler:
+    """
+    Plays queued messages one at a time on a background thread.
+
+    The queue is bounded so a burst of /identify requests can't pile up
+    minutes of audio; submit() raises QueueFullError instead. The worker
+    thread is started on the first submit.
+    """
+    def __init__(self, play_fn, max_queue=DEFAULT_QUEUE_SIZE, history_size=DEFAULT_HISTORY_SIZE):
+        self.play_fn = play_fn
+        self.history_size = history_size
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._jobs = OrderedDict()
+        self._lock = threading.Lock()
+        self._worker = None
+
+    def submit(self, message, **options):
+        """
+        Queue a message for playback
+
+        Args:
+            message: Text or bytes to transmit
+            **options: Passed on to the play function
+
+        Returns:
+            The queued PlaybackJob
+        """
+        self._ensure_worker()
+        job = PlaybackJob(message, options)
+        with self._lock:
+            try:
+                self._queue.put_nowait(job)
+            except queue.Full:
+                raise QueueFullError(f"Playback queue is full ({self._queue.maxsize} jobs)")
+            self._jobs[job.job_id] = job
+            self._trim_history()
+            job.position = self._position(job)
+        return job
+
+    def get(self, job_id):
+        """Return a job by id, or None if it's unknown or expired"""
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is not None and job.status == QUEUED:
+                job.position = self._position(job)
+            return job
+
+    def pending(self):
+        """Number of jobs waiting to be played"""
+        return self._queue.qsize()
+
+    def _position(self, job):
+        # Jobs are kept in submission order, so count queued jobs ahead of this one
+        position = 0
+        for other in self._jobs.values():
+            if other is job:
+                return position
+            if other.status == QUEUED:
+                position += 1
+        return position
+
+    def _trim_history(self):
+        # Drop the oldest finished jobs; queued and playing jobs are never dropped
+        excess = len(self._jobs) - self.history_size
+        if excess <= 0:
+            return
+        for job_id in [j.job_id for j in self._jobs.values() if j.status in (DONE, FAILED)][:excess]:
+            del self._jobs[job_id]
+
+    def _ensure_worker(self):
+        if self._worker is not None and self._worker.is_alive():
+            return
+        with self._lock:
+            if self._worker is None or not self._worker.is_alive():
+                self._worker = threading.Thread(target=self._run, name="playback", daemon=True)
+                self._worker.start()
+
+    def _run(self):
+        while True:
+            job = self._queue.get()
+            job.status = PLAYING
+            job.started_at = time.time()
+            try:
+                self.play_fn(job.message, **job.options)
+                job.status = DONE
+            except Exception as e:
+                print(f"Error playing job {job.job_id}: {e}")
+                job.error = str(e)
+                job.status = FAILED
+            finally:
+                job.finished_at = time.time()
+                job._finished.set()
+                self._queue.task_done()
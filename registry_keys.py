@@ -0,0 +1,157 @@
+import threading
+import time
+
+from key_ring import TrustedKeys, fingerprint, parse_public_key
+
+# Seconds between registry refreshes
+DEFAULT_REFRESH_INTERVAL = 300
+# Seconds before a failed refresh is retried, so a slow RPC node at startup
+# doesn't leave the registry keys empty for a whole refresh interval
+RETRY_INTERVAL = 30
+
+
+class RegistryKeys:
+    """
+    Trusted keys for every agent in the registry, indexed by fingerprint.
+
+    Each agent's agent_public_key is parsed once into a public key object,
+    so picking the key for a payload is a dict lookup on its key id, with
+    no disk reads or RPC calls on the verification path. A daemon thread
+    reloads the agent index every `refresh_interval` seconds; when the index
+    changed it builds a new TrustedKeys and swaps it in whole, so readers
+    never see a half-built one. Parsed keys are carried over between
+    builds, so a refresh only parses keys it hasn't seen before.
+
+    The agent store lets any signer write any profile, so a profile's key
+    says nothing about who holds the private half. A key registered by more
+    than one agent is ambiguous: it still verifies signatures, but under
+    agent_id None, and claimants() lists every agent that registered it so
+    callers can report no single profile for it.
+    """
+    def __init__(self, load_index, refresh_interval=DEFAULT_REFRESH_INTERVAL):
+        self.load_index = load_index
+        self.refresh_interval = refresh_interval
+        self.refreshes = 0
+        self.refresh_errors = 0
+        self.unparsed = 0
+        self.built_at = None
+        # The agent index, the keys built from it and the agent_ids sharing
+        # each ambiguous key id, replaced together
+        self._snapshot = (None, TrustedKeys(), {})
+        self._parsed = {}
+        self._refresh_lock = threading.Lock()
+        self._lock = threading.Lock()
+        self._worker = None
+
+    def __len__(self):
+        return len(self._snapshot[1])
+
+    def match(self, key_id):
+        """
+        Return every registered (agent_id, public_key) whose fingerprint starts with key_id
+
+        Payloads without a key id match nothing; trying every registered key
+        would make one bad token cost thousands of signature checks.
+        """
+        self.start()
+        if not key_id:
+            return []
+        return self._snapshot[1].match(key_id)
+
+    def claimants(self, public_key):
+        """Return the agent_ids sharing an ambiguous registered key, or () if it has one owner"""
+        return self._snapshot[2].get(fingerprint(public_key), ())
+
+    def profile(self, agent_id):
+        """Return the registered Agent with this agent_id, or None"""
+        index = self._snapshot[0]
+        return index.find(agent_id) if index is not None else None
+
+    def refresh(self):
+        """
+        Reload the agent index and rebuild the keys if it changed
+
+        Returns:
+            True if a new set of keys was swapped in
+        """
+        from agent_index import AGENT_ID, PUBLIC_KEY
+
+        with self._refresh_lock:
+            index = self.load_index()
+            if index is self._snapshot[0]:
+                return False
+
+            # key id -> (public key, agent_ids that registered it), in index order
+            owners = {}
+            parsed = {}
+            unparsed = 0
+            for row in range(len(index)):
+                text = index.field(row, PUBLIC_KEY)
+                if text in self._parsed:
+                    public_key = self._parsed[text]
+                else:
+                    try:
+                        public_key = parse_public_key(text)
+                    except ValueError:
+                        # Remembered as None so a bad key isn't re-parsed every refresh
+                        public_key = None
+                parsed[text] = public_key
+                if public_key is None:
+                    unparsed += 1
+                    continue
+                agent_ids = owners.setdefault(fingerprint(public_key), (public_key, []))[1]
+                agent_id = index.field(row, AGENT_ID)
+                if agent_id not in agent_ids:
+                    agent_ids.append(agent_id)
+
+            keys = TrustedKeys()
+            ambiguous = {}
+            for key_id, (public_key, agent_ids) in owners.items():
+                if len(agent_ids) > 1:
+                    # Sorted, since index order follows the RPC response and can change
+                    ambiguous[key_id] = tuple(sorted(agent_ids))
+                    keys.add(None, public_key)
+                else:
+                    keys.add(agent_ids[0], public_key)
+
+            for key_id in ambiguous.keys() - self._snapshot[2].keys():
+                print(f"Registry agents {', '.join(ambiguous[key_id])} share key {key_id.hex()}; "
+                      f"tokens signed with it won't report a profile")
+            self._snapshot = (index, keys, ambiguous)
+            self._parsed = parsed
+            self.unparsed = unparsed
+            self.built_at = time.time()
+            self.refreshes += 1
+            return True
+
+    def stats(self):
+        """Return key counts and refresh counters for reporting"""
+        return {
+            "keys": len(self),
+            "unparsed": self.unparsed,
+            "ambiguous": len(self._snapshot[2]),
+            "refreshes": self.refreshes,
+            "refresh_errors": self.refresh_errors,
+            "built_at": self.built_at,
+        }
+
+    def start(self):
+        """Start the refresh thread, or restart it in a worker process forked after it started"""
+        if self._worker is not None and self._worker.is_alive():
+            return
+        with self._lock:
+            if self._worker is None or not self._worker.is_alive():
+                self._worker = threading.Thread(target=self._run, name="registry-keys", daemon=True)
+                self._worker.start()
+
+    def _run(self):
+        while True:
+            delay = self.refresh_interval
+            try:
+                if self.refresh():
+                    print(f"Loaded {len(self)} registry keys ({self.unparsed} unparsed)")
+            except Exception as e:
+                self.refresh_errors += 1
+                delay = min(delay, RETRY_INTERVAL)
+                print(f"Error refreshing registry keys: {e}")
+            time.sleep(delay)
@@ -0,0 +1,234 @@
+import base64
+import json
+import os
+import struct
+import threading
+import time
+
+from solders.pubkey import Pubkey
+
+# Agent string fields that come before number_of_calls in the account layout
+IDENTITY_FIELDS = 4
+# Bytes read past the longest known agent record on an incremental sync, so a
+# record that grew by a few bytes is still read whole
+WINDOW_SLACK = 64
+# Characters a stats string may contain; anything else means the layout moved
+_NUMERIC = frozenset(b"0123456789.-+eE ")
+
+_U32 = struct.Struct("<I")
+
+
+def stats_offset(data):
+    """Return where number_of_calls starts in an agent account, or None if malformed"""
+    # Skip the first byte (instruction identifier)
+    pos = 1
+    try:
+        for _ in range(IDENTITY_FIELDS):
+            (length,) = _U32.unpack_from(data, pos)
+            pos += 4 + length
+    except struct.error:
+        return None
+    return pos if pos <= len(data) else None
+
+
+def stats_length(data):
+    """
+    Return how many bytes the two stats strings take at the start of a slice
+
+    Returns None if the slice doesn't hold two complete numeric strings.
+    """
+    pos = 0
+    for _ in range(2):
+        if pos + 4 > len(data):
+            return None
+        (length,) = _U32.unpack_from(data, pos)
+        value = data[pos + 4:pos + 4 + length]
+        if len(value) != length or not _NUMERIC.issuperset(value):
+            return None
+        pos += 4 + length
+    return pos
+
+
+def content_length(data):
+    """Return where an agent record ends (after both stats strings), or None if it's cut off or malformed"""
+    offset = stats_offset(data)
+    if offset is None:
+        return None
+    length = stats_length(data[offset:])
+    return offset + length if length is not None else None
+
+
+class SyncResult:
+    """What one sync() call changed"""
+    def __init__(self, slot, full_scan=False):
+        self.slot = slot
+        self.full_scan = full_scan
+        self.added = 0
+        self.updated = 0
+        self.removed = 0
+
+    @property
+    def changed(self):
+        return bool(self.added or self.updated or self.removed)
+
+    def to_dict(self):
+        """Convert to dictionary for easy serialization"""
+        return {
+            "slot": self.slot,
+            "full_scan": self.full_scan,
+            "added": self.added,
+            "updated": self.updated,
+            "removed": self.removed,
+        }
+
+
+class RegistrySync:
+    """
+    Local snapshot of the agent registry, refreshed incrementally.
+
+    A sync is skipped when the RPC node's slot hasn't moved since the last
+    one, which on a live cluster (a new slot every ~400 ms) is rare.
+    Otherwise it makes one getProgramAccounts call that returns the first
+    bytes of every account, up to the end of the longest known agent
+    record plus WINDOW_SLACK. Any edit to an agent's fields changes those
+    bytes, so comparing them with the snapshot finds every added, changed
+    and closed account. Changed records that fit in the window are taken
+    from the slices; only new accounts and records that outgrew the window
+    are fetched in full, MAX_MULTIPLE_ACCOUNTS per getMultipleAccounts.
+
+    So an incremental sync costs one getSlot, one getProgramAccounts of a
+    few hundred bytes per account, and one getMultipleAccounts per 100 new
+    or grown accounts. A full scan reads whole accounts (their allocated
+    size, typically 1000 bytes) and runs on the first sync and every
+    `full_scan_interval` seconds as a safety net.
+
+    The snapshot and slot are written to `checkpoint_path`, so a restart
+    resumes from there instead of rescanning.
+    """
+    def __init__(self, client, checkpoint_path=None, full_scan_interval=3600):
+        self.client = client
+        self.checkpoint_path = os.path.expanduser(checkpoint_path) if checkpoint_path else None
+        self.full_scan_interval = full_scan_interval
+        self.slot = None
+        self.last_full_scan = 0.0
+        # Incremented whenever the snapshot changes
+        self.version = 0
+        self._accounts = {}
+        self._lock = threading.Lock()
+        self._load_checkpoint()
+
+    def __len__(self):
+        return len(self._accounts)
+
+    def accounts(self):
+        """Return the snapshot as get_program_accounts-style dicts"""
+        with self._lock:
+            return [{"pubkey": pubkey, "data": data} for pubkey, data in self._accounts.items()]
+
+    def sync(self, force_full=False):
+        """
+        Bring the snapshot up to date
+
+        Args:
+            force_full: Re-read every account in full
+
+        Returns:
+            SyncResult describing what changed
+        """
+        with self._lock:
+            slot = self.client.get_slot()
+            if force_full or not self._accounts or time.time() - self.last_full_scan > self.full_scan_interval:
+                result = self._full_scan(slot)
+            elif slot == self.slot:
+                return SyncResult(slot)
+            else:
+                result = self._incremental(slot)
+
+            self.slot = slot
+            # Only write the checkpoint when the snapshot changed; a stale slot
+            # just means one extra incremental pass after a restart
+            if result.changed or result.full_scan:
+                self.version += 1
+                self._save_checkpoint()
+            return result
+
+    def _full_scan(self, slot):
+        result = SyncResult(slot, full_scan=True)
+        accounts = {str(account["pubkey"]): bytes(account["data"]) for account in self.client.get_program_accounts()}
+        result.added = len(accounts.keys() - self._accounts.keys())
+        result.removed = len(self._accounts.keys() - accounts.keys())
+        result.updated = sum(1 for pubkey, data in accounts.items()
+                             if pubkey in self._accounts and self._accounts[pubkey] != data)
+        self._accounts = accounts
+        self.last_full_scan = time.time()
+        return result
+
+    def _incremental(self, slot):
+        result = SyncResult(slot)
+        window = max(content_length(data) or len(data) for data in self._accounts.values()) + WINDOW_SLACK
+        prefixes = {str(account["pubkey"]): bytes(account["data"])
+                    for account in self.client.get_program_accounts(data_slice=(0, window))}
+
+        for pubkey in self._accounts.keys() - prefixes.keys():
+            del self._accounts[pubkey]
+            result.removed += 1
+
+        refetch = []
+        for pubkey, prefix in prefixes.items():
+            old = self._accounts.get(pubkey)
+            if old is None:
+                refetch.append(pubkey)
+                result.added += 1
+                continue
+            if old[:len(prefix)] == prefix:
+                continue
+            if content_length(prefix) is None:
+                # The record runs past the window
+                refetch.append(pubkey)
+                continue
+            # Bytes past the record are unused, so keep the rest of the old data
+            self._accounts[pubkey] = prefix + old[len(prefix):]
+            result.updated += 1
+
+        if refetch:
+            accounts = self.client.get_multiple_accounts([Pubkey.from_string(pubkey) for pubkey in refetch])
+            for pubkey, account in zip(refetch, accounts):
+                existed = pubkey in self._accounts
+                if account is None:
+                    if existed:
+                        del self._accounts[pubkey]
+                        result.removed += 1
+                    continue
+                data = bytes(account.data)
+                if existed and self._accounts[pubkey] != data:
+                    result.updated += 1
+                self._accounts[pubkey] = data
+        return result
+
+    def _load_checkpoint(self):
+        if not self.checkpoint_path or not os.path.exists(self.checkpoint_path):
+            return
+        try:
+            with open(self.checkpoint_path) as checkpoint_file:
+                checkpoint = json.load(checkpoint_file)
+            self._accounts = {pubkey: base64.b64decode(data) for pubkey, data in checkpoint["accounts"].items()}
+            self.slot = checkpoint["slot"]
+            self.last_full_scan = checkpoint["last_full_scan"]
+            self.version += 1
+            print(f"Loaded registry checkpoint at slot {self.slot} with {len(self._accounts)} accounts")
+        except (OSError, ValueError, KeyError) as e:
+            print(f"Ignoring unreadable registry checkpoint {self.checkpoint_path}: {e}")
+
+    def _save_checkpoint(self):
+        if not self.checkpoint_path:
+            return
+        checkpoint = {
+            "slot": self.slot,
+            "last_full_scan": self.last_full_scan,
+            "accounts": {pubkey: base64.b64encode(data).decode("ascii") for pubkey, data in self._accounts.items()},
+        }
+        # Write to a temporary file and rename so a crash never leaves a torn checkpoint
+        tmp_path = f"{self.checkpoint_path}.tmp"
+        with open(tmp_path, "w") as checkpoint_file:
+            json.dump(checkpoint, checkpoint_file)
+        os.replace(tmp_path, self.checkpoint_path)
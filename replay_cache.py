@@ -0,0 +1,302 @@
+import hashlib
+import math
+import os
+import struct
+import tempfile
+import threading
+import time
+
+# Tokens are remembered for at least this many seconds
+DEFAULT_WINDOW = 600
+# Chance a fresh token needs the exact lookup because the Bloom filter says it may be a replay
+DEFAULT_FP_RATE = 0.001
+# Memory for both generations, header included
+DEFAULT_MAX_BYTES = 16 * 1024 * 1024
+
+# Fingerprint table slots per remembered token (load factor 0.5), 8 bytes each
+TABLE_SLOTS_PER_ENTRY = 2
+
+# magic, bloom bits, hash count, table slots, generation started, current generation, entries per generation
+_HEADER = struct.Struct("<8sQQQdQQQ")
+_MAGIC = b"VVREPLAY"
+
+
+class ReplayFilter:
+    """
+    Time-windowed set of seen tokens with a fixed memory footprint.
+
+    Two generations rotate every `window` seconds, so a token is remembered
+    for between one and two windows. Each generation is a Bloom filter in
+    front of an open-addressing table of 64-bit token fingerprints: most
+    fresh tokens are cleared by the Bloom filter alone, and only its hits
+    are confirmed against the table, so a false positive never rejects a
+    fresh token. A generation that reaches capacity rotates early, which
+    shortens the window under extreme load instead of growing memory.
+
+    Everything lives in one flat buffer, so with `shared_name` the filter
+    is a POSIX shared memory segment that every worker process attaches
+    to, serialized with a lock file.
+    """
+    def __init__(self, window=DEFAULT_WINDOW, fp_rate=DEFAULT_FP_RATE, max_bytes=DEFAULT_MAX_BYTES,
+                 shared_name=None):
+        if window <= 0:
+            raise ValueError("Replay window must be positive")
+        if not 0 < fp_rate < 1:
+            raise ValueError("Replay false-positive rate must be between 0 and 1")
+
+        self.window = window
+        self.fp_rate = fp_rate
+        self.shared_name = shared_name
+
+        # Size one generation: Bloom bits plus table slots per entry, in half the budget
+        bits_per_entry = -math.log(fp_rate) / math.log(2) ** 2
+        entry_bytes = bits_per_entry / 8 + TABLE_SLOTS_PER_ENTRY * 8
+        self.capacity = int((max_bytes - _HEADER.size) / 2 / entry_bytes)
+        if self.capacity < 1:
+            raise ValueError(f"Replay cache needs more than {max_bytes} bytes")
+        self.hashes = max(1, round(-math.log2(fp_rate)))
+        # Whole 64-bit words keep both sections 8-byte aligned
+        self.bloom_bits = math.ceil(self.capacity * bits_per_entry / 64) * 64
+        self.table_slots = self.capacity * TABLE_SLOTS_PER_ENTRY
+        self.generation_bytes = self.bloom_bits // 8 + self.table_slots * 8
+        self.size = _HEADER.size + 2 * self.generation_bytes
+
+        self.rotations = 0
+        self.early_rotations = 0
+        self.bloom_hits = 0
+        self.replays = 0
+        self._lock = threading.Lock()
+        self._shm = None
+        self._buffer = None
+        self._blooms, self._tables = [], []
+        self._lock_file = None
+
+        if shared_name:
+            self._attach_shared(shared_name)
+        else:
+            self._buffer = memoryview(bytearray(self.size))
+            self._write_header(time.time(), 0, 0, 0)
+
+        for generation in range(2):
+            start = _HEADER.size + generation * self.generation_bytes
+            self._blooms.append(self._buffer[start:start + self.bloom_bits // 8])
+            self._tables.append(self._buffer[start + self.bloom_bits // 8:start + self.generation_bytes].cast("Q"))
+
+    def seen(self, key):
+        """
+        Check whether a token was recorded within the window
+
+        Args:
+            key: Bytes identifying the token
+        """
+        positions, fingerprint, slot = self._hash(key)
+        with self._lock:
+            header = self._rotate()
+            return self._contains(header, positions, fingerprint, slot)
+
+    def add(self, key):
+        """
+        Record a token
+
+        Returns:
+            False if it was already recorded (a replay), True otherwise
+        """
+        positions, fingerprint, slot = self._hash(key)
+        with self._lock:
+            header = self._rotate()
+            if self._contains(header, positions, fingerprint, slot):
+                return False
+
+            if header[6 + header[5]] >= self.capacity:
+                # Full: start a new generation now rather than overfill this one
+                self.early_rotations += 1
+                self._start_generation(header, time.time())
+                header = self._header()
+            started, current = header[4], header[5]
+            counts = [header[6], header[7]]
+
+            bloom = self._blooms[current]
+            for position in positions:
+                bloom[position >> 3] |= 1 << (position & 7)
+            table = self._tables[current]
+            while table[slot]:
+                slot = (slot + 1) % self.table_slots
+            table[slot] = fingerprint
+            counts[current] += 1
+            self._write_header(started, current, *counts)
+            return True
+
+    def stats(self):
+        """Return sizing and hit counters for reporting"""
+        with self._lock:
+            header = self._rotate()
+        return {
+            "window": self.window,
+            "fp_rate": self.fp_rate,
+            "bytes": self.size,
+            "capacity": self.capacity,
+            "hashes": self.hashes,
+            "entries": header[6] + header[7],
+            "shared": bool(self.shared_name),
+            "rotations": self.rotations,
+            "early_rotations": self.early_rotations,
+            "bloom_hits": self.bloom_hits,
+            "replays": self.replays,
+        }
+
+    def close(self):
+        """Detach from the shared segment; it stays in place for other workers"""
+        if self._shm is not None:
+            # Every view of the segment has to be released before it can be unmapped
+            for view in self._blooms + self._tables:
+                view.release()
+            self._blooms, self._tables = [], []
+            if self._buffer is not None:
+                self._buffer.release()
+                self._buffer = None
+            self._shm.close()
+            self._shm = None
+        if self._lock_file is not None:
+            self._lock_file.close()
+            self._lock_file = None
+
+    def unlink(self):
+        """Remove the shared segment so the next filter starts empty"""
+        from multiprocessing import shared_memory
+        self.close()
+        if self.shared_name:
+            segment = shared_memory.SharedMemory(name=self.shared_name)
+            segment.close()
+            segment.unlink()
+
+    def _hash(self, key):
+        digest = hashlib.blake2b(key, digest_size=16).digest()
+        h1, h2 = struct.unpack("<QQ", digest)
+        # Double hashing: every Bloom position comes from the same two 64-bit hashes
+        step = h2 | 1
+        positions = [(h1 + i * step) % self.bloom_bits for i in range(self.hashes)]
+        # Zero marks an empty table slot
+        return positions, h1 or 1, h2 % self.table_slots
+
+    def _contains(self, header, positions, fingerprint, slot):
+        current = header[5]
+        for generation in (current, 1 - current):
+            if not header[6 + generation]:
+                continue
+            bloom = self._blooms[generation]
+            if not all(bloom[position >> 3] & (1 << (position & 7)) for position in positions):
+                continue
+            # Possible replay; confirm against the fingerprints
+            self.bloom_hits += 1
+            table = self._tables[generation]
+            probe = slot
+            while table[probe]:
+                if table[probe] == fingerprint:
+                    self.replays += 1
+                    return True
+                probe = (probe + 1) % self.table_slots
+        return False
+
+    def _rotate(self):
+        """Start a new generation if the current one is a window old; returns the header"""
+        header = self._header()
+        started, current = header[4], header[5]
+        now = time.time()
+        if now - started < self.window:
+            return header
+        if now - started >= 2 * self.window:
+            # Idle for two windows: the current generation is stale too
+            self._clear(current)
+            header = header[:6] + (0, 0)
+        self._start_generation(header, now)
+        return self._header()
+
+    def _start_generation(self, header, now):
+        """Clear the older generation and make it current"""
+        current = 1 - header[5]
+        self._clear(current)
+        counts = [header[6], header[7]]
+        counts[current] = 0
+        self._write_header(now, current, *counts)
+        self.rotations += 1
+
+    def _clear(self, generation):
+        start = _HEADER.size + generation * self.generation_bytes
+        self._buffer[start:start + self.generation_bytes] = bytes(self.generation_bytes)
+
+    def _header(self):
+        return _HEADER.unpack_from(self._buffer)
+
+    def _write_header(self, started, current, count0, count1):
+        _HEADER.pack_into(self._buffer, 0, _MAGIC, self.bloom_bits, self.hashes, self.table_slots,
+                          started, current, count0, count1)
+
+    def _attach_shared(self, name):
+        from multiprocessing import shared_memory
+        self._lock = self._lock_file = _FileLock(os.path.join(tempfile.gettempdir(), f"{name}.lock"))
+        # Creating and initializing under the lock, so no worker sees a half-written header
+        with self._lock:
+            try:
+                self._shm = shared_memory.SharedMemory(name=name, create=True, size=self.size)
+                created = True
+            except FileExistsError:
+                self._shm = shared_memory.SharedMemory(name=name)
+                created = False
+            _untrack(self._shm)
+
+            mismatch = not created and (len(self._shm.buf) < self.size or _HEADER.unpack_from(self._shm.buf)[:4] !=
+                                        (_MAGIC, self.bloom_bits, self.hashes, self.table_slots))
+            if not mismatch:
+                self._buffer = self._shm.buf[:self.size]
+                if created:
+                    self._write_header(time.time(), 0, 0, 0)
+        if mismatch:
+            self.close()
+            raise ValueError(f"Shared replay cache '{name}' was created with different settings; "
+                             "use the same false-positive rate and memory cap in every worker")
+
+
+class _FileLock:
+    """Thread lock plus an flock on a file, so threads and processes take turns"""
+    def __init__(self, path):
+        import fcntl
+        self._fcntl = fcntl
+        self._thread_lock = threading.Lock()
+        self._fd = os.open(path, os.O_CREAT | os.O_RDWR, 0o600)
+
+    def __enter__(self):
+        self._thread_lock.acquire()
+        self._fcntl.flock(self._fd, self._fcntl.LOCK_EX)
+
+    def __exit__(self, *exc_info):
+        self._fcntl.flock(self._fd, self._fcntl.LOCK_UN)
+        self._thread_lock.release()
+
+    def close(self):
+        os.close(self._fd)
+
+
+def _untrack(shm):
+    # Python's resource tracker unlinks a segment when the process that
+    # created it exits; the filter has to outlive any one worker
+    try:
+        from multiprocessing import resource_tracker
+        resource_tracker.unregister(shm._name, "shared_memory")
+    except Exception:
+        pass
+
+
+def create_replay_filter(window=DEFAULT_WINDOW, fp_rate=DEFAULT_FP_RATE, max_bytes=DEFAULT_MAX_BYTES, shared=""):
+    """
+    Create a replay filter
+
+    Args:
+        window: Seconds a token is remembered for, at least
+        fp_rate: Bloom filter false-positive rate
+        max_bytes: Memory for the filter
+        shared: Shared memory segment name to share the filter between worker processes, or "" for per-process
+
+    Returns:
+        A ReplayFilter
+    """
+    return ReplayFilter(window, fp_rate, max_bytes, shared_name=shared or None)
@@ -0,0 +1,242 @@
+import math
+import threading
+
+import numpy as np
+
+from client import Agent
+
+# Rating dimensions in the order /review receives them
+DIMENSIONS = ("accuracy", "completion", "flow", "resolution")
+# Scale every rating must fall on; anything outside it would skew an
+# agent's on-chain average with no way to take it back
+RATING_MIN = 0
+RATING_MAX = 10
+
+# Rows allocated up front; the arrays double when they fill up
+INITIAL_CAPACITY = 64
+# Seconds between background flushes
+DEFAULT_FLUSH_INTERVAL = 30
+# Pending reviews that trigger a flush before the interval is up
+DEFAULT_MAX_PENDING = 10000
+
+
+def parse_ratings(text):
+    """
+    Parse a space-separated ratings string
+
+    Returns:
+        Tuple of one float per rating dimension
+
+    Raises:
+        ValueError: if there isn't exactly one number per dimension, each
+            between RATING_MIN and RATING_MAX
+    """
+    values = text.split()
+    if len(values) != len(DIMENSIONS):
+        raise ValueError(f"Expected {len(DIMENSIONS)} ratings ({', '.join(DIMENSIONS)}), got {len(values)}")
+    ratings = tuple(float(value) for value in values)
+    # Written this way round so NaN fails the check too
+    if not all(RATING_MIN <= rating <= RATING_MAX for rating in ratings):
+        raise ValueError(f"Ratings must be numbers from {RATING_MIN} to {RATING_MAX}")
+    return ratings
+
+
+class ReviewUpdate:
+    """Reviews received for one agent since the last flush"""
+    __slots__ = ("agent_id", "count", "sums")
+
+    def __init__(self, agent_id, count, sums):
+        self.agent_id = agent_id
+        self.count = count
+        self.sums = sums
+
+    @property
+    def overall_sum(self):
+        # A review's overall rating is the mean of its dimensions
+        return sum(self.sums) / len(DIMENSIONS)
+
+    def apply(self, agent):
+        """
+        Return a copy of an Agent with these reviews folded into its stats
+
+        The agent record has no separate review count, and number_of_calls
+        is what avg_customer_rating is averaged over, so each review is
+        counted as one call.
+        """
+        try:
+            calls = int(agent.number_of_calls)
+        except ValueError:
+            calls = 0
+        try:
+            rating = float(agent.avg_customer_rating)
+        except ValueError:
+            rating = float("nan")
+        # Agents without a usable rating start from these reviews alone
+        if calls <= 0 or not math.isfinite(rating):
+            calls, rating = 0, 0.0
+
+        total = calls + self.count
+        updated = Agent.from_dict(agent.to_dict())
+        updated.number_of_calls = str(total)
+        updated.avg_customer_rating = f"{(rating * calls + self.overall_sum) / total:.2f}"
+        return updated
+
+
+class ReviewAggregator:
+    """
+    Running per-agent review statistics kept in NumPy arrays.
+
+    Each agent gets a row; add() updates that row's lifetime count and
+    per-dimension means plus the counts and sums pending since the last
+    flush, so the request path is a dict lookup and a few array writes.
+    A background thread hands the pending rows to `writer` as a list of
+    ReviewUpdate every `flush_interval` seconds, or sooner once
+    `max_pending` reviews are waiting. The writer returns the agent_ids
+    whose reviews it could not write; those, or the whole batch if the
+    writer raises, stay pending for the next flush.
+    """
+    def __init__(self, writer, flush_interval=DEFAULT_FLUSH_INTERVAL, max_pending=DEFAULT_MAX_PENDING):
+        self.writer = writer
+        self.flush_interval = flush_interval
+        self.max_pending = max_pending
+        self.flushes = 0
+        self.flush_errors = 0
+        self._rows = {}
+        self._agent_ids = []
+        self._counts = np.zeros(INITIAL_CAPACITY, dtype=np.int64)
+        self._means = np.zeros((INITIAL_CAPACITY, len(DIMENSIONS)), dtype=np.float64)
+        self._pending_counts = np.zeros(INITIAL_CAPACITY, dtype=np.int64)
+        self._pending_sums = np.zeros((INITIAL_CAPACITY, len(DIMENSIONS)), dtype=np.float64)
+        self._pending_total = 0
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._wake = threading.Event()
+        self._worker = None
+
+    def add(self, agent_id, ratings):
+        """
+        Record one review
+
+        Args:
+            agent_id: Agent the review is for
+            ratings: One number per entry in DIMENSIONS
+        """
+        ratings = np.asarray(ratings, dtype=np.float64)
+        with self._lock:
+            row = self._rows.get(agent_id)
+            if row is None:
+                row = self._add_row(agent_id)
+            self._counts[row] += 1
+            # Incremental mean, so the lifetime sums never grow without bound
+            self._means[row] += (ratings - self._means[row]) / self._counts[row]
+            self._pending_counts[row] += 1
+            self._pending_sums[row] += ratings
+            self._pending_total += 1
+            # Only wake the flusher as the threshold is crossed, so a failing
+            # writer is retried on the interval rather than on every review
+            flush_now = self._pending_total == self.max_pending
+        self._ensure_worker()
+        if flush_now:
+            self._wake.set()
+
+    def _add_row(self, agent_id):
+        row = len(self._agent_ids)
+        if row == len(self._counts):
+            # Double every array so adding agents stays amortized O(1)
+            self._counts = np.resize(self._counts, row * 2)
+            self._pending_counts = np.resize(self._pending_counts, row * 2)
+            self._means = np.resize(self._means, (row * 2, len(DIMENSIONS)))
+            self._pending_sums = np.resize(self._pending_sums, (row * 2, len(DIMENSIONS)))
+            for column in (self._counts, self._pending_counts, self._means, self._pending_sums):
+                column[row:] = 0
+        self._rows[agent_id] = row
+        self._agent_ids.append(agent_id)
+        return row
+
+    def get(self, agent_id):
+        """Return an agent's lifetime review count and mean ratings, or None"""
+        with self._lock:
+            row = self._rows.get(agent_id)
+            if row is None:
+                return None
+            return {
+                "count": int(self._counts[row]),
+                "pending": int(self._pending_counts[row]),
+                "means": dict(zip(DIMENSIONS, self._means[row].tolist())),
+            }
+
+    def pending(self):
+        """Number of reviews not yet written"""
+        return self._pending_total
+
+    def flush(self):
+        """
+        Write pending reviews now
+
+        Returns:
+            Number of agents written
+        """
+        # One flush at a time, so a failed batch is restored before the next starts
+        with self._flush_lock:
+            with self._lock:
+                rows = np.flatnonzero(self._pending_counts[:len(self._agent_ids)])
+                if len(rows) == 0:
+                    return 0
+                counts = self._pending_counts[rows].copy()
+                sums = self._pending_sums[rows].copy()
+                self._pending_counts[rows] = 0
+                self._pending_sums[rows] = 0
+                self._pending_total -= int(counts.sum())
+
+            updates = [ReviewUpdate(self._agent_ids[row], count, row_sums)
+                       for row, count, row_sums in zip(rows.tolist(), counts.tolist(), sums.tolist())]
+            try:
+                unwritten = set(self.writer(updates) or ())
+            except Exception:
+                # Put the batch back so these reviews go out with the next flush
+                self._restore(rows, counts, sums)
+                self.flush_errors += 1
+                raise
+            written = len(updates)
+            if unwritten:
+                keep = np.array([update.agent_id in unwritten for update in updates])
+                self._restore(rows[keep], counts[keep], sums[keep])
+                written -= int(keep.sum())
+            self.flushes += 1
+            return written
+
+    def _restore(self, rows, counts, sums):
+        with self._lock:
+            self._pending_counts[rows] += counts
+            self._pending_sums[rows] += sums
+            self._pending_total += int(counts.sum())
+
+    def stats(self):
+        """Return aggregator counters for reporting"""
+        with self._lock:
+            return {
+                "agents": len(self._agent_ids),
+                "reviews": int(self._counts[:len(self._agent_ids)].sum()),
+                "pending": self._pending_total,
+                "flushes": self.flushes,
+                "flush_errors": self.flush_errors,
+            }
+
+    def _ensure_worker(self):
+        if self._worker is not None and self._worker.is_alive():
+            return
+        with self._lock:
+            if self._worker is None or not self._worker.is_alive():
+                self._worker = threading.Thread(target=self._run, name="review-flush", daemon=True)
+                self._worker.start()
+
+    def _run(self):
+        while True:
+            self._wake.wait(self.flush_interval)
+            self._wake.clear()
+            try:
+                written = self.flush()
+                if written:
+                    print(f"Flushed review stats for {written} agents")
+            except Exception as e:
+                print(f"Error flushing review stats: {e}")
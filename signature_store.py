@@ -0,0 +1,331 @@
+import bisect
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict, namedtuple
+
+# Defaults for how long and how many signatures are remembered
+DEFAULT_TTL = 24 * 60 * 60
+DEFAULT_MAX_ENTRIES = 100000
+
+# SQLite store prunes expired and excess rows once every this many writes
+PRUNE_EVERY = 256
+
+# Entries examined per lock hold or query while scanning, so a long scan never blocks writers for long
+SCAN_CHUNK = 256
+
+# One scanned signature; pass `cursor` back to scan() to continue after it
+SignatureEntry = namedtuple("SignatureEntry", ["signature", "message", "created_at", "cursor"])
+
+
+class SignatureStore:
+    """
+    Interface for signature -> message mappings with TTL and size eviction.
+
+    Backends must keep get() a single keyed lookup since it's on the
+    verify_message hot path.
+    """
+    def __init__(self, ttl=DEFAULT_TTL, max_entries=DEFAULT_MAX_ENTRIES):
+        self.ttl = ttl
+        self.max_entries = max_entries
+
+    def get(self, signature):
+        """Return the message for a signature, or None if unknown or expired"""
+        raise NotImplementedError
+
+    def put(self, signature, message):
+        """Remember the message a signature was made for"""
+        raise NotImplementedError
+
+    def items(self):
+        """Return live (signature, message) pairs, oldest first"""
+        return [(entry.signature, entry.message) for entry in self.scan()]
+
+    def scan(self, cursor=None, since=None, until=None, prefix=None, newest_first=False):
+        """
+        Iterate over live entries lazily, in the order they were stored
+
+        Args:
+            cursor: Continue after the entry with this cursor
+            since: Only entries created at or after this Unix time
+            until: Only entries created before this Unix time
+            prefix: Only signatures starting with this text
+            newest_first: Iterate from the most recent entry backwards
+
+        Returns:
+            Generator of SignatureEntry
+
+        Raises:
+            ValueError: if the cursor wasn't issued by this store
+        """
+        raise NotImplementedError
+
+    def purge_expired(self):
+        """Drop expired entries; returns how many were removed"""
+        raise NotImplementedError
+
+    def __len__(self):
+        raise NotImplementedError
+
+    def __contains__(self, signature):
+        return self.get(signature) is not None
+
+    def _expired(self, created_at, now):
+        return self.ttl is not None and now - created_at > self.ttl
+
+    def _earliest(self, since):
+        # Expired entries are skipped by raising the lower time bound
+        if self.ttl is None:
+            return since
+        cutoff = time.time() - self.ttl
+        return cutoff if since is None else max(since, cutoff)
+
+
+class MemorySignatureStore(SignatureStore):
+    """
+    Per-process store backed by an insertion-ordered dict.
+
+    Every put() gets a sequence number, which is the entry's cursor. A
+    parallel log of (sequence, signature) lets scan() find a cursor by
+    bisection; entries that were replaced or evicted stay in the log until
+    it is compacted, and scans skip them.
+    """
+    def __init__(self, ttl=DEFAULT_TTL, max_entries=DEFAULT_MAX_ENTRIES):
+        super().__init__(ttl, max_entries)
+        # signature -> (message, created_at, sequence)
+        self._entries = OrderedDict()
+        self._log_seqs = []
+        self._log_signatures = []
+        self._next_seq = 0
+        self._lock = threading.Lock()
+
+    def get(self, signature):
+        entry = self._entries.get(signature)
+        if entry is None:
+            return None
+        message, created_at, _ = entry
+        if self._expired(created_at, time.time()):
+            return None
+        return message
+
+    def put(self, signature, message):
+        now = time.time()
+        with self._lock:
+            # Re-inserting moves the entry to the end so the dict stays ordered by age
+            self._entries.pop(signature, None)
+            seq = self._next_seq
+            self._next_seq += 1
+            self._entries[signature] = (message, now, seq)
+            self._log_seqs.append(seq)
+            self._log_signatures.append(signature)
+            self._purge(now)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+            if len(self._log_seqs) > 2 * len(self._entries) + SCAN_CHUNK:
+                self._compact_log()
+
+    def scan(self, cursor=None, since=None, until=None, prefix=None, newest_first=False):
+        if cursor is None:
+            position = float("inf") if newest_first else -1
+        else:
+            try:
+                position = int(cursor)
+            except ValueError:
+                raise ValueError(f"Invalid signature cursor: {cursor!r}")
+        since = self._earliest(since)
+
+        while True:
+            chunk = []
+            with self._lock:
+                seqs, signatures = self._log_seqs, self._log_signatures
+                if newest_first:
+                    index = bisect.bisect_left(seqs, position) - 1
+                    stop, step = -1, -1
+                else:
+                    index = bisect.bisect_right(seqs, position)
+                    stop, step = len(seqs), 1
+                finished = True
+                examined = 0
+                while index != stop:
+                    if examined == SCAN_CHUNK:
+                        # Let writers in, then resume after `position`
+                        finished = False
+                        break
+                    examined += 1
+                    position = seqs[index]
+                    signature = signatures[index]
+                    index += step
+                    entry = self._entries.get(signature)
+                    if entry is None or entry[2] != position:
+                        continue
+                    message, created_at, _ = entry
+                    # Entries are stored in time order, so a bound behind the scan ends it
+                    if newest_first and since is not None and created_at < since:
+                        break
+                    if not newest_first and until is not None and created_at >= until:
+                        break
+                    if since is not None and created_at < since or until is not None and created_at >= until:
+                        continue
+                    if prefix and not signature.startswith(prefix):
+                        continue
+                    chunk.append(SignatureEntry(signature, message, created_at, str(position)))
+            yield from chunk
+            if finished:
+                return
+
+    def purge_expired(self):
+        with self._lock:
+            return self._purge(time.time())
+
+    def __len__(self):
+        return len(self._entries)
+
+    def _compact_log(self):
+        # The dict is in sequence order, so the live log can be rebuilt from it
+        self._log_signatures = list(self._entries)
+        self._log_seqs = [seq for _, _, seq in self._entries.values()]
+
+    def _purge(self, now):
+        # Oldest entries are at the front, so stop at the first live one
+        removed = 0
+        while self._entries:
+            signature, (_, created_at, _) = next(iter(self._entries.items()))
+            if not self._expired(created_at, now):
+                break
+            del self._entries[signature]
+            removed += 1
+        return removed
+
+
+class SQLiteSignatureStore(SignatureStore):
+    """
+    On-disk store that several worker processes can share.
+
+    Uses SQLite in WAL mode so readers don't block the writer, with one
+    connection per thread. Lookups go through the primary key index. Size
+    eviction runs every PRUNE_EVERY writes, so the table can briefly hold
+    up to that many rows over max_entries.
+    """
+    def __init__(self, path, ttl=DEFAULT_TTL, max_entries=DEFAULT_MAX_ENTRIES):
+        super().__init__(ttl, max_entries)
+        self.path = os.path.expanduser(path)
+        self._local = threading.local()
+        self._writes = 0
+        with self._connection() as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS signatures ("
+                "signature TEXT PRIMARY KEY, "
+                "message TEXT NOT NULL, "
+                "created_at REAL NOT NULL"
+                ") WITHOUT ROWID"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS signatures_created_at ON signatures (created_at)")
+
+    def get(self, signature):
+        row = self._connection().execute(
+            "SELECT message, created_at FROM signatures WHERE signature = ?", (signature,)
+        ).fetchone()
+        if row is None or self._expired(row[1], time.time()):
+            return None
+        return row[0]
+
+    def put(self, signature, message):
+        with self._connection() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO signatures (signature, message, created_at) VALUES (?, ?, ?)",
+                (signature, message, time.time())
+            )
+        # Pruning is amortized across writes rather than done on every insert
+        self._writes += 1
+        if self._writes % PRUNE_EVERY == 0:
+            self.purge_expired()
+            self._trim()
+
+    def scan(self, cursor=None, since=None, until=None, prefix=None, newest_first=False):
+        # Cursors are "<created_at>:<signature>", the position in the created_at index
+        if cursor is not None:
+            created_at, _, signature = cursor.partition(":")
+            try:
+                position = (float(created_at), signature)
+            except ValueError:
+                raise ValueError(f"Invalid signature cursor: {cursor!r}")
+        since = self._earliest(since)
+
+        conditions, params = [], []
+        if since is not None:
+            conditions.append("created_at >= ?")
+            params.append(since)
+        if until is not None:
+            conditions.append("created_at < ?")
+            params.append(until)
+        if prefix:
+            conditions.append("substr(signature, 1, ?) = ?")
+            params.extend((len(prefix), prefix))
+        direction = "DESC" if newest_first else "ASC"
+
+        while True:
+            page_conditions, page_params = list(conditions), list(params)
+            if cursor is not None:
+                page_conditions.append(f"(created_at, signature) {'<' if newest_first else '>'} (?, ?)")
+                page_params.extend(position)
+            where = f"WHERE {' AND '.join(page_conditions)}" if page_conditions else ""
+            # One short query per chunk, so the scan holds no transaction open between chunks
+            rows = self._connection().execute(
+                f"SELECT signature, message, created_at FROM signatures {where} "
+                f"ORDER BY created_at {direction}, signature {direction} LIMIT ?",
+                page_params + [SCAN_CHUNK]
+            ).fetchall()
+            for signature, message, created_at in rows:
+                cursor = f"{created_at!r}:{signature}"
+                position = (created_at, signature)
+                yield SignatureEntry(signature, message, created_at, cursor)
+            if len(rows) < SCAN_CHUNK:
+                return
+
+    def purge_expired(self):
+        if self.ttl is None:
+            return 0
+        with self._connection() as conn:
+            cursor = conn.execute("DELETE FROM signatures WHERE created_at < ?", (time.time() - self.ttl,))
+        return cursor.rowcount
+
+    def __len__(self):
+        return self._connection().execute("SELECT COUNT(*) FROM signatures").fetchone()[0]
+
+    def _trim(self):
+        with self._connection() as conn:
+            conn.execute(
+                "DELETE FROM signatures WHERE created_at <= ("
+                "SELECT created_at FROM signatures ORDER BY created_at DESC LIMIT 1 OFFSET ?)",
+                (self.max_entries,)
+            )
+
+    def _connection(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=10)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+
+def create_signature_store(url="memory", ttl=DEFAULT_TTL, max_entries=DEFAULT_MAX_ENTRIES):
+    """
+    Build a signature store from a URL
+
+    Args:
+        url: "memory" for a per-process store, or "sqlite:///path/to/file.db"
+            for a store shared between worker processes
+        ttl: Seconds a signature is remembered (None to keep until evicted)
+        max_entries: Maximum number of signatures kept
+
+    Returns:
+        A SignatureStore instance
+    """
+    if url == "memory":
+        return MemorySignatureStore(ttl=ttl, max_entries=max_entries)
+    if url.startswith("sqlite:///"):
+        return SQLiteSignatureStore(url[len("sqlite:///"):], ttl=ttl, max_entries=max_entries)
+    raise ValueError(f"Unsupported signature store URL: {url}")
@@ -0,0 +1,224 @@
+"""
+Compact self-contained signed payloads.
+
+Binary layout (all integers big-endian):
+
+    [0]      version (high nibble) and flags (low nibble)
+    [1:5]    key id - first 4 bytes of SHA-256 over the raw signer public key
+    [5:9]    timestamp - unix seconds when the payload was signed
+    [9:-64]  message as UTF-8, or an 8 byte SHA-256 digest of it (FLAG_DIGEST)
+    [-64:]   Ed25519 signature over everything before it
+
+Version 2 payloads shorten the key id to 0, 1 or 2 bytes (selected by flag
+bits 1-2); a validator then tries every trusted key with that prefix. The
+payload is sent as base64 text by default, or as base85 text or raw bytes
+to keep tokens shorter on air. Short messages are carried in full so a
+validator can verify and recover them with nothing but the signer's public
+key; longer ones are replaced by a digest to keep the token within
+ggwave's payload limit.
+"""
+import base64
+import binascii
+import hashlib
+import struct
+import time
+
+from cryptography.exceptions import InvalidSignature
+
+from key_ring import KEY_ID_SIZE
+
+VERSION = 1
+# Same layout with a shorter (or no) key id
+VERSION_SHORT_KEY_ID = 2
+# Payload carries a message digest instead of the message itself
+FLAG_DIGEST = 0x01
+# Key id lengths a version 2 payload can carry, indexed by flag bits 1-2
+KEY_ID_SIZES = (0, 1, 2, KEY_ID_SIZE)
+_KEY_ID_SIZE_SHIFT = 1
+
+HEADER = struct.Struct(f">B{KEY_ID_SIZE}sI")
+_TIMESTAMP = struct.Struct(">I")
+SIGNATURE_SIZE = 64
+DIGEST_SIZE = 8
+
+# ggwave's variable-length payload limit, in characters
+MAX_PAYLOAD_CHARS = 140
+
+# How a payload is turned into a ggwave payload, and how many payload bytes
+# each encoding fits into MAX_PAYLOAD_CHARS
+ENCODINGS = ("base64", "base85", "raw")
+_ENCODED_CAPACITY = {
+    "base64": (MAX_PAYLOAD_CHARS // 4) * 3,
+    "base85": (MAX_PAYLOAD_CHARS // 5) * 4,
+    "raw": MAX_PAYLOAD_CHARS,
+}
+
+
+def max_embedded_message(encoding="base64", key_id_size=KEY_ID_SIZE):
+    """Longest UTF-8 message carried in full for an encoding and key id length"""
+    return _ENCODED_CAPACITY[encoding] - (1 + key_id_size + _TIMESTAMP.size) - SIGNATURE_SIZE
+
+
+# Longest UTF-8 message that still fits in MAX_PAYLOAD_CHARS once base64 encoded
+MAX_EMBEDDED_MESSAGE = max_embedded_message()
+
+
+class PayloadError(ValueError):
+    """Raised when a token is not a well-formed signed payload"""
+    pass
+
+
+class SignedPayload:
+    """A parsed payload; `message` is None when only a digest was sent"""
+    __slots__ = ("flags", "key_id", "timestamp", "message", "digest", "signed_data", "signature")
+
+    def __init__(self, flags, key_id, timestamp, message, digest, signed_data, signature):
+        self.flags = flags
+        self.key_id = key_id
+        self.timestamp = timestamp
+        self.message = message
+        self.digest = digest
+        self.signed_data = signed_data
+        self.signature = signature
+
+    def verify(self, public_key):
+        """Return True if the signature is valid for this payload under public_key"""
+        try:
+            public_key.verify(self.signature, self.signed_data)
+            return True
+        except InvalidSignature:
+            return False
+
+    def age(self, now=None):
+        """Seconds since the payload was signed"""
+        return (now if now is not None else time.time()) - self.timestamp
+
+
+def message_digest(message):
+    """Truncated SHA-256 digest sent in place of long messages"""
+    return hashlib.sha256(message.encode("utf-8")).digest()[:DIGEST_SIZE]
+
+
+def pack(message, private_key, key_id, timestamp=None, encoding="base64", key_id_size=KEY_ID_SIZE):
+    """
+    Build and sign a binary payload
+
+    Args:
+        message: Text being vouched for
+        private_key: Ed25519 private key to sign with
+        key_id: Fingerprint of the signing key
+        timestamp: Unix seconds to embed (defaults to now)
+        encoding: Encoding the payload will be sent in; decides how long a
+            message can be before it is replaced by a digest
+        key_id_size: Bytes of the key id to include, one of KEY_ID_SIZES
+
+    Returns:
+        The payload bytes
+    """
+    if encoding not in ENCODINGS:
+        raise ValueError(f"Unknown payload encoding: {encoding}")
+    if key_id_size not in KEY_ID_SIZES:
+        raise ValueError(f"Key id size must be one of {KEY_ID_SIZES}")
+
+    message_bytes = message.encode("utf-8")
+    flags = 0
+    if len(message_bytes) > max_embedded_message(encoding, key_id_size):
+        flags |= FLAG_DIGEST
+        message_bytes = message_digest(message)
+
+    # Full key ids keep the version 1 layout so older validators still accept them
+    if key_id_size == KEY_ID_SIZE:
+        version_flags = (VERSION << 4) | flags
+    else:
+        version_flags = (VERSION_SHORT_KEY_ID << 4) | flags | (KEY_ID_SIZES.index(key_id_size) << _KEY_ID_SIZE_SHIFT)
+
+    timestamp = int(time.time() if timestamp is None else timestamp)
+    signed_data = bytes((version_flags,)) + key_id[:key_id_size] + _TIMESTAMP.pack(timestamp) + message_bytes
+    return signed_data + private_key.sign(signed_data)
+
+
+def unpack(data):
+    """
+    Parse payload bytes without verifying them
+
+    Raises:
+        PayloadError: if the bytes are not a version 1 or 2 payload
+    """
+    if not data:
+        raise PayloadError("Payload is empty")
+
+    version, flags = data[0] >> 4, data[0] & 0x0F
+    if version == VERSION:
+        key_id_size = KEY_ID_SIZE
+    elif version == VERSION_SHORT_KEY_ID:
+        key_id_size = KEY_ID_SIZES[(flags >> _KEY_ID_SIZE_SHIFT) & 0x03]
+    else:
+        raise PayloadError(f"Unsupported payload version {version}")
+
+    header_size = 1 + key_id_size + _TIMESTAMP.size
+    if len(data) < header_size + SIGNATURE_SIZE:
+        raise PayloadError(f"Payload too short ({len(data)} bytes)")
+    key_id = data[1:1 + key_id_size]
+    (timestamp,) = _TIMESTAMP.unpack_from(data, 1 + key_id_size)
+
+    body = data[header_size:-SIGNATURE_SIZE]
+    message = digest = None
+    if flags & FLAG_DIGEST:
+        if len(body) != DIGEST_SIZE:
+            raise PayloadError("Digest payload has the wrong digest length")
+        digest = body
+    else:
+        try:
+            message = body.decode("utf-8")
+        except UnicodeDecodeError:
+            raise PayloadError("Payload message is not valid UTF-8")
+
+    return SignedPayload(flags, key_id, timestamp, message, digest,
+                         data[:-SIGNATURE_SIZE], data[-SIGNATURE_SIZE:])
+
+
+def encode(data, encoding="base64"):
+    """Encode payload bytes for transmission; raw payloads are returned as bytes"""
+    if encoding == "base64":
+        return base64.b64encode(data).decode("ascii")
+    if encoding == "base85":
+        return base64.b85encode(data).decode("ascii")
+    if encoding == "raw":
+        return bytes(data)
+    raise ValueError(f"Unknown payload encoding: {encoding}")
+
+
+def decode(token):
+    """
+    Parse a transmitted token in any supported encoding
+
+    Args:
+        token: Raw payload bytes, or base64 or base85 text
+
+    Raises:
+        PayloadError: if the token isn't a signed payload (e.g. a bare signature)
+    """
+    if isinstance(token, (bytes, bytearray)):
+        return unpack(bytes(token))
+
+    # base64 first: every version 1 token uses it, and '/' and '=' never
+    # appear in base85. A base85 token is almost never valid base64, and if
+    # it is, it won't unpack.
+    try:
+        return unpack(base64.b64decode(token, validate=True))
+    except (binascii.Error, ValueError):
+        pass
+    try:
+        data = base64.b85decode(token)
+    except ValueError:
+        raise PayloadError("Token is not valid base64 or base85")
+    # A bare Ed25519 signature decodes to exactly 64 bytes, which is shorter
+    # than any payload, so it is rejected here by the length check
+    return unpack(data)
+
+
+def token_text(token):
+    """Text form of a token for storage and JSON; raw tokens become base64"""
+    if isinstance(token, (bytes, bytearray)):
+        return base64.b64encode(token).decode("ascii")
+    return token
@@ -1,12 +1,19 @@
+import time
+from collections import deque
 from solana.rpc.api import Client
 from solana.rpc.types import TxOpts
-from solana.keypair import Keypair
 from solana.transaction import Transaction
-from solana.system_program import CreateAccountParams, create_account
-from solana.publickey import PublicKey
-import borsh
+from solders.instruction import Instruction, AccountMeta
+from solders.pubkey import Pubkey
+from solders.system_program import CreateAccountParams, create_account
+from solders.transaction_status import TransactionConfirmationStatus
 from borsh_construct import String, CStruct
 
+# Maximum serialized transaction size (IPv6 MTU minus headers)
+PACKET_DATA_SIZE = 1232
+# get_signature_statuses accepts at most this many signatures per call
+MAX_SIGNATURE_STATUSES = 256
+
 # Define the Agent class for serialization/deserialization
 class Agent:
     schema = CStruct(
@@ -49,21 +56,21 @@ class Agent:
         )
 
 class AgentStoreClient:
-    def __init__(self, rpc_url="https://api.devnet.solana.com"):
+    def __init__(self, program_id, rpc_url="https://api.devnet.solana.com"):
         self.client = Client(rpc_url)
-        # Replace with your program ID after deployment
-        self.program_id = PublicKey("YOUR_PROGRAM_ID_HERE")
+        # The program ID printed after deployment
+        self.program_id = Pubkey.from_string(program_id)
     
     def create_agent_account(self, payer, agent_id, space=1000):
         """Create a new account to store agent data"""
         # Derive a PDA (Program Derived Address) for the agent
         # This creates a deterministic address based on the agent_id
         seeds = [bytes(agent_id, 'utf-8')]
-        agent_pubkey, bump = PublicKey.find_program_address(seeds, self.program_id)
+        agent_pubkey, bump = Pubkey.find_program_address(seeds, self.program_id)
         
         # Calculate rent-exempt balance
         resp = self.client.get_minimum_balance_for_rent_exemption(space)
-        lamports = resp["result"]
+        lamports = resp.value
         
         # Create transaction to create the account
         transaction = Transaction()
@@ -71,7 +78,7 @@ class AgentStoreClient:
         # Add create account instruction
         create_acct_ix = create_account(
             CreateAccountParams(
-                from_pubkey=payer.public_key,
+                from_pubkey=payer.pubkey(),
                 new_account_pubkey=agent_pubkey,
                 lamports=lamports,
                 space=space,
@@ -87,26 +94,28 @@ class AgentStoreClient:
         
         return agent_pubkey, result
     
-    def update_agent(self, payer, agent):
-        """Update agent data"""
+    def upsert_instruction(self, payer, agent):
+        """Build the Upsert instruction for one agent"""
         # Derive the agent's account address
         seeds = [bytes(agent.agent_id, 'utf-8')]
-        agent_pubkey, _ = PublicKey.find_program_address(seeds, self.program_id)
+        agent_pubkey, _ = Pubkey.find_program_address(seeds, self.program_id)
         
         # Create instruction data (UPSERT = 0, followed by serialized agent data)
         instruction_data = bytes([0]) + agent.serialize()
         
-        # Create transaction
-        transaction = Transaction().add(
-            TransactionInstruction(
-                keys=[
-                    AccountMeta(payer.public_key, is_signer=True, is_writable=True),
-                    AccountMeta(agent_pubkey, is_signer=False, is_writable=True),
-                ],
-                program_id=self.program_id,
-                data=instruction_data,
-            )
+        return Instruction(
+            program_id=self.program_id,
+            data=instruction_data,
+            accounts=[
+                AccountMeta(payer.pubkey(), is_signer=True, is_writable=True),
+                AccountMeta(agent_pubkey, is_signer=False, is_writable=True),
+            ],
         )
+    
+    def update_agent(self, payer, agent):
+        """Update agent data"""
+        # Create transaction
+        transaction = Transaction().add(self.upsert_instruction(payer, agent))
         
         # Sign and send transaction
         result = self.client.send_transaction(
@@ -115,38 +124,188 @@ class AgentStoreClient:
         
         return result
     
+    @staticmethod
+    def estimate_transaction_size(instruction_sizes):
+        """
+        Estimate the wire size of a single-signer Upsert transaction
+        
+        Args:
+            instruction_sizes: Length of each instruction's data
+        """
+        count = len(instruction_sizes)
+        # Signature count + one signature, message header, then the account keys:
+        # payer, program id and one agent account per instruction
+        size = 1 + 64 + 3 + 1 + 32 * (2 + count) + 32
+        # Instruction count, then per instruction: program index, account
+        # indexes (length prefix + 2), data length prefix and data
+        size += 1
+        for data_size in instruction_sizes:
+            size += 1 + 3 + (1 if data_size < 0x80 else 2) + data_size
+        return size
+    
+    def pack_upserts(self, agents, max_size=PACKET_DATA_SIZE):
+        """Group agents so each group's Upsert instructions fit in one transaction"""
+        batches = []
+        batch = []
+        sizes = []
+        for agent in agents:
+            data_size = 1 + len(agent.serialize())
+            if batch and self.estimate_transaction_size(sizes + [data_size]) > max_size:
+                batches.append(batch)
+                batch, sizes = [], []
+            batch.append(agent)
+            sizes.append(data_size)
+        if batch:
+            batches.append(batch)
+        return batches
+    
+    def batch_upsert(self, payer, agents, window=8, max_retries=3, backoff=0.5,
+                     confirm_timeout=30, poll_interval=0.5):
+        """
+        Upsert many agents, packing several instructions per transaction
+        
+        Keeps up to `window` transactions in flight, polls their statuses in
+        bulk and re-packs the agents of failed or expired transactions for
+        another attempt after an exponential backoff. A transaction lands or
+        fails as a whole, so when the program rejects one holding several
+        agents it is split in half and both halves are resent, down to
+        single agents; only the agent at fault uses up its retries. Later
+        entries for the same agent_id replace earlier ones.
+        
+        Args:
+            payer: Keypair paying for and signing the transactions
+            agents: Agent objects to write
+            window: Maximum number of unconfirmed transactions at once
+            max_retries: Failed attempts after the first before an agent is reported failed
+            backoff: Base delay in seconds before a retry (doubles each attempt)
+            confirm_timeout: Seconds to wait for a transaction before retrying it
+            poll_interval: Seconds between status polls
+        
+        Returns:
+            Dict of agent_id to {"ok", "signature", "error", "attempts"}
+        """
+        # One write per agent; the last entry wins, as it would if sent in order
+        agents = list({agent.agent_id: agent for agent in agents}.values())
+        results = {agent.agent_id: {"ok": False, "signature": None, "error": None, "attempts": 0}
+                   for agent in agents}
+        # Failures charged to each agent; a split batch doesn't count against its agents
+        failures = dict.fromkeys(results, 0)
+        # (not_before, agents) groups waiting to be sent
+        pending = deque((0.0, batch) for batch in self.pack_upserts(agents))
+        # signature -> (sent_at, agents)
+        in_flight = {}
+        blockhash = None
+        blockhash_at = 0.0
+        
+        while pending or in_flight:
+            now = time.monotonic()
+            
+            # Fill the window with batches whose backoff has elapsed
+            deferred = deque()
+            while pending and len(in_flight) < window:
+                not_before, batch = pending.popleft()
+                if not_before > now:
+                    deferred.append((not_before, batch))
+                    continue
+                # Blockhashes last ~60s; refresh well before that instead of per send
+                if blockhash is None or now - blockhash_at > 20:
+                    blockhash = self.client.get_latest_blockhash().value.blockhash
+                    blockhash_at = now
+                for agent in batch:
+                    results[agent.agent_id]["attempts"] += 1
+                transaction = Transaction()
+                for agent in batch:
+                    transaction.add(self.upsert_instruction(payer, agent))
+                try:
+                    signature = self.client.send_transaction(
+                        transaction, payer, opts=TxOpts(skip_preflight=True), recent_blockhash=blockhash
+                    ).value
+                    in_flight[signature] = (now, batch)
+                except Exception as e:
+                    self._retry_or_fail(batch, str(e), results, failures, deferred, max_retries, backoff)
+            pending.extendleft(reversed(deferred))
+            
+            if not in_flight:
+                if pending:
+                    time.sleep(max(0.0, min(not_before for not_before, _ in pending) - time.monotonic()))
+                continue
+            
+            time.sleep(poll_interval)
+            signatures = list(in_flight)
+            for start in range(0, len(signatures), MAX_SIGNATURE_STATUSES):
+                chunk = signatures[start:start + MAX_SIGNATURE_STATUSES]
+                statuses = self.client.get_signature_statuses(chunk).value
+                for signature, status in zip(chunk, statuses):
+                    sent_at, batch = in_flight[signature]
+                    if status is None:
+                        if time.monotonic() - sent_at > confirm_timeout:
+                            del in_flight[signature]
+                            self._retry_or_fail(batch, "Transaction not confirmed in time",
+                                                results, failures, pending, max_retries, backoff)
+                        continue
+                    if status.err:
+                        del in_flight[signature]
+                        error = f"Transaction failed: {status.err}"
+                        if len(batch) > 1:
+                            # Any one agent can fail the whole transaction; bisect to find it
+                            middle = len(batch) // 2
+                            for half in (batch[:middle], batch[middle:]):
+                                for agent in half:
+                                    results[agent.agent_id]["error"] = error
+                                pending.append((0.0, half))
+                        else:
+                            self._retry_or_fail(batch, error, results, failures, pending, max_retries, backoff)
+                    elif status.confirmation_status in (TransactionConfirmationStatus.Confirmed,
+                                                        TransactionConfirmationStatus.Finalized):
+                        del in_flight[signature]
+                        for agent in batch:
+                            results[agent.agent_id].update(ok=True, signature=signature, error=None)
+        
+        return results
+    
+    @staticmethod
+    def _retry_or_fail(batch, error, results, failures, pending, max_retries, backoff):
+        # Upserts are idempotent, so resending a batch that did land is harmless
+        retry = []
+        for agent in batch:
+            results[agent.agent_id]["error"] = error
+            failures[agent.agent_id] += 1
+            if failures[agent.agent_id] <= max_retries:
+                retry.append(agent)
+        if retry:
+            failed = failures[retry[0].agent_id]
+            pending.append((time.monotonic() + backoff * 2 ** (failed - 1), retry))
+    
     def get_agent(self, agent_id):
         """Read agent data"""
         # Derive the agent's account address
         seeds = [bytes(agent_id, 'utf-8')]
-        agent_pubkey, _ = PublicKey.find_program_address(seeds, self.program_id)
+        agent_pubkey, _ = Pubkey.find_program_address(seeds, self.program_id)
         
         # Get account data
         account_info = self.client.get_account_info(agent_pubkey)
         
-        if not account_info["result"]["value"]:
+        if not account_info.value:
             return None
         
         # Deserialize the data
-        data = bytes(account_info["result"]["value"]["data"][0])
+        data = bytes(account_info.value.data)
         agent = Agent.deserialize(data)
         
         return agent
 
 """ Example usage
 if __name__ == "__main__":
-    from solana.keypair import Keypair
-    from solana.transaction import TransactionInstruction
-    from solana.rpc.types import AccountMeta
+    from solders.keypair import Keypair
     
-    # Initialize client
-    client = AgentStoreClient()
+    # Initialize client with the deployed program's ID
+    client = AgentStoreClient("MGEB8Ba6ydpGj3FgjA9q79Az37xX9nuvBKbGqV2n8Ji")
     
     # Create keypair for testing (in practice, load from secure storage)
-    payer = Keypair.generate()
+    payer = Keypair()
     
     # Airdrop some SOL (only for devnet/testnet)
-    client.client.request_airdrop(payer.public_key, 1000000000)  # 1 SOL in lamports
+    client.client.request_airdrop(payer.pubkey(), 1000000000)  # 1 SOL in lamports
     
     # Create a new agent
     agent = Agent(
@@ -179,4 +338,9 @@ if __name__ == "__main__":
     # Get updated agent data
     retrieved_agent = client.get_agent(agent.agent_id)
     print(f"Retrieved updated agent: {retrieved_agent.__dict__}")
+    
+    # Update many agents, several per transaction with 8 transactions in flight
+    results = client.batch_upsert(payer, [agent], window=8)
+    failed = [agent_id for agent_id, result in results.items() if not result["ok"]]
+    print(f"Batch upsert failed for: {failed}")
 """
@@ -147,12 +147,23 @@ document.addEventListener('DOMContentLoaded', () => {
         logContainer.scrollTop = logContainer.scrollHeight; // Auto-scroll to bottom
     }
     
-    // Audio context and recorder variables
+    // Samples per ggwave decode frame (the decoder's default) and the longest we listen for a token
+    const FRAME_SIZE = 1024;
+    const MAX_LISTEN_SECONDS = 30;
+    
+    // Audio context and capture variables
     let audioContext = null;
-    let recorder = null;
     let ggwave = null;
     let ggwaveInstance = null;
-    let audioChunks = [];
+    let workletAvailable = false;
+    let frameSize = FRAME_SIZE;
+    let captureStream = null;
+    let captureSource = null;
+    let captureNode = null;
+    let captureSink = null;
+    let captureTimeout = null;
+    let captureStartedAt = 0;
+    let framesDecoded = 0;
     let isRecording = false;
     let audioInitialized = false;
     let analyser = null;
@@ -161,13 +172,6 @@ document.addEventListener('DOMContentLoaded', () => {
     let using3DVisualizer = false;
     let animationFrameId = null;
     
-    // Helper function to convert array types (from gibberlink)
-    function convertTypedArray(src, type) {
-        const buffer = new ArrayBuffer(src.byteLength);
-        new src.constructor(buffer).set(src);
-        return new type(buffer);
-    }
-    
     // Check if we're on iOS - need special handling
     const isIOS = /iPad|iPhone|iPod/.test(navigator.userAgent) && !window.MSStream;
     log(`Detected platform: ${isIOS ? 'iOS' : 'non-iOS'}`);
@@ -332,6 +336,17 @@ document.addEventListener('DOMContentLoaded', () => {
                 return false;
             }
             
+            // Load the frame capture processor; without it we fall back to a ScriptProcessor
+            if (audioContext.audioWorklet && typeof AudioWorkletNode === 'function') {
+                try {
+                    await audioContext.audioWorklet.addModule('/static/js/capture-processor.js');
+                    workletAvailable = true;
+                    log('AudioWorklet capture processor loaded');
+                } catch (error) {
+                    log(`Error loading AudioWorklet processor: ${error.message}`, 'warning');
+                }
+            }
+            
             // Initialize visualizer
             setupVisualizer();
             
@@ -594,7 +609,83 @@ document.addEventListener('DOMContentLoaded', () => {
         log('Audio visualizer stopped');
     }
     
-    // Request microphone permission and start recording
+    // Fresh decoder for each recording; it keeps its state across frames,
+    // so a payload split over many frames still decodes
+    function resetDecoder() {
+        if (ggwaveInstance !== null && typeof ggwave.free === 'function') {
+            ggwave.free(ggwaveInstance);
+        }
+        const parameters = typeof ggwave.getDefaultParameters === 'function' ?
+                           ggwave.getDefaultParameters() : {};
+        parameters.sampleRateInp = audioContext.sampleRate;
+        parameters.sampleRateOut = audioContext.sampleRate;
+        // Frames from the capture node must match the decoder's frame size
+        frameSize = parameters.samplesPerFrame || FRAME_SIZE;
+        ggwaveInstance = ggwave.init(parameters);
+        framesDecoded = 0;
+        log(`Decoder ready: ${frameSize} samples per frame at ${audioContext.sampleRate}Hz`);
+    }
+    
+    // Create the node that feeds microphone frames to handleFrame
+    function createCaptureNode() {
+        if (workletAvailable) {
+            const node = new AudioWorkletNode(audioContext, 'capture-processor', {
+                numberOfInputs: 1,
+                numberOfOutputs: 1,
+                channelCount: 1,
+                processorOptions: { frameSize: frameSize }
+            });
+            node.port.onmessage = event => handleFrame(event.data);
+            log('Capturing with AudioWorklet');
+            return node;
+        }
+        
+        // Older browsers without AudioWorklet: same frames from a ScriptProcessor
+        const node = audioContext.createScriptProcessor(frameSize, 1, 1);
+        node.onaudioprocess = event => handleFrame(event.inputBuffer.getChannelData(0));
+        log('AudioWorklet not available, capturing with ScriptProcessor', 'warning');
+        return node;
+    }
+    
+    // Decode one frame of float32 samples; stops listening as soon as a payload decodes
+    function handleFrame(samples) {
+        if (!isRecording) return;
+        
+        framesDecoded++;
+        let result = null;
+        try {
+            // ggwave takes the raw float32 bytes
+            result = ggwave.decode(ggwaveInstance, new Int8Array(samples.buffer, samples.byteOffset, samples.byteLength));
+        } catch (error) {
+            log(`Error in ggwave.decode: ${error.message}`, 'error');
+            stopCapture();
+            showResult('Error decoding audio. Please try again.');
+            return;
+        }
+        
+        if (result && result.length > 0) {
+            const seconds = (performance.now() - captureStartedAt) / 1000;
+            log(`Payload decoded after ${seconds.toFixed(2)}s (${framesDecoded} frames, ${result.length} bytes)`);
+            stopCapture();
+            
+            const body = tokenRequestBody(new Uint8Array(result));
+            const shown = body.decoded_text || body.decoded_bytes;
+            statusDisplay.textContent = shown.length > 40 ? shown.substring(0, 40) + '...' : shown;
+            loadingIndicator.classList.add('visible');
+            validateDecodedText(body);
+        }
+    }
+    
+    // Text tokens (base64/base85) are printable ASCII; anything else is a raw
+    // binary token and is sent base64 encoded as decoded_bytes
+    function tokenRequestBody(bytes) {
+        if (bytes.every(byte => byte >= 0x20 && byte <= 0x7e)) {
+            return { decoded_text: String.fromCharCode(...bytes) };
+        }
+        return { decoded_bytes: btoa(String.fromCharCode(...bytes)) };
+    }
+    
+    // Request microphone permission and start listening
     async function startRecording() {
         // Initialize audio on first user interaction
         if (!audioInitialized) {
@@ -619,59 +710,40 @@ document.addEventListener('DOMContentLoaded', () => {
             };
             
             log('Requesting microphone access...');
-            const stream = await navigator.mediaDevices.getUserMedia(constraints);
+            captureStream = await navigator.mediaDevices.getUserMedia(constraints);
             log('Microphone access granted');
             
-            // Connect stream to analyser for visualization
-            const source = audioContext.createMediaStreamSource(stream);
-            source.connect(analyser);
-            
-            // Create recorder with specific options
-            const options = { mimeType: 'audio/webm' };
-            try {
-                recorder = new MediaRecorder(stream, options);
-                log(`MediaRecorder created with mimeType: ${options.mimeType}`);
-            } catch (e) {
-                log(`MediaRecorder with options not supported, using default: ${e.message}`, 'warning');
-                recorder = new MediaRecorder(stream);
-                log(`MediaRecorder created with default settings, mimeType: ${recorder.mimeType}`);
+            if (audioContext.state === 'suspended') {
+                await audioContext.resume();
             }
             
-            audioChunks = [];
+            resetDecoder();
             
-            recorder.ondataavailable = event => {
-                if (event.data.size > 0) {
-                    audioChunks.push(event.data);
-                    log(`Received audio chunk: ${event.data.size} bytes`);
-                }
-            };
-            
-            recorder.onstop = () => {
-                // Stop the visualizer
-                stopVisualizer();
-                // Process the recording
-                processRecording();
-                // Stop all tracks to release the microphone
-                stream.getTracks().forEach(track => track.stop());
-            };
-            
-            // Special handling for iOS
-            if (isIOS) {
-                // iOS sometimes needs smaller chunks
-                recorder.start(500);
-                log('Started recording with 500ms chunks (iOS)');
-            } else {
-                recorder.start(1000); // Collect data in 1-second chunks
-                log('Started recording with 1000ms chunks');
-            }
+            // Microphone -> analyser (visualizer) and capture node -> muted output.
+            // The capture node must reach the destination or some browsers never run it.
+            captureSource = audioContext.createMediaStreamSource(captureStream);
+            captureSource.connect(analyser);
+            captureNode = createCaptureNode();
+            captureSink = audioContext.createGain();
+            captureSink.gain.value = 0;
+            captureSource.connect(captureNode);
+            captureNode.connect(captureSink);
+            captureSink.connect(audioContext.destination);
             
             isRecording = true;
+            captureStartedAt = performance.now();
+            
+            // Give up if nothing decodes in time
+            captureTimeout = setTimeout(() => {
+                log(`No payload after ${MAX_LISTEN_SECONDS}s, stopping`, 'warning');
+                stopRecording();
+            }, MAX_LISTEN_SECONDS * 1000);
             
             // Start the visualizer
             startVisualizer();
             
             // Update UI
-            validateBtn.textContent = 'Stop Recording';
+            validateBtn.textContent = 'Stop Listening';
             validateBtn.classList.add('recording');
             circleText.textContent = '';
             statusDisplay.textContent = 'Listening...';
@@ -681,169 +753,73 @@ document.addEventListener('DOMContentLoaded', () => {
             
         } catch (error) {
             log(`Error starting recording: ${error.message}`, 'error');
+            stopCapture();
             statusDisplay.textContent = 'Cannot access microphone. Please check permissions.';
         }
     }
     
-    // Stop recording
-    function stopRecording() {
-        if (recorder && isRecording) {
-            log('Stopping recording...');
-            recorder.stop();
-            isRecording = false;
-            
-            // Update UI
-            validateBtn.textContent = 'Validate';
-            validateBtn.classList.remove('recording');
-            circleText.textContent = '';
-            statusDisplay.textContent = 'Processing...';
-            loadingIndicator.classList.add('visible');
+    // Tear down the capture graph and release the microphone
+    function stopCapture() {
+        isRecording = false;
+        clearTimeout(captureTimeout);
+        captureTimeout = null;
+        
+        if (captureNode) {
+            if (captureNode.port) {
+                captureNode.port.postMessage('stop');
+                captureNode.port.onmessage = null;
+            } else {
+                captureNode.onaudioprocess = null;
+            }
+            captureNode.disconnect();
+            captureNode = null;
+        }
+        if (captureSink) {
+            captureSink.disconnect();
+            captureSink = null;
         }
+        if (captureSource) {
+            captureSource.disconnect();
+            captureSource = null;
+        }
+        if (captureStream) {
+            captureStream.getTracks().forEach(track => track.stop());
+            captureStream = null;
+        }
+        
+        stopVisualizer();
+        validateBtn.textContent = 'Validate';
+        validateBtn.classList.remove('recording');
+        circleText.textContent = '';
     }
     
-    // Process the recorded audio
-    async function processRecording() {
-        try {
-            log(`Processing ${audioChunks.length} audio chunks...`);
-            const audioBlob = new Blob(audioChunks, { type: 'audio/webm' });
-            log(`Created audio blob of size: ${audioBlob.size} bytes`);
-            
-            // Decode the audio using ggwave
-            const arrayBuffer = await audioBlob.arrayBuffer();
-            
-            log(`Processing audio buffer of size: ${arrayBuffer.byteLength} bytes`);
-            
-            try {
-                log('Decoding audio data...');
-                const audioData = await audioContext.decodeAudioData(arrayBuffer);
-                
-                const floatData = audioData.getChannelData(0);
-                const sampleRate = audioData.sampleRate;
-                
-                log(`Audio decoded: ${floatData.length} samples at ${sampleRate}Hz`);
-                
-                // Log audio stats for debugging
-                let maxAmplitude = 0;
-                let sumAmplitude = 0;
-                for (let i = 0; i < floatData.length; i++) {
-                    maxAmplitude = Math.max(maxAmplitude, Math.abs(floatData[i]));
-                    sumAmplitude += Math.abs(floatData[i]);
-                }
-                const avgAmplitude = sumAmplitude / floatData.length;
-                log(`Audio stats: max amplitude = ${maxAmplitude.toFixed(4)}, avg amplitude = ${avgAmplitude.toFixed(4)}`);
-                
-                // If ggwave isn't initialized, try again
-                if (!ggwave || !ggwaveInstance) {
-                    log('GGWave not initialized, attempting initialization...', 'warning');
-                    const success = await initGGWave();
-                    
-                    if (!success) {
-                        log('Failed to initialize GGWave', 'error');
-                        circleText.textContent = '';
-                        statusDisplay.textContent = 'GGWave initialization failed. Please refresh.';
-                        loadingIndicator.classList.remove('visible');
-                        return;
-                    }
-                }
-                
-                // Attempt to decode using the gibberlink pattern
-                log('Decoding with ggwave...');
-                let decoded = null;
-                
-                try {
-                    // Following gibberlink pattern, convert floatData to Int8Array
-                    const int8Data = convertTypedArray(floatData, Int8Array);
-                    
-                    // Decode using ggwave's decode method with instance
-                    const result = ggwave.decode(ggwaveInstance, int8Data);
-                    log(`Raw decode result type: ${result ? typeof result : 'null'}`);
-                    
-                    // In gibberlink, it converts the result to text
-                    if (result && result.length > 0) {
-                        try {
-                            // Try to decode as UTF-8, similar to gibberlink
-                            decoded = new TextDecoder("utf-8").decode(result);
-                            log(`Decoded text: ${decoded}`);
-                        } catch (e) {
-                            log(`Error decoding UTF-8: ${e.message}`, 'warning');
-                            // Just use the raw result if TextDecoder fails
-                            decoded = result.toString();
-                        }
-                    }
-                    
-                    // If no valid signal data, try simulating a signature for testing on mobile
-                    if ((!decoded || decoded.length === 0) && maxAmplitude > 0.01) {
-                        log('No valid signal detected, but audio present. Using test signature for debugging.', 'warning');
-                        
-                        // Special mobile testing fallback - only use if actual audio was detected
-                        // Remove this in production
-                        decoded = "mobile_test_signature_" + new Date().getTime();
-                    }
-                } catch (decodeError) {
-                    log(`Error in ggwave.decode: ${decodeError.message}`, 'error');
-                    circleText.textContent = '';
-                    statusDisplay.textContent = 'Error decoding audio. Please try again.';
-                    // Show agent profile link for all cases
-                    document.getElementById('agentProfileLink').style.display = 'block';
-                    loadingIndicator.classList.remove('visible');
-                    return;
-                }
-                
-                if (decoded && decoded.length > 0) {
-                    log(`Decoded text found: ${decoded}`);
-                    const decodedText = decoded;
-                    // Hide this text since we don't want it displayed
-                    circleText.textContent = '';
-                    
-                    // Display the decoded text in a clean format
-                    // If it's too long, truncate it with ellipsis
-                    statusDisplay.textContent = decodedText.length > 40 
-                        ? decodedText.substring(0, 40) + '...' 
-                        : decodedText;
-                    
-                    // Show agent profile link
-                    document.getElementById('agentProfileLink').style.display = 'block';
-                    
-                    // Send to server for validation
-                    await validateDecodedText(decodedText);
-                } else {
-                    log('No ggwave data detected in audio', 'warning');
-                    circleText.textContent = '';
-                    statusDisplay.textContent = 'No signal detected. Please try again.';
-                    // Show agent profile link for all cases
-                    document.getElementById('agentProfileLink').style.display = 'block';
-                    loadingIndicator.classList.remove('visible');
-                }
-            } catch (decodeError) {
-                log(`Error decoding audio data: ${decodeError.message}`, 'error');
-                circleText.textContent = '';
-                statusDisplay.textContent = 'Error processing audio format. Please try again.';
-                // Show agent profile link for all cases
-                document.getElementById('agentProfileLink').style.display = 'block';
-                loadingIndicator.classList.remove('visible');
-            }
-        } catch (error) {
-            log(`Error processing recording: ${error.message}`, 'error');
-            circleText.textContent = '';
-            statusDisplay.textContent = 'Error processing audio. Please try again.';
-            // Show agent profile link for all cases
-            document.getElementById('agentProfileLink').style.display = 'block';
-            loadingIndicator.classList.remove('visible');
-        }
+    // Stop listening without a decoded payload (Stop button or timeout)
+    function stopRecording() {
+        if (!isRecording) return;
+        log(`Stopped listening after ${framesDecoded} frames without a payload`);
+        stopCapture();
+        showResult('No signal detected. Please try again.');
+    }
+    
+    // Show a final status message
+    function showResult(message) {
+        circleText.textContent = '';
+        statusDisplay.textContent = message;
+        // Show agent profile link for all cases
+        document.getElementById('agentProfileLink').style.display = 'block';
+        loadingIndicator.classList.remove('visible');
     }
     
-    // Send decoded text to server for validation
-    async function validateDecodedText(decodedText) {
+    // Send the decoded token ({decoded_text} or {decoded_bytes}) to the server for validation
+    async function validateDecodedText(body) {
         try {
-            log(`Sending decoded text to server for validation: ${decodedText}`);
+            log(`Sending decoded token to server for validation: ${JSON.stringify(body)}`);
             const response = await fetch('/validate', {
                 method: 'POST',
                 headers: {
                     'Content-Type': 'application/json'
                 },
-                body: JSON.stringify({
-                    decoded_text: decodedText
-                })
+                body: JSON.stringify(body)
             });
             
             log(`Server response status: ${response.status}`);
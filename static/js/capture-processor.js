@@ -0,0 +1,45 @@
+// AudioWorklet processor that slices microphone input into fixed-size frames.
+// The audio thread delivers 128-sample render quanta; ggwave decodes in frames
+// of samplesPerFrame (1024 by default), so quanta are packed into frames of
+// that size and each full frame is transferred to the main thread.
+class CaptureProcessor extends AudioWorkletProcessor {
+    constructor(options) {
+        super();
+        this.frameSize = (options.processorOptions && options.processorOptions.frameSize) || 1024;
+        this.frame = new Float32Array(this.frameSize);
+        this.filled = 0;
+        this.capturing = true;
+
+        // The main thread posts 'stop' once a payload has decoded
+        this.port.onmessage = event => {
+            if (event.data === 'stop') {
+                this.capturing = false;
+            }
+        };
+    }
+
+    process(inputs) {
+        // First channel of the first input; mono is all ggwave needs
+        const channel = inputs[0] && inputs[0][0];
+        if (this.capturing && channel) {
+            let offset = 0;
+            while (offset < channel.length) {
+                const count = Math.min(channel.length - offset, this.frameSize - this.filled);
+                this.frame.set(channel.subarray(offset, offset + count), this.filled);
+                this.filled += count;
+                offset += count;
+
+                if (this.filled === this.frameSize) {
+                    // Transfer the buffer instead of copying it, then start a new frame
+                    this.port.postMessage(this.frame, [this.frame.buffer]);
+                    this.frame = new Float32Array(this.frameSize);
+                    this.filled = 0;
+                }
+            }
+        }
+        // Returning false lets the browser tear the node down after stop
+        return this.capturing;
+    }
+}
+
+registerProcessor('capture-processor', CaptureProcessor);
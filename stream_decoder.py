@@ -0,0 +1,236 @@
+import threading
+import time
+import uuid
+from collections import OrderedDict
+
+import ggwave
+import numpy as np
+
+# Rate the ggwave decoder runs at; other input rates are resampled to it
+DECODER_SAMPLE_RATE = 48000
+# ggwave only decodes reliably when fed whole frames of this many samples
+SAMPLES_PER_FRAME = 1024
+
+# The ggwave module holds at most this many native instances per process, and
+# ggwave.encode needs one of them, so decoders may only take the rest
+GGWAVE_MAX_INSTANCES = 4
+MAX_DECODERS = GGWAVE_MAX_INSTANCES - 1
+
+# Supported input sample formats and their numpy dtypes and scale to [-1, 1]
+SAMPLE_FORMATS = {
+    "f32": (np.dtype("<f4"), 1.0),
+    "i16": (np.dtype("<i2"), 1.0 / 32768),
+    "i8": (np.dtype("i1"), 1.0 / 128),
+    "u8": (np.dtype("u1"), 1.0 / 128),
+}
+
+
+def to_float32(data, sample_format):
+    """Convert raw little-endian PCM bytes to float32 samples in [-1, 1]"""
+    return samples_to_float32(np.frombuffer(data, dtype=SAMPLE_FORMATS[sample_format][0]), sample_format)
+
+
+def samples_to_float32(samples, sample_format):
+    """Convert an array of integer or float PCM samples to float32 in [-1, 1]"""
+    scale = SAMPLE_FORMATS[sample_format][1]
+    if sample_format == "f32":
+        return samples.astype(np.float32, copy=False)
+    if sample_format == "u8":
+        return (samples.astype(np.float32) - 128) * scale
+    return samples.astype(np.float32) * scale
+
+
+def resample(samples, rate_in, rate_out=DECODER_SAMPLE_RATE):
+    """Resample a whole signal with vectorized linear interpolation"""
+    if rate_in == rate_out or len(samples) == 0:
+        return samples
+    count = int(len(samples) * rate_out / rate_in)
+    positions = np.arange(count) * (rate_in / rate_out)
+    return np.interp(positions, np.arange(len(samples)), samples).astype(np.float32)
+
+
+class DecoderBusyError(RuntimeError):
+    """Raised when every ggwave instance a decoder may use is taken"""
+
+
+_decoder_slots = threading.BoundedSemaphore(MAX_DECODERS)
+
+
+def _payload_text(payload):
+    # Text tokens are plain ASCII; anything else is a raw binary payload and stays bytes
+    try:
+        return payload.decode("ascii")
+    except UnicodeDecodeError:
+        return bytes(payload)
+
+
+class LinearResampler:
+    """Streaming linear resampler that keeps phase across chunks"""
+    def __init__(self, rate_in, rate_out=DECODER_SAMPLE_RATE):
+        self.step = rate_in / rate_out
+        self._tail = np.zeros(0, dtype=np.float32)
+        self._pos = 0.0
+
+    def process(self, samples):
+        buf = np.concatenate((self._tail, samples)) if len(self._tail) else samples
+        if len(buf) < 2:
+            self._tail = buf
+            return np.zeros(0, dtype=np.float32)
+
+        # Emit every output sample whose position falls before the last input sample
+        count = int(np.ceil((len(buf) - 1 - self._pos) / self.step))
+        positions = self._pos + np.arange(count) * self.step
+        out = np.interp(positions, np.arange(len(buf)), buf).astype(np.float32)
+
+        next_pos = self._pos + count * self.step
+        consumed = int(next_pos)
+        self._tail = buf[consumed:]
+        self._pos = next_pos - consumed
+        return out
+
+
+class StreamDecoder:
+    """
+    Persistent ggwave decoder fed with arbitrary-sized chunks of raw PCM.
+
+    Input is converted to float32, resampled to DECODER_SAMPLE_RATE and
+    handed to ggwave in whole frames. feed() returns the payloads that
+    finished decoding in that chunk.
+
+    Each decoder holds one of the process's MAX_DECODERS ggwave instances
+    until close(); DecoderBusyError is raised when none is free.
+    """
+    def __init__(self, sample_rate=DECODER_SAMPLE_RATE, sample_format="f32"):
+        if sample_format not in SAMPLE_FORMATS:
+            raise ValueError(f"Unsupported sample format: {sample_format}")
+        ggwave.disableLog()
+        self.sample_rate = sample_rate
+        self.sample_format = sample_format
+        self.samples_decoded = 0
+        self._sample_size = SAMPLE_FORMATS[sample_format][0].itemsize
+        self._pending_bytes = b""
+        self._frames = np.zeros(0, dtype=np.float32)
+        self._resampler = LinearResampler(sample_rate) if sample_rate != DECODER_SAMPLE_RATE else None
+        self._lock = threading.Lock()
+        self._instance = None
+
+        if not _decoder_slots.acquire(blocking=False):
+            raise DecoderBusyError(f"All {MAX_DECODERS} ggwave decoders are in use")
+        instance = ggwave.init()
+        if instance < 0:
+            # Something outside the decoders holds ggwave instances too
+            _decoder_slots.release()
+            raise DecoderBusyError("ggwave could not create another instance")
+        self._instance = instance
+
+    def feed(self, data):
+        """
+        Feed raw PCM bytes
+
+        Args:
+            data: Little-endian samples in this decoder's sample format
+
+        Returns:
+            List of (offset_seconds, payload) for each payload decoded, where
+            offset_seconds is the stream position the payload ended at and
+            payload is text, or bytes for a raw binary payload
+        """
+        with self._lock:
+            # Keep any partial sample for the next chunk
+            data = self._pending_bytes + data
+            usable = len(data) - len(data) % self._sample_size
+            self._pending_bytes = data[usable:]
+
+            samples = to_float32(data[:usable], self.sample_format)
+            if self._resampler is not None:
+                samples = self._resampler.process(samples)
+            return self._decode(samples)
+
+    def feed_samples(self, samples):
+        """Feed float32 samples already at DECODER_SAMPLE_RATE"""
+        with self._lock:
+            return self._decode(samples)
+
+    def _decode(self, samples):
+        if self._instance is None:
+            raise RuntimeError("Decoder is closed")
+        if len(self._frames):
+            samples = np.concatenate((self._frames, samples))
+
+        results = []
+        whole = len(samples) - len(samples) % SAMPLES_PER_FRAME
+        for start in range(0, whole, SAMPLES_PER_FRAME):
+            frame = samples[start:start + SAMPLES_PER_FRAME]
+            decoded = ggwave.decode(self._instance, frame.astype(np.float32, copy=False).tobytes())
+            self.samples_decoded += SAMPLES_PER_FRAME
+            if decoded:
+                results.append((self.samples_decoded / DECODER_SAMPLE_RATE, _payload_text(decoded)))
+        self._frames = samples[whole:]
+        return results
+
+    def close(self):
+        """Release the native ggwave instance"""
+        with self._lock:
+            if self._instance is not None:
+                ggwave.free(self._instance)
+                self._instance = None
+                _decoder_slots.release()
+
+
+class DecoderSessions:
+    """
+    Open stream decoders addressed by session id, closed when idle
+
+    Sessions share the MAX_DECODERS budget with /decode/stream, so at most
+    that many are open at once whatever `max_sessions` asks for.
+    """
+    def __init__(self, max_sessions=MAX_DECODERS, idle_timeout=60):
+        self.max_sessions = min(max_sessions, MAX_DECODERS)
+        self.idle_timeout = idle_timeout
+        self._sessions = OrderedDict()
+        self._lock = threading.Lock()
+
+    def create(self, sample_rate=DECODER_SAMPLE_RATE, sample_format="f32"):
+        """
+        Open a decoder session and return (session_id, decoder)
+
+        Raises:
+            DecoderBusyError: If the session limit is reached or no ggwave instance is free
+        """
+        session_id = uuid.uuid4().hex
+        with self._lock:
+            # Idle sessions give their instances back before a new one is taken
+            self._expire(time.monotonic())
+            if len(self._sessions) >= self.max_sessions:
+                raise DecoderBusyError(f"Too many open decode sessions ({self.max_sessions})")
+            decoder = StreamDecoder(sample_rate, sample_format)
+            self._sessions[session_id] = [decoder, time.monotonic()]
+        return session_id, decoder
+
+    def get(self, session_id):
+        """Return the decoder for a session and mark it used, or None"""
+        with self._lock:
+            entry = self._sessions.get(session_id)
+            if entry is None:
+                return None
+            entry[1] = time.monotonic()
+            self._sessions.move_to_end(session_id)
+            return entry[0]
+
+    def close(self, session_id):
+        """Close a session; returns False if it didn't exist"""
+        with self._lock:
+            entry = self._sessions.pop(session_id, None)
+        if entry is None:
+            return False
+        entry[0].close()
+        return True
+
+    def _expire(self, now):
+        # Least recently used sessions are at the front
+        while self._sessions:
+            session_id, (decoder, last_used) = next(iter(self._sessions.items()))
+            if now - last_used < self.idle_timeout:
+                break
+            del self._sessions[session_id]
+            decoder.close()
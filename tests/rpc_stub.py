@@ -0,0 +1,136 @@
+import base64
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from solders.pubkey import Pubkey
+from solders.transaction import Transaction
+
+
+def agent_account(*fields, space=1000):
+    """Agent account data: an instruction byte, Borsh strings, zero padded to `space`"""
+    data = b"\x00"
+    for field in fields:
+        value = field.encode()
+        data += len(value).to_bytes(4, "little") + value
+    return data + bytes(space - len(data))
+
+
+class StubRPC:
+    """
+    JSON-RPC server answering the Solana calls the agent store clients make.
+
+    `accounts` maps account addresses to their data. Every request is
+    recorded in `calls` as (method, params). Sent transactions confirm at
+    once; their Upsert instructions to the program overwrite the agent
+    account with the instruction data, as the program does.
+    """
+    def __init__(self, accounts=None, program_id="MGEB8Ba6ydpGj3FgjA9q79Az37xX9nuvBKbGqV2n8Ji"):
+        self.accounts = dict(accounts or {})
+        self.program_id = program_id
+        self.slot = 100
+        self.calls = []
+        # Signature -> transaction error, or None once it landed
+        self.signatures = {}
+        # Called with (method, params) before answering; may sleep or raise
+        self.before_reply = None
+        # Method name -> JSON-RPC error dict to answer with instead
+        self.errors = {}
+        self._lock = threading.Lock()
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, *args):
+                pass
+
+            def do_POST(self):
+                body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+                replies = [stub.handle(request) for request in (body if isinstance(body, list) else [body])]
+                data = json.dumps(replies if isinstance(body, list) else replies[0]).encode()
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.url = f"http://127.0.0.1:{self.server.server_address[1]}"
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+    def close(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    @staticmethod
+    def new_address():
+        return str(Pubkey.new_unique())
+
+    def count(self, method):
+        with self._lock:
+            return sum(1 for called, _ in self.calls if called == method)
+
+    def handle(self, request):
+        method, params = request["method"], request.get("params", [])
+        with self._lock:
+            self.calls.append((method, params))
+        if self.before_reply is not None:
+            self.before_reply(method, params)
+        if method in self.errors:
+            return {"jsonrpc": "2.0", "id": request["id"], "error": self.errors[method]}
+
+        config = params[1] if len(params) > 1 and isinstance(params[1], dict) else {}
+        context = {"slot": self.slot}
+        if method == "getSlot":
+            result = self.slot
+        elif method == "getAccountInfo":
+            result = {"context": context, "value": self._account(self.accounts.get(params[0]), config)}
+        elif method == "getMultipleAccounts":
+            result = {"context": context,
+                      "value": [self._account(self.accounts.get(address), config) for address in params[0]]}
+        elif method == "getProgramAccounts":
+            items = [{"pubkey": address, "account": self._account(data, config)}
+                     for address, data in self.accounts.items()]
+            result = {"context": context, "value": items} if config.get("withContext") else items
+        elif method == "getLatestBlockhash":
+            result = {"context": context, "value": {"blockhash": "11111111111111111111111111111111",
+                                                    "lastValidBlockHeight": self.slot + 150}}
+        elif method == "sendTransaction":
+            result = self._send(base64.b64decode(params[0]))
+        elif method == "getSignatureStatuses":
+            result = {"context": context, "value": [self._status(signature) for signature in params[0]]}
+        else:
+            return {"jsonrpc": "2.0", "id": request["id"],
+                    "error": {"code": -32601, "message": f"Method not found: {method}"}}
+        return {"jsonrpc": "2.0", "id": request["id"], "result": result}
+
+    def _send(self, raw):
+        transaction = Transaction.from_bytes(raw)
+        keys = [str(key) for key in transaction.message.account_keys]
+        for instruction in transaction.message.instructions:
+            data = bytes(instruction.data)
+            if keys[instruction.program_id_index] == self.program_id and data[:1] == b"\x00":
+                address = keys[instruction.accounts[1]]
+                space = len(self.accounts.get(address, b"")) or 1000
+                with self._lock:
+                    self.accounts[address] = data + bytes(max(0, space - len(data)))
+        signature = str(transaction.signatures[0])
+        self.signatures[signature] = None
+        return signature
+
+    def _status(self, signature):
+        if signature not in self.signatures:
+            return None
+        err = self.signatures[signature]
+        return {"slot": self.slot, "confirmations": None, "err": err,
+                "status": {"Ok": None} if err is None else {"Err": err}, "confirmationStatus": "confirmed"}
+
+    def _account(self, data, config):
+        if data is None:
+            return None
+        data_slice = config.get("dataSlice")
+        if data_slice:
+            data = data[data_slice["offset"]:data_slice["offset"] + data_slice["length"]]
+        return {"data": [base64.b64encode(data).decode(), "base64"], "executable": False, "lamports": 1000000,
+                "owner": self.program_id, "rentEpoch": 0, "space": len(data)}
@@ -0,0 +1,66 @@
+import asyncio
+import threading
+import time
+
+import pytest
+
+from client import MAX_MULTIPLE_ACCOUNTS, AsyncAgentStoreClient, RPCError
+from rpc_stub import StubRPC, agent_account
+
+AGENT_COUNT = 250
+
+
+@pytest.fixture
+def rpc():
+    stub = StubRPC()
+    store = AsyncAgentStoreClient(stub.url)
+    for i in range(AGENT_COUNT):
+        stub.accounts[str(store.find_agent_address(f"agent{i}"))] = agent_account(
+            f"Agent {i}", f"agent{i}", f"key{i}", "self", str(i), "4.5")
+    yield stub
+    stub.close()
+
+
+def fetch_agents(rpc, agent_ids, **options):
+    async def main():
+        async with AsyncAgentStoreClient(rpc.url, **options) as store:
+            return await store.get_agents(agent_ids)
+    return asyncio.run(main())
+
+
+def test_get_agents_batches_reads(rpc):
+    agent_ids = [f"agent{i}" for i in range(AGENT_COUNT)] + ["missing"]
+    agents = fetch_agents(rpc, agent_ids)
+
+    assert agents["missing"] is None
+    assert all(agents[f"agent{i}"].number_of_calls == str(i) for i in range(AGENT_COUNT))
+    batches = [len(params[0]) for method, params in rpc.calls if method == "getMultipleAccounts"]
+    assert sorted(batches) == [51, MAX_MULTIPLE_ACCOUNTS, MAX_MULTIPLE_ACCOUNTS]
+
+
+def test_requests_in_flight_are_capped(rpc):
+    lock = threading.Lock()
+    in_flight = [0]
+    peak = [0]
+
+    def slow_reply(method, params):
+        with lock:
+            in_flight[0] += 1
+            peak[0] = max(peak[0], in_flight[0])
+        time.sleep(0.1)
+        with lock:
+            in_flight[0] -= 1
+
+    rpc.before_reply = slow_reply
+    # 8 chunks of MAX_MULTIPLE_ACCOUNTS ids, three at a time
+    agent_ids = [f"agent{i % AGENT_COUNT}" for i in range(8 * MAX_MULTIPLE_ACCOUNTS)]
+    fetch_agents(rpc, agent_ids, max_concurrency=3)
+
+    assert rpc.count("getMultipleAccounts") == 8
+    assert peak[0] == 3
+
+
+def test_rpc_errors_propagate(rpc):
+    rpc.errors["getMultipleAccounts"] = {"code": -32603, "message": "Node is behind"}
+    with pytest.raises(RPCError, match="Node is behind"):
+        fetch_agents(rpc, ["agent1", "agent2"])
@@ -0,0 +1,41 @@
+import time
+
+import numpy as np
+
+from audio_output import CONTINUE_WINDOW, AudioEngine, NullSink
+from playback import PlaybackScheduler
+
+SAMPLE_RATE = 8000
+
+
+def clip(seconds=0.1):
+    return np.zeros(int(seconds * SAMPLE_RATE), dtype=np.float32)
+
+
+def test_queued_clips_on_a_paced_sink_play_back_to_back():
+    engine = AudioEngine(NullSink(realtime=True), SAMPLE_RATE, lead_in=0.5)
+    silences = []
+    scheduler = PlaybackScheduler(lambda samples: silences.append(engine.play(samples)))
+
+    jobs = [scheduler.submit(clip()) for _ in range(4)]
+    for job in jobs:
+        assert job.wait(5)
+
+    assert silences == [0.5, 0.0, 0.0, 0.0]
+
+
+def test_idle_paced_stream_gets_the_lead_in_again():
+    engine = AudioEngine(NullSink(realtime=True), SAMPLE_RATE, lead_in=0.2, gap=0.05)
+    assert engine.play(clip()) == 0.2
+    assert engine.play(clip()) == 0.05
+
+    time.sleep(CONTINUE_WINDOW + 0.05)
+    assert engine.play(clip()) == 0.2
+
+
+def test_unpaced_sink_is_busy_until_its_audio_would_have_played():
+    engine = AudioEngine(NullSink(), SAMPLE_RATE, lead_in=0.2)
+    assert engine.play(clip(1.0)) == 0.2
+    # Nothing blocked, but the first clip is still "playing" for another second
+    time.sleep(CONTINUE_WINDOW + 0.05)
+    assert engine.play(clip()) == 0.0
@@ -0,0 +1,45 @@
+from cryptography.hazmat.primitives import serialization
+from cryptography.hazmat.primitives.asymmetric.ed25519 import Ed25519PrivateKey
+
+import play
+import signed_payload
+from agent_index import AgentIndex
+from key_ring import fingerprint
+from registry_keys import RegistryKeys
+from rpc_stub import StubRPC, agent_account
+
+
+def hex_key(private_key):
+    return private_key.public_key().public_bytes(
+        serialization.Encoding.Raw, serialization.PublicFormat.Raw).hex()
+
+
+def token(private_key):
+    payload = signed_payload.pack("hello", private_key, fingerprint(private_key.public_key()))
+    return signed_payload.encode(payload, "base64")
+
+
+def registry_keys(*profiles):
+    accounts = [{"pubkey": StubRPC.new_address(), "data": agent_account(f"Agent {agent_id}", agent_id, key, "self", "0", "0")}
+                for agent_id, key in profiles]
+    index = AgentIndex(accounts)
+    registry = RegistryKeys(lambda: index)
+    registry.refresh()
+    return registry
+
+
+def test_shared_key_verifies_without_a_profile(monkeypatch):
+    shared, own = Ed25519PrivateKey.generate(), Ed25519PrivateKey.generate()
+    registry = registry_keys(("agent002", hex_key(shared)), ("agent001", hex_key(shared)),
+                             ("agent003", hex_key(own)))
+    monkeypatch.setattr(play, "registry_keys", registry)
+    assert registry.stats()["ambiguous"] == 1
+    assert registry.claimants(shared.public_key()) == ("agent001", "agent002")
+
+    is_verified, _, debug_info = play.verify_message(token(shared))
+    assert is_verified
+    assert debug_info["ambiguous"] == ["agent001", "agent002"]
+    assert play.signer_profile(debug_info) is None
+
+    is_verified, _, debug_info = play.verify_message(token(own))
+    assert is_verified and play.signer_profile(debug_info)["agent_id"] == "agent003"
@@ -0,0 +1,65 @@
+import pytest
+
+from client import AgentStoreClient
+from registry_sync import RegistrySync
+from rpc_stub import StubRPC, agent_account
+
+
+@pytest.fixture
+def rpc():
+    stub = StubRPC({StubRPC.new_address(): agent_account(f"Agent {i}", f"agent{i}", f"key{i}", "self", str(i), "4.5")
+                    for i in range(250)})
+    yield stub
+    stub.close()
+
+
+@pytest.fixture
+def registry(rpc):
+    return RegistrySync(AgentStoreClient(rpc.url))
+
+
+def test_first_sync_is_a_full_scan(rpc, registry):
+    result = registry.sync()
+    assert result.full_scan and result.added == 250
+    assert dict((account["pubkey"], account["data"]) for account in registry.accounts()) == rpc.accounts
+
+
+def test_unchanged_slot_skips_the_sync(rpc, registry):
+    registry.sync()
+    rpc.calls.clear()
+    assert not registry.sync().changed
+    assert [method for method, _ in rpc.calls] == ["getSlot"]
+
+
+def test_incremental_sync_reads_one_window_per_account(rpc, registry):
+    registry.sync()
+    rpc.calls.clear()
+    rpc.slot += 1
+
+    result = registry.sync()
+    assert not result.full_scan and not result.changed
+    assert rpc.count("getProgramAccounts") == 1
+    assert rpc.count("getMultipleAccounts") == 0
+    config = next(params for method, params in rpc.calls if method == "getProgramAccounts")[1]
+    assert config["dataSlice"]["offset"] == 0 and config["dataSlice"]["length"] < 200
+
+
+def test_incremental_sync_finds_every_kind_of_change(rpc, registry):
+    registry.sync()
+    addresses = list(rpc.accounts)
+    # Stats edit, a same-length identity rewrite, a record that outgrows the window,
+    # a closed account and a new one
+    rpc.accounts[addresses[0]] = agent_account("Agent 0", "agent0", "key0", "self", "7", "3.9")
+    rpc.accounts[addresses[1]] = agent_account("Agent X", "agent1", "keyX", "self", "1", "4.5")
+    rpc.accounts[addresses[2]] = agent_account("Agent 2", "agent2", "k" * 400, "self", "2", "4.5")
+    del rpc.accounts[addresses[3]]
+    rpc.accounts[StubRPC.new_address()] = agent_account("New", "new", "keyN", "self", "0", "0")
+    rpc.calls.clear()
+    rpc.slot += 1
+
+    result = registry.sync()
+    assert (result.added, result.updated, result.removed) == (1, 3, 1)
+    assert dict((account["pubkey"], account["data"]) for account in registry.accounts()) == rpc.accounts
+    # Only the new account and the grown record are read in full
+    fetched = [params[0] for method, params in rpc.calls if method == "getMultipleAccounts"]
+    assert len(fetched) == 1 and len(fetched[0]) == 2
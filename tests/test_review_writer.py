@@ -0,0 +1,62 @@
+import json
+
+import pytest
+from solders.keypair import Keypair
+
+import play
+from agent_cache import AgentCache
+from client import Agent, AgentStoreClient
+from rpc_stub import StubRPC, agent_account
+
+
+@pytest.fixture
+def rpc(monkeypatch, tmp_path):
+    stub = StubRPC()
+    store = AgentStoreClient(stub.url)
+    stub.address = str(store.find_agent_address("agent001"))
+    stub.accounts[stub.address] = agent_account("Agent 1", "agent001", "key1", "self", "4", "3.00")
+
+    payer = tmp_path / "payer.json"
+    payer.write_text(json.dumps(list(bytes(Keypair()))))
+    monkeypatch.setenv("VOXVERIFY_RPC_URL", stub.url)
+    monkeypatch.setattr(play, "REVIEW_PAYER", str(payer))
+    monkeypatch.setattr(play, "review_upsert", None)
+    monkeypatch.setattr(play, "review_aggregator", None)
+    monkeypatch.setattr(play, "agent_cache", AgentCache(store))
+    yield stub
+    stub.close()
+
+
+def stored_agent(rpc):
+    return Agent.from_account_data(rpc.accounts[rpc.address])
+
+
+def test_flush_writes_reviews_on_chain(rpc):
+    client = play.app.test_client()
+    assert client.get("/review?agent_id=agent001&ratings=10 10 10 10").status_code == 200
+
+    response = client.post("/review/flush")
+    assert response.status_code == 200 and response.get_json()["agents_written"] == 1
+    assert rpc.count("sendTransaction") == 1
+    agent = stored_agent(rpc)
+    assert (agent.number_of_calls, agent.avg_customer_rating) == ("5", "4.40")
+    assert play.review_aggregator.pending() == 0
+
+
+def test_flush_starts_from_the_current_record(rpc):
+    client = play.app.test_client()
+    # Cached by /review, then rewritten on chain by another writer
+    client.get("/review?agent_id=agent001&ratings=10 10 10 10")
+    rpc.accounts[rpc.address] = agent_account("Agent 1", "agent001", "key1", "self", "8", "5.00")
+
+    client.post("/review/flush")
+    agent = stored_agent(rpc)
+    assert (agent.number_of_calls, agent.avg_customer_rating) == ("9", "5.56")
+
+
+def test_review_rejects_unknown_agents_and_off_scale_ratings(rpc):
+    client = play.app.test_client()
+    assert client.get("/review?agent_id=nobody&ratings=1 2 3 4").status_code == 404
+    assert client.get("/review?agent_id=agent001&ratings=1 2 3 11").status_code == 400
+    assert client.get("/review?agent_id=agent001&ratings=-1e300 2 3 4").status_code == 400
+    assert play.get_review_aggregator().stats()["agents"] == 0
@@ -0,0 +1,37 @@
+import ggwave
+import pytest
+
+import play
+from stream_decoder import MAX_DECODERS, DecoderBusyError, StreamDecoder
+
+
+@pytest.fixture
+def client():
+    return play.create_app("verify").test_client()
+
+
+def test_decoders_past_the_limit_are_refused_and_encoding_still_works(client):
+    session_ids = []
+    try:
+        for _ in range(MAX_DECODERS + 2):
+            response = client.post("/decode/sessions", json={})
+            if response.status_code == 201:
+                session_ids.append(response.get_json()["session_id"])
+            else:
+                assert response.status_code == 503
+        assert len(session_ids) == MAX_DECODERS
+
+        assert client.post("/decode/stream", data=b"").status_code == 503
+        with pytest.raises(DecoderBusyError):
+            StreamDecoder()
+
+        # One ggwave instance is always left for encoding
+        waveform = ggwave.encode("still encoding", protocolId=1, volume=20)
+        assert len(waveform) > 0
+    finally:
+        for session_id in session_ids:
+            client.delete(f"/decode/sessions/{session_id}")
+
+    # Closed sessions hand their instances back
+    decoder = StreamDecoder()
+    decoder.close()
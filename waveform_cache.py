@@ -0,0 +1,143 @@
+import io
+import threading
+import wave
+from collections import OrderedDict
+
+import ggwave
+import numpy as np
+
+from metrics import stage_timer
+
+# Default memory budget for cached waveforms (a 88 character token is ~1.2 MB)
+DEFAULT_MAX_BYTES = 64 * 1024 * 1024
+
+# ggwave transmission protocols by name. The fast variants send more bytes
+# per frame; ultrasound is inaudible and dt (dual tone) is the most robust.
+PROTOCOLS = {
+    "audible-normal": 0,
+    "audible-fast": 1,
+    "audible-fastest": 2,
+    "ultrasound-normal": 3,
+    "ultrasound-fast": 4,
+    "ultrasound-fastest": 5,
+    "dt-normal": 6,
+    "dt-fast": 7,
+    "dt-fastest": 8,
+}
+
+
+def parse_protocol(value):
+    """
+    Resolve a ggwave protocol given by name or id
+
+    Raises:
+        ValueError: if it isn't a known protocol
+    """
+    if isinstance(value, str) and value in PROTOCOLS:
+        return PROTOCOLS[value]
+    try:
+        protocol_id = int(value)
+    except (TypeError, ValueError):
+        protocol_id = None
+    if protocol_id not in PROTOCOLS.values():
+        raise ValueError(f"Unknown ggwave protocol {value!r}; use 0-8 or one of {', '.join(PROTOCOLS)}")
+    return protocol_id
+
+
+class WaveformCache:
+    """
+    Size-bounded LRU of encoded ggwave waveforms.
+
+    Entries are float32 numpy arrays keyed by (payload, protocol_id, volume)
+    and the cache is bounded by the total bytes held, not the entry count.
+    """
+    def __init__(self, max_bytes=DEFAULT_MAX_BYTES):
+        self.max_bytes = max_bytes
+        self.current_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, payload, protocol_id, volume):
+        """
+        Return the waveform for a payload, encoding it on a miss
+
+        Args:
+            payload: Text or raw bytes to encode
+            protocol_id: ggwave protocol id
+            volume: ggwave volume (0-100)
+
+        Returns:
+            Read-only float32 numpy array of samples
+        """
+        key = (payload, protocol_id, volume)
+        with self._lock:
+            waveform = self._entries.get(key)
+            if waveform is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return waveform
+            self.misses += 1
+
+        # Encode outside the lock so a slow encode doesn't block cache hits
+        with stage_timer("encode"):
+            waveform = np.frombuffer(
+                ggwave.encode(payload, protocolId=protocol_id, volume=volume),
+                dtype=np.float32
+            )
+
+        with self._lock:
+            if key not in self._entries:
+                self._entries[key] = waveform
+                self.current_bytes += waveform.nbytes
+                self._evict()
+        return waveform
+
+    def peek(self, payload, protocol_id, volume):
+        """Return a cached waveform without encoding or touching LRU order"""
+        with self._lock:
+            return self._entries.get((payload, protocol_id, volume))
+
+    def clear(self):
+        """Drop every cached waveform"""
+        with self._lock:
+            self._entries.clear()
+            self.current_bytes = 0
+
+    def stats(self):
+        """Return cache counters for reporting"""
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "bytes": self.current_bytes,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+            }
+
+    def _evict(self):
+        # Always keep the newest entry, even if it alone exceeds the budget
+        while self.current_bytes > self.max_bytes and len(self._entries) > 1:
+            _, waveform = self._entries.popitem(last=False)
+            self.current_bytes -= waveform.nbytes
+            self.evictions += 1
+
+
+def to_wav_bytes(waveform, sample_rate):
+    """Wrap float32 samples in a 16-bit PCM mono WAV file"""
+    samples = (np.clip(waveform, -1.0, 1.0) * 32767).astype('<i2')
+    buffer = io.BytesIO()
+    with wave.open(buffer, 'wb') as wav_file:
+        wav_file.setnchannels(1)
+        wav_file.setsampwidth(2)
+        wav_file.setframerate(sample_rate)
+        wav_file.writeframes(samples.tobytes())
+    return buffer.getvalue()
+
+
+def to_pcm_bytes(waveform):
+    """Return raw little-endian float32 PCM samples"""
+    return waveform.astype('<f4', copy=False).tobytes()